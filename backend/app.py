@@ -14,11 +14,9 @@ from flask_login import login_user, logout_user, login_required, current_user
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
-import cloudinary
-import cloudinary.uploader
 
 # Import extensions and models
-from extensions import db, login_manager, mail
+from extensions import db, login_manager, mail, render_cache, upload_queue, gtin_allocator, image_storage, lookup_cache, upload_staging
 from models import User, Product, Payment, Activity
 
 logging.basicConfig(level=logging.INFO)
@@ -35,7 +33,64 @@ def create_app():
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'postgresql://localhost/suppliercomply')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5MB max file upload
+    # Uploads are parsed as a stream (and spooled to disk by Werkzeug), so this only caps disk use
+    app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_MB', 50)) * 1024 * 1024
+    
+    # Barcode generation configuration
+    app.config['BULK_MAX_ROWS'] = int(os.environ.get('BULK_MAX_ROWS', 20000))
+    app.config['GTIN_BLOCK_SIZE'] = int(os.environ.get('GTIN_BLOCK_SIZE', 100))
+    app.config['BARCODE_PNG_PRESET'] = os.environ.get('BARCODE_PNG_PRESET', 'print-300')  # screen, print-300, print-600
+    app.config['BARCODE_RENDER_WORKERS'] = int(os.environ.get('BARCODE_RENDER_WORKERS', os.cpu_count() or 1))
+    
+    # Barcode image storage and background uploads
+    app.config['BARCODE_STORAGE'] = os.environ.get('BARCODE_STORAGE', 'cloudinary')  # 'cloudinary', 'local' or 's3'
+    app.config['BARCODE_LOCAL_DIR'] = os.environ.get('BARCODE_LOCAL_DIR', os.path.join(app.static_folder, 'uploads'))
+    app.config['BARCODE_LOCAL_URL'] = os.environ.get('BARCODE_LOCAL_URL', '/static/uploads')
+    # False: skip rendering/upload at generation; /barcode/<gtin>.<ext> renders on first view
+    app.config['BARCODE_EAGER_UPLOAD'] = os.environ.get('BARCODE_EAGER_UPLOAD', 'True').lower() == 'true'
+    # Larger KEMSA imports get on-demand images instead of queued uploads
+    app.config['IMPORT_EAGER_MAX_ROWS'] = int(os.environ.get('IMPORT_EAGER_MAX_ROWS', 1000))
+    app.config['BARCODE_UPLOAD_ASYNC'] = os.environ.get('BARCODE_UPLOAD_ASYNC', 'True').lower() == 'true'
+    app.config['BARCODE_UPLOAD_CONCURRENCY'] = int(os.environ.get('BARCODE_UPLOAD_CONCURRENCY', 4))
+    app.config['BARCODE_UPLOAD_RETRIES'] = int(os.environ.get('BARCODE_UPLOAD_RETRIES', 3))
+    app.config['BARCODE_UPLOAD_BATCH'] = int(os.environ.get('BARCODE_UPLOAD_BATCH', 20))
+    app.config['STORAGE_POOL_SIZE'] = int(os.environ.get('STORAGE_POOL_SIZE', 0)) or None  # default: upload concurrency
+    app.config['STORAGE_TIMEOUT'] = int(os.environ.get('STORAGE_TIMEOUT', 30))
+    
+    # Cloudinary storage
+    app.config['CLOUDINARY_CLOUD_NAME'] = os.environ.get('CLOUDINARY_CLOUD_NAME')
+    app.config['CLOUDINARY_API_KEY'] = os.environ.get('CLOUDINARY_API_KEY')
+    app.config['CLOUDINARY_API_SECRET'] = os.environ.get('CLOUDINARY_API_SECRET')
+    
+    # S3-compatible storage
+    app.config['S3_ENDPOINT'] = os.environ.get('S3_ENDPOINT', 'https://s3.amazonaws.com')
+    app.config['S3_REGION'] = os.environ.get('S3_REGION', 'us-east-1')
+    app.config['S3_BUCKET'] = os.environ.get('S3_BUCKET')
+    app.config['S3_ACCESS_KEY_ID'] = os.environ.get('S3_ACCESS_KEY_ID')
+    app.config['S3_SECRET_ACCESS_KEY'] = os.environ.get('S3_SECRET_ACCESS_KEY')
+    app.config['S3_PUBLIC_URL'] = os.environ.get('S3_PUBLIC_URL')  # e.g. a CDN in front of the bucket
+    
+    # Render cache configuration
+    app.config['RENDER_CACHE_DIR'] = os.environ.get('RENDER_CACHE_DIR')
+    app.config['RENDER_CACHE_MEMORY_ITEMS'] = int(os.environ.get('RENDER_CACHE_MEMORY_ITEMS', 256))
+    app.config['RENDER_CACHE_DISK_BYTES'] = int(os.environ.get('RENDER_CACHE_DISK_MB', 512)) * 1024 * 1024
+    
+    # Scan lookup cache: GTINs kept per worker and seconds before re-reading them
+    app.config['LOOKUP_CACHE_ITEMS'] = int(os.environ.get('LOOKUP_CACHE_ITEMS', 10000))
+    app.config['LOOKUP_CACHE_TTL'] = int(os.environ.get('LOOKUP_CACHE_TTL', 60))
+    
+    # KEMSA upload staging: directory, seconds an upload is kept, upload
+    # metadata held in memory per worker and disk size limit
+    app.config['UPLOAD_STAGING_DIR'] = os.environ.get('UPLOAD_STAGING_DIR')
+    app.config['UPLOAD_STAGING_TTL'] = int(os.environ.get('UPLOAD_STAGING_TTL', 3600))
+    app.config['UPLOAD_STAGING_MEMORY_ITEMS'] = int(os.environ.get('UPLOAD_STAGING_MEMORY_ITEMS', 256))
+    app.config['UPLOAD_STAGING_DISK_BYTES'] = int(os.environ.get('UPLOAD_STAGING_DISK_MB', 1024)) * 1024 * 1024
+    
+    # Idempotency keys: how long responses are replayed, when an unfinished
+    # request gives up its key, and the largest response body stored
+    app.config['IDEMPOTENCY_TTL_HOURS'] = int(os.environ.get('IDEMPOTENCY_TTL_HOURS', 24))
+    app.config['IDEMPOTENCY_LOCK_SECONDS'] = int(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', 300))
+    app.config['IDEMPOTENCY_MAX_BODY_BYTES'] = int(os.environ.get('IDEMPOTENCY_MAX_BODY_MB', 10)) * 1024 * 1024
     
     # Mail configuration
     app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
@@ -45,17 +100,16 @@ def create_app():
     app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD')
     app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_USERNAME')
     
-    # Cloudinary configuration
-    cloudinary.config(
-        cloud_name=os.environ.get('CLOUDINARY_CLOUD_NAME'),
-        api_key=os.environ.get('CLOUDINARY_API_KEY'),
-        api_secret=os.environ.get('CLOUDINARY_API_SECRET')
-    )
-    
     # Initialize extensions
     db.init_app(app)
     login_manager.init_app(app)
     mail.init_app(app)
+    render_cache.init_app(app)
+    upload_queue.init_app(app)
+    image_storage.init_app(app)
+    gtin_allocator.init_app(app)
+    lookup_cache.init_app(app)
+    upload_staging.init_app(app)
     CORS(app)
 
     # User loader
@@ -63,13 +117,15 @@ def create_app():
     def load_user(user_id):
         return User.query.get(int(user_id))
     
-    # Security headers
+    # Security headers; barcode images come from wherever the storage backend serves them
+    img_src = ' '.join(["'self'", 'data:'] + image_storage.image_sources())
+    
     @app.after_request
     def add_security_headers(response):
         response.headers['X-Content-Type-Options'] = 'nosniff'
         response.headers['X-Frame-Options'] = 'DENY'
         response.headers['X-XSS-Protection'] = '1; mode=block'
-        response.headers['Content-Security-Policy'] = "default-src 'self'; script-src 'self' 'unsafe-inline' cdn.tailwindcss.com cdnjs.cloudflare.com; style-src 'self' 'unsafe-inline' cdn.tailwindcss.com cdnjs.cloudflare.com fonts.googleapis.com; font-src 'self' fonts.gstatic.com cdnjs.cloudflare.com; img-src 'self' data: res.cloudinary.com; connect-src 'self';"
+        response.headers['Content-Security-Policy'] = f"default-src 'self'; script-src 'self' 'unsafe-inline' cdn.tailwindcss.com cdnjs.cloudflare.com; style-src 'self' 'unsafe-inline' cdn.tailwindcss.com cdnjs.cloudflare.com fonts.googleapis.com; font-src 'self' fonts.gstatic.com cdnjs.cloudflare.com; img-src {img_src}; connect-src 'self';"
         return response
 
     # Register blueprints (import here to avoid circular imports)
@@ -87,6 +143,10 @@ def create_app():
     app.register_blueprint(payment_bp)
     app.register_blueprint(admin_bp)
     
+    # CLI commands
+    from commands import register_commands
+    register_commands(app)
+    
     # Error handlers
     @app.errorhandler(404)
     def not_found(error):
@@ -0,0 +1,192 @@
+"""
+Barcode Render Cache for SupplierComply
+Content-addressed cache of rendered barcode images with an in-process LRU
+tier and an on-disk tier with size-based eviction
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict, namedtuple
+
+logger = logging.getLogger(__name__)
+
+CachedRender = namedtuple('CachedRender', ['data', 'url'])
+
+
+class RenderCache:
+    """Two-tier cache of rendered barcode images keyed by content hash."""
+
+    def __init__(self, app=None):
+        self.max_items = 256
+        self.max_disk_bytes = 512 * 1024 * 1024
+        self.directory = None
+        self._memory = OrderedDict()
+        self._disk_bytes = None
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configure cache limits and directory from the Flask app config."""
+        self.max_items = app.config.get('RENDER_CACHE_MEMORY_ITEMS', self.max_items)
+        self.max_disk_bytes = app.config.get('RENDER_CACHE_DISK_BYTES', self.max_disk_bytes)
+        self.directory = app.config.get('RENDER_CACHE_DIR') or os.path.join(
+            tempfile.gettempdir(), 'suppliercomply-render-cache'
+        )
+        os.makedirs(self.directory, exist_ok=True)
+        app.extensions['render_cache'] = self
+
+    @staticmethod
+    def make_key(barcode_value, image_format, options=None):
+        """Hash the GS1 element string together with the writer options."""
+        payload = json.dumps([barcode_value, image_format, options or {}], sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        Look up a rendered image.
+
+        Returns:
+            CachedRender or None on a miss
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return entry
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['disk_hits'] += 1
+            self._remember(key, entry)
+        return entry
+
+    def put(self, key, data, url=None):
+        """Store rendered image bytes and, once uploaded, their public URL."""
+        entry = CachedRender(data, url)
+        with self._lock:
+            self._remember(key, entry)
+        self._write_disk(key, entry)
+        return entry
+
+    def get_stats(self):
+        """Return hit/miss counters and current tier sizes."""
+        with self._lock:
+            lookups = self.stats['memory_hits'] + self.stats['disk_hits'] + self.stats['misses']
+            hits = lookups - self.stats['misses']
+            return dict(
+                self.stats,
+                hit_rate=round(hits / lookups, 4) if lookups else None,
+                memory_items=len(self._memory),
+                memory_max_items=self.max_items,
+                disk_bytes=self._disk_bytes,
+                disk_max_bytes=self.max_disk_bytes
+            )
+
+    def _remember(self, key, entry):
+        """Insert into the LRU tier, evicting the least recently used entries."""
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, key[:2], f"{key}{suffix}")
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key, '.img'), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            with open(self._path(key, '.url'), 'r') as f:
+                url = f.read().strip() or None
+        except OSError:
+            url = None
+        # Touch so eviction treats the entry as recently used
+        try:
+            os.utime(self._path(key, '.img'))
+        except OSError:
+            pass
+        return CachedRender(data, url)
+
+    def _write_disk(self, key, entry):
+        if not self.directory:
+            return
+        try:
+            path = self._path(key, '.img')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            existing = os.path.getsize(path) if os.path.exists(path) else 0
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(entry.data)
+            os.replace(tmp_path, path)
+            if entry.url:
+                with open(self._path(key, '.url'), 'w') as f:
+                    f.write(entry.url)
+
+            with self._lock:
+                if self._disk_bytes is None:
+                    self._disk_bytes = self._scan_disk_bytes()
+                else:
+                    self._disk_bytes += len(entry.data) - existing
+                over_limit = self._disk_bytes > self.max_disk_bytes
+            if over_limit:
+                self._evict_disk()
+        except OSError as e:
+            logger.warning(f"Render cache write failed: {str(e)}")
+
+    def _scan_disk_bytes(self):
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.img'):
+                    try:
+                        total += os.path.getsize(os.path.join(root, name))
+                    except OSError:
+                        pass
+        return total
+
+    def _evict_disk(self):
+        """Delete least recently used files until the disk tier is at 90% of its limit."""
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.img'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+
+        total = sum(size for _, size, _ in files)
+        target = int(self.max_disk_bytes * 0.9)
+        evicted = 0
+        for _, size, path in files:
+            if total <= target:
+                break
+            for victim in (path, path[:-len('.img')] + '.url'):
+                try:
+                    os.remove(victim)
+                except OSError:
+                    pass
+            total -= size
+            evicted += 1
+
+        with self._lock:
+            self._disk_bytes = total
+            self.stats['evictions'] += evicted
@@ -0,0 +1,204 @@
+"""
+Barcode Rendering for SupplierComply
+Builds GS1-128 element strings and renders them as PNG or SVG images
+"""
+
+import os
+from functools import lru_cache
+from io import BytesIO
+import barcode
+from barcode.codex import Gs1_128
+from barcode.writer import ImageWriter, SVGWriter
+from PIL import Image, ImageDraw, ImageFont
+
+import gs1
+from gtin import pad_gtin
+
+# Supported output formats: python-barcode writer, content type and file extension
+BARCODE_FORMATS = {
+    'png': {'writer': ImageWriter, 'mimetype': 'image/png', 'extension': 'png'},
+    'svg': {'writer': SVGWriter, 'mimetype': 'image/svg+xml', 'extension': 'svg'},
+}
+
+DEFAULT_FORMAT = 'png'
+
+# Widths (px) of the PNG thumbnails kept next to each image for srcset
+THUMBNAIL_WIDTHS = (160, 320)
+
+# Writer options per format (part of the render cache key); the symbology
+# entry keeps renders from before the FNC1 encoding out of the cache
+WRITER_OPTIONS = {
+    'png': {'symbology': 'gs1-128'},
+    'svg': {'symbology': 'gs1-128'},
+}
+
+# Code 128 function character 1, as python-barcode and ReportLab spell it
+FNC1 = '\xf1'
+
+# PNG resolution presets: whole-pixel bar modules keep every bar edge sharp
+PNG_PRESETS = {
+    'screen': {'dpi': 96, 'module_pixels': 2, 'module_height': 15.0, 'font_size': 10},
+    'print-300': {'dpi': 300, 'module_pixels': 3, 'module_height': 15.0, 'font_size': 10},
+    'print-600': {'dpi': 600, 'module_pixels': 6, 'module_height': 15.0, 'font_size': 10},
+}
+
+DEFAULT_PRESET = 'print-300'
+
+# Free-tier watermark: text repeated across the bars in mid-grey
+WATERMARK_TEXT = 'SupplierComply FREE TRIAL'
+WATERMARK_SHADE = 160
+WATERMARK_FONT = os.path.join(os.path.dirname(barcode.__file__), 'fonts', 'DejaVuSansMono.ttf')
+WATERMARK_SVG = (
+    '<text x="50%" y="40%" text-anchor="middle" '
+    'style="fill:#a0a0a0;fill-opacity:0.85;font:bold 4mm sans-serif">'
+    f'{WATERMARK_TEXT}</text>'
+).encode('utf-8')
+
+
+@lru_cache(maxsize=64)
+def watermark_mask(size, dpi):
+    """
+    Watermark overlay for one image size and DPI, as an 8-bit mask.
+
+    Barcodes of the same length share a size, so the text is drawn once per
+    size/DPI and watermarking an image is a single paste through the mask.
+    """
+    width, height = size
+    font = ImageFont.truetype(WATERMARK_FONT, max(8, round(dpi * 0.12)))
+    mask = Image.new('L', size, 0)
+    draw = ImageDraw.Draw(mask)
+    left, top, right, bottom = draw.textbbox((0, 0), WATERMARK_TEXT + '   ', font=font)
+    y = (height - (bottom - top)) * 2 // 5 - top
+    for x in range(0, width, right - left):
+        draw.text((x, y), WATERMARK_TEXT, fill=255, font=font)
+    return mask
+
+
+def render_thumbnail(image_data, width):
+    """Downscale a rendered PNG barcode to the given width (aspect ratio kept, grayscale)."""
+    image = Image.open(BytesIO(image_data))
+    if image.width > width:
+        image = image.convert('L').resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+    buffer = BytesIO()
+    image.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def product_elements(gtin, batch_number, expiry_date):
+    """
+    GS1 elements of a product: (01) GTIN, (17) expiry as YYMMDD and (10) batch.
+
+    Fixed-length AIs come first so the variable-length batch ends the symbol
+    and never needs an FNC1 separator. Empty fields are left out, and short
+    legacy GTINs are padded to 14 digits as (01) requires.
+
+    Args:
+        expiry_date: date, 'YYYY-MM-DD' string or None
+    """
+    return [('01', pad_gtin(gtin)), ('17', gs1.format_date(expiry_date) if expiry_date else None), ('10', batch_number)]
+
+
+def build_barcode_value(gtin, batch_number, expiry_date):
+    """
+    Build the GS1-128 element string (bracketed form) for a product.
+
+    Raises:
+        gs1.GS1Error: If a field breaks its AI rules (e.g. a batch over 20 characters)
+    """
+    return gs1.encode(product_elements(gtin, batch_number, expiry_date))
+
+
+def build_barcode_values(rows):
+    """
+    Build element strings for many (gtin, batch_number, expiry_date) rows in one call.
+
+    Returns:
+        Tuple (values, errors) as from gs1.encode_many
+    """
+    return gs1.encode_many([product_elements(*row) for row in rows])
+
+
+def build_product_barcode_value(product):
+    """Rebuild the GS1-128 element string from a stored Product."""
+    return build_barcode_value(product.gtin, product.batch_number, product.expiry_date)
+
+
+def symbol_data(barcode_value):
+    """
+    Code 128 data for an element string: the raw AI data with FNC1 wherever
+    a variable-length field needs a separator.
+
+    The leading FNC1 that marks the symbol as GS1-128 is not included; the
+    encoders add it (Gs1_128 does so itself).
+
+    Args:
+        barcode_value: Element string in the bracketed form
+    """
+    return gs1.encode(gs1.decode(barcode_value), bracketed=False).replace(gs1.GS, FNC1)
+
+
+def resolve_format(requested, default=DEFAULT_FORMAT):
+    """
+    Pick the output format for a request.
+
+    Args:
+        requested: Format asked for by the client (may be None/empty)
+        default: Fallback, usually the account's preferred format
+
+    Returns:
+        Lowercase format name, or None if the requested format is unsupported
+    """
+    image_format = (requested or default or DEFAULT_FORMAT).strip().lower()
+    return image_format if image_format in BARCODE_FORMATS else None
+
+
+def writer_options(image_format, preset=DEFAULT_PRESET, watermark=False):
+    """
+    python-barcode writer options for a format; PNGs take theirs from a preset.
+
+    These are also what the render cache key hashes, so images rendered
+    with different presets (or with the free-tier watermark) never collide.
+    """
+    if watermark:
+        return dict(writer_options(image_format, preset), watermark=True)
+    if image_format != 'png':
+        return WRITER_OPTIONS[image_format]
+    settings = PNG_PRESETS[preset]
+    return dict(
+        WRITER_OPTIONS['png'],
+        dpi=settings['dpi'],
+        module_width=settings['module_pixels'] * 25.4 / settings['dpi'],
+        module_height=settings['module_height'],
+        font_size=settings['font_size'],
+        mode='1'
+    )
+
+
+def render_barcode(barcode_value, image_format=DEFAULT_FORMAT, preset=DEFAULT_PRESET, watermark=False):
+    """
+    Render a GS1-128 barcode to image bytes in the given format.
+
+    The bars encode the raw AI data behind a leading FNC1; the bracketed
+    element string is only printed as the human-readable text.
+
+    PNGs are encoded as 1-bit images (a barcode is pure black and white),
+    several times smaller than the writer's default RGB output; watermarked
+    PNGs are grayscale so the overlay can be drawn in grey.
+
+    Kept at module level so it can be pickled into a process pool.
+    """
+    options = writer_options(image_format, preset)
+    symbol = Gs1_128(symbol_data(barcode_value), writer=BARCODE_FORMATS[image_format]['writer']())
+    buffer = BytesIO()
+    if image_format == 'png':
+        image = symbol.render({key: value for key, value in options.items() if key != 'mode'}, text=barcode_value)
+        image = image.convert('1', dither=Image.Dither.NONE)
+        if watermark:
+            image = image.convert('L')
+            image.paste(WATERMARK_SHADE, mask=watermark_mask(image.size, options['dpi']))
+        image.save(buffer, 'PNG', optimize=True, dpi=(options['dpi'], options['dpi']))
+    else:
+        symbol.write(buffer, options, text=barcode_value)
+        if watermark:
+            return buffer.getvalue().replace(b'</svg>', WATERMARK_SVG + b'</svg>')
+    return buffer.getvalue()
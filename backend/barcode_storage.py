@@ -0,0 +1,367 @@
+"""
+Barcode Image Storage for SupplierComply
+Pluggable storage backends (Cloudinary, local directory, S3-compatible) that
+share one pooled keep-alive HTTP session per process, with batch puts and
+per-backend latency and error metrics
+"""
+
+import hashlib
+import hmac
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import quote, urlsplit
+
+import requests
+from cloudinary.utils import api_sign_request
+from requests.adapters import HTTPAdapter
+
+from barcode_render import BARCODE_FORMATS, THUMBNAIL_WIDTHS, render_thumbnail
+
+logger = logging.getLogger(__name__)
+
+
+def barcode_public_id(gtin, image_format):
+    """Public ID for a barcode image; non-PNG formats get a suffix so they don't overwrite the PNG."""
+    return f"barcode_{gtin}" if image_format == 'png' else f"barcode_{gtin}_{image_format}"
+
+
+def barcode_storage_key(user_id, gtin, image_format):
+    """Storage key (folder/public_id, no extension) of a product's barcode image."""
+    return f"barcodes/user_{user_id}/{barcode_public_id(gtin, image_format)}"
+
+
+def thumbnail_key(key, width):
+    """Storage key of a PNG thumbnail stored next to the original."""
+    return f"{key}_w{width}"
+
+
+def thumbnail_url(barcode_url, width):
+    """
+    URL of a barcode image scaled to width pixels.
+
+    Cloudinary URLs get a scale transformation (made eagerly at upload), the
+    on-demand endpoint takes ?w=, and other stores hold <name>_w<width>.png
+    next to the original. SVGs scale themselves, so their URL is returned as is.
+    """
+    if not barcode_url:
+        return None
+    path, _, query = barcode_url.partition('?')
+    if not path.endswith('.png'):
+        return barcode_url
+    if 'res.cloudinary.com' in path and '/image/upload/' in path:
+        return path.replace('/image/upload/', f'/image/upload/w_{width},c_scale/', 1)
+    if re.search(r'/barcode/\d+\.png$', path):
+        return f"{path}?{query + '&' if query else ''}w={width}"
+    return f"{path[:-len('.png')]}_w{width}.png"
+
+
+def thumbnail_srcset(barcode_url):
+    """srcset attribute value listing the thumbnail widths of a barcode image."""
+    if not barcode_url or barcode_url.partition('?')[0].endswith('.svg'):
+        return None
+    return ', '.join(f"{thumbnail_url(barcode_url, width)} {width}w" for width in THUMBNAIL_WIDTHS)
+
+
+class StorageBackend:
+    """
+    Interface of an image store.
+
+    Keys are slash-separated paths without a file extension; the image format
+    supplies the extension and content type.
+    """
+
+    name = None
+    # Whether batch puts should overlap requests on the pooled session
+    concurrent_puts = True
+    # Whether the service derives thumbnails itself (otherwise they are uploaded as files)
+    makes_derivatives = False
+
+    def __init__(self, config, session):
+        self.config = config
+        self.session = session
+
+    @classmethod
+    def public_origins(cls, config):
+        """Origins (scheme://host) the stored images are served from; none when same-origin."""
+        return []
+
+    def put(self, key, data, image_format):
+        """Store image bytes and return their public URL."""
+        raise NotImplementedError
+
+
+class LocalStorage(StorageBackend):
+    """Files in a directory served as static files; for development, tests and benchmarks."""
+
+    name = 'local'
+    concurrent_puts = False
+
+    @classmethod
+    def public_origins(cls, config):
+        return _origins(config.get('BARCODE_LOCAL_URL'))
+
+    def _path(self, key, image_format):
+        return os.path.join(self.config['BARCODE_LOCAL_DIR'], f"{key}.{BARCODE_FORMATS[image_format]['extension']}")
+
+    def put(self, key, data, image_format):
+        path = self._path(key, image_format)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return f"{self.config['BARCODE_LOCAL_URL'].rstrip('/')}/{key}.{BARCODE_FORMATS[image_format]['extension']}"
+
+
+class CloudinaryStorage(StorageBackend):
+    """Cloudinary upload REST API, signed with the account's API secret."""
+
+    name = 'cloudinary'
+    makes_derivatives = True
+    api_url = 'https://api.cloudinary.com/v1_1'
+    delivery_origin = 'https://res.cloudinary.com'
+
+    @classmethod
+    def public_origins(cls, config):
+        return [cls.delivery_origin]
+
+    def put(self, key, data, image_format):
+        folder, _, public_id = key.rpartition('/')
+        params = {'folder': folder, 'public_id': public_id, 'timestamp': int(time.time())}
+        if image_format == 'png':
+            # Build the thumbnail transformations now so the first grid view is not slow
+            params['eager'] = '|'.join(f"w_{width},c_scale" for width in THUMBNAIL_WIDTHS)
+        params['signature'] = api_sign_request(params, self.config['CLOUDINARY_API_SECRET'])
+        params['api_key'] = self.config['CLOUDINARY_API_KEY']
+        response = self.session.post(
+            f"{self.api_url}/{self.config['CLOUDINARY_CLOUD_NAME']}/image/upload",
+            data=params,
+            files={'file': (f"{public_id}.{BARCODE_FORMATS[image_format]['extension']}", data,
+                            BARCODE_FORMATS[image_format]['mimetype'])},
+            timeout=self.config.get('STORAGE_TIMEOUT', 30)
+        )
+        response.raise_for_status()
+        return response.json()['secure_url']
+
+
+class S3Storage(StorageBackend):
+    """S3-compatible object store (AWS S3, MinIO, R2, ...) over path-style URLs with SigV4 signing."""
+
+    name = 's3'
+
+    @classmethod
+    def public_origins(cls, config):
+        return _origins(config.get('S3_PUBLIC_URL') or config.get('S3_ENDPOINT'))
+
+    def _object_path(self, key, image_format):
+        return f"/{self.config['S3_BUCKET']}/{key}.{BARCODE_FORMATS[image_format]['extension']}"
+
+    def _request(self, method, path, data=b'', query='', headers=None):
+        """Send a SigV4-signed request to the S3 endpoint."""
+        endpoint = self.config['S3_ENDPOINT'].rstrip('/')
+        region = self.config.get('S3_REGION') or 'us-east-1'
+        now = datetime.utcnow()
+        amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+        scope = f"{now.strftime('%Y%m%d')}/{region}/s3/aws4_request"
+
+        headers = dict(headers or {})
+        headers['host'] = endpoint.split('://', 1)[-1]
+        headers['x-amz-date'] = amz_date
+        headers['x-amz-content-sha256'] = hashlib.sha256(data).hexdigest()
+        signed = sorted(name.lower() for name in headers)
+        lowered = {name.lower(): str(value).strip() for name, value in headers.items()}
+        canonical = '\n'.join([
+            method,
+            quote(path, safe='/~'),
+            query,
+            ''.join(f"{name}:{lowered[name]}\n" for name in signed),
+            ';'.join(signed),
+            headers['x-amz-content-sha256']
+        ])
+        string_to_sign = '\n'.join([
+            'AWS4-HMAC-SHA256', amz_date, scope, hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+        ])
+
+        signing_key = f"AWS4{self.config['S3_SECRET_ACCESS_KEY']}".encode('utf-8')
+        for part in scope.split('/'):
+            signing_key = hmac.new(signing_key, part.encode('utf-8'), hashlib.sha256).digest()
+        signature = hmac.new(signing_key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+        headers['Authorization'] = (
+            f"AWS4-HMAC-SHA256 Credential={self.config['S3_ACCESS_KEY_ID']}/{scope}, "
+            f"SignedHeaders={';'.join(signed)}, Signature={signature}"
+        )
+        del headers['host']
+
+        response = self.session.request(
+            method, f"{endpoint}{quote(path, safe='/~')}" + (f"?{query}" if query else ''),
+            data=data, headers=headers, timeout=self.config.get('STORAGE_TIMEOUT', 30)
+        )
+        response.raise_for_status()
+        return response
+
+    def put(self, key, data, image_format):
+        path = self._object_path(key, image_format)
+        self._request('PUT', path, data, headers={
+            'Content-Type': BARCODE_FORMATS[image_format]['mimetype'],
+            'Cache-Control': 'public, max-age=31536000, immutable'
+        })
+        public_url = self.config.get('S3_PUBLIC_URL')
+        if public_url:
+            return f"{public_url.rstrip('/')}/{key}.{BARCODE_FORMATS[image_format]['extension']}"
+        return f"{self.config['S3_ENDPOINT'].rstrip('/')}{path}"
+
+
+def _origins(url):
+    """[scheme://host] of an absolute URL; [] for a relative (same-origin) one."""
+    parts = urlsplit(url or '')
+    return [f"{parts.scheme}://{parts.netloc}"] if parts.scheme and parts.netloc else []
+
+
+STORAGE_BACKENDS = {backend.name: backend for backend in (CloudinaryStorage, LocalStorage, S3Storage)}
+
+
+class ImageStorage:
+    """
+    The configured storage backend plus the per-process HTTP session and metrics.
+
+    The session keeps up to STORAGE_POOL_SIZE keep-alive connections, so
+    uploads from the background queue reuse TLS connections instead of
+    opening one per image. Batch puts from every job share one executor of
+    the same size, so concurrent jobs never need more connections than the
+    pool holds.
+    """
+
+    def __init__(self, app=None):
+        self.config = {}
+        self.backend_name = 'cloudinary'
+        self.pool_size = 4
+        self._backend = None
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.metrics = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Pick the backend named by BARCODE_STORAGE and size the connection pool."""
+        self.config = app.config
+        self.backend_name = app.config.get('BARCODE_STORAGE', self.backend_name)
+        if self.backend_name not in STORAGE_BACKENDS:
+            raise ValueError(f"Unknown BARCODE_STORAGE {self.backend_name!r}; use one of {', '.join(STORAGE_BACKENDS)}")
+        self.pool_size = app.config.get('STORAGE_POOL_SIZE') or app.config.get('BARCODE_UPLOAD_CONCURRENCY', self.pool_size)
+        app.extensions['image_storage'] = self
+
+    def image_sources(self):
+        """
+        CSP img-src sources for barcode images.
+
+        The configured backend's public origin, plus Cloudinary's: images
+        uploaded before a BARCODE_STORAGE switch keep their Cloudinary URLs.
+        """
+        origins = STORAGE_BACKENDS[self.backend_name].public_origins(self.config)
+        return list(dict.fromkeys(origins + [CloudinaryStorage.delivery_origin]))
+
+    def _process_state(self):
+        """Create the session, backend and put executor for this process (none are shared with forked workers)."""
+        with self._lock:
+            if self._backend is None or self._pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._backend = STORAGE_BACKENDS[self.backend_name](self.config, session)
+                self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix='storage-put')
+                self._pid = os.getpid()
+            return self._backend, self._executor
+
+    @property
+    def backend(self):
+        """Backend instance for this process."""
+        return self._process_state()[0]
+
+    def _record(self, operation, started, count=1, error=None):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            metrics = self.metrics.setdefault(self.backend_name, {})
+            entry = metrics.setdefault(operation, {'calls': 0, 'items': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            entry['calls'] += 1
+            entry['items'] += count
+            entry['total_ms'] += elapsed_ms
+            entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+            if error is not None:
+                entry['errors'] += 1
+                entry['last_error'] = str(error)[:200]
+
+    def put(self, key, data, image_format='png'):
+        """Store one image and return its public URL."""
+        started = time.perf_counter()
+        try:
+            url = self.backend.put(key, data, image_format)
+        except Exception as e:
+            self._record('put', started, error=e)
+            raise
+        self._record('put', started)
+        return url
+
+    def put_many(self, items, thumbnails=True):
+        """
+        Store many images concurrently over the pooled session.
+
+        Args:
+            items: List of (key, data, image_format)
+            thumbnails: Also store THUMBNAIL_WIDTHS thumbnails of PNGs, unless
+                the backend derives them itself
+
+        Returns:
+            List of public URLs of the originals in the same order, None where
+            the original or one of its thumbnails failed to upload
+        """
+        uploads = []
+        for index, (key, data, image_format) in enumerate(items):
+            uploads.append((index, True, (key, data, image_format)))
+            if thumbnails and image_format == 'png' and not self.backend.makes_derivatives:
+                uploads.extend(
+                    (index, False, (thumbnail_key(key, width), render_thumbnail(data, width), image_format))
+                    for width in THUMBNAIL_WIDTHS
+                )
+
+        urls = [None] * len(items)
+        failed = set()
+        for (index, original, _), url in zip(uploads, self._put_all([item for _, _, item in uploads])):
+            if url is None:
+                failed.add(index)
+            elif original:
+                urls[index] = url
+        return [None if index in failed else url for index, url in enumerate(urls)]
+
+    def _put_all(self, items):
+        """Put items, concurrently where the backend benefits; None marks a failure."""
+        backend, executor = self._process_state()
+
+        def put_one(item):
+            try:
+                return self.put(*item)
+            except Exception as e:
+                logger.warning(f"Storage put failed for {item[0]}: {str(e)}")
+                return None
+
+        if len(items) <= 1 or not backend.concurrent_puts:
+            return [put_one(item) for item in items]
+        return list(executor.map(put_one, items))
+
+    def get_stats(self):
+        """Per-backend call counts, errors and latency for this worker."""
+        with self._lock:
+            return {
+                name: {
+                    operation: dict(entry, avg_ms=round(entry['total_ms'] / entry['calls'], 2) if entry['calls'] else None,
+                                    total_ms=round(entry['total_ms'], 2), max_ms=round(entry['max_ms'], 2))
+                    for operation, entry in operations.items()
+                }
+                for name, operations in self.metrics.items()
+            }
+
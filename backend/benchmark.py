@@ -0,0 +1,569 @@
+"""
+Benchmarks for SupplierComply
+Run from the backend directory, e.g. `python benchmark.py formats --count 200`
+"""
+
+import argparse
+import multiprocessing
+import random
+import resource
+import statistics
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from types import SimpleNamespace
+
+from barcode_render import BARCODE_FORMATS, build_barcode_value, render_barcode
+
+
+def sample_barcode_values(count, seed=42):
+    """Build typical GS1-128 element strings (GTIN-14, batch, expiry)."""
+    rng = random.Random(seed)
+    values = []
+    for _ in range(count):
+        gtin = ''.join(rng.choice('0123456789') for _ in range(14))
+        batch = f"B{rng.randint(1000, 999999)}"
+        expiry = f"20{rng.randint(26, 30)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        values.append(build_barcode_value(gtin, batch, expiry))
+    return values
+
+
+def bench_formats(args):
+    """Compare render time and byte size of each barcode image format."""
+    values = sample_barcode_values(args.count)
+    print(f"{'format':<8}{'ms/render':>12}{'p95 ms':>10}{'avg bytes':>12}{'renders/s':>12}")
+    for image_format in BARCODE_FORMATS:
+        timings = []
+        sizes = []
+        for value in values:
+            started = time.perf_counter()
+            data = render_barcode(value, image_format)
+            timings.append((time.perf_counter() - started) * 1000)
+            sizes.append(len(data))
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        mean = statistics.mean(timings)
+        print(f"{image_format:<8}{mean:>12.2f}{p95:>10.2f}{statistics.mean(sizes):>12.0f}{1000 / mean:>12.1f}")
+
+
+def bench_png_presets(args):
+    """Bytes and encode time of 1-bit PNGs per preset, against the writer's default RGB PNG."""
+    from io import BytesIO
+    from barcode import Code128
+    from barcode.writer import ImageWriter
+    from barcode_render import PNG_PRESETS
+
+    def default_rgb(value):
+        # What render_barcode produced before the presets
+        buffer = BytesIO()
+        Code128(value, writer=ImageWriter()).write(buffer, {})
+        return buffer.getvalue()
+
+    values = sample_barcode_values(args.count)
+    renderers = [('rgb default', default_rgb)] + [
+        (preset, lambda value, preset=preset: render_barcode(value, 'png', preset)) for preset in PNG_PRESETS
+    ]
+    print(f"{'preset':<14}{'ms/image':>10}{'avg bytes':>12}{'vs default':>12}")
+    baseline = None
+    for name, render in renderers:
+        started = time.perf_counter()
+        sizes = [len(render(value)) for value in values]
+        elapsed = (time.perf_counter() - started) * 1000 / len(values)
+        mean = statistics.mean(sizes)
+        baseline = baseline or mean
+        print(f"{name:<14}{elapsed:>10.2f}{mean:>12.0f}{mean / baseline:>11.0%}")
+
+
+def bench_check_digits(args):
+    """Validate a GTIN column row by row versus in one vectorized pass."""
+    from gtin import calculate_check_digits, validate_gtins
+
+    def scalar_check_digit(base):
+        # The per-character loop calculate_check_digit used before vectorization
+        total = sum(int(d) * (3 if i % 2 == 0 else 1) for i, d in enumerate(base))
+        return (10 - total % 10) % 10
+
+    # Supplier files are mostly valid: corrupt about 1% of check digits
+    rng = random.Random(42)
+    bases = [''.join(rng.choice('0123456789') for _ in range(13)) for _ in range(args.count)]
+    codes = [
+        f"{base}{rng.choice('0123456789') if rng.random() < 0.01 else scalar_check_digit(base)}"
+        for base in bases
+    ]
+
+    started = time.perf_counter()
+    scalar = [scalar_check_digit(code[:-1]) == int(code[-1]) for code in codes]
+    scalar_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    valid, _ = validate_gtins(codes)
+    vector_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    calculate_check_digits(bases)
+    compute_seconds = time.perf_counter() - started
+
+    assert scalar == valid.tolist()
+    print(f"{args.count} GTIN-14s")
+    print(f"scalar validate:     {scalar_seconds * 1000:8.1f} ms")
+    print(f"vectorized validate: {vector_seconds * 1000:8.1f} ms ({scalar_seconds / vector_seconds:.1f}x)")
+    print(f"vectorized compute:  {compute_seconds * 1000:8.1f} ms")
+
+
+def _allocate_gtins_worker(user_id, threads, count, block_size):
+    """Allocate GTINs from several threads in a fresh process (like a gunicorn worker)."""
+    from app import app
+    from extensions import gtin_allocator
+
+    gtin_allocator.block_size = block_size
+    allocated = []
+    lock = threading.Lock()
+
+    def work():
+        with app.app_context():
+            local = []
+            for i in range(count):
+                # Mix single allocations with small batches, as generate/bulk do
+                local.extend(gtin_allocator.allocate(user_id, 1 if i % 10 else 5))
+            with lock:
+                allocated.extend(local)
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return allocated
+
+
+def bench_gtin_stress(args):
+    """Allocate GTINs concurrently from several processes and check they are all unique."""
+    started = time.perf_counter()
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=args.processes, mp_context=context) as executor:
+        futures = [
+            executor.submit(_allocate_gtins_worker, args.user_id, args.threads, args.count, args.block_size)
+            for _ in range(args.processes)
+        ]
+        gtins = [gtin for future in futures for gtin in future.result()]
+    elapsed = time.perf_counter() - started
+
+    duplicates = len(gtins) - len(set(gtins))
+    print(f"allocated {len(gtins)} GTINs in {elapsed:.2f}s ({len(gtins) / elapsed:.0f}/s) "
+          f"across {args.processes} processes x {args.threads} threads")
+    print(f"duplicates: {duplicates}")
+    if duplicates:
+        raise SystemExit(1)
+
+
+def bench_labels(args):
+    """Label-sheet PDF throughput and peak memory for a large selection."""
+    from labels import render_label_sheet
+
+    rng = random.Random(42)
+
+    def products():
+        # Generated lazily, like rows from a yield_per query
+        for i in range(args.count):
+            yield SimpleNamespace(
+                name=f"Amoxicillin 500mg capsules x{rng.randint(10, 100)}",
+                gtin=f"{20000100000000 + i:014d}",
+                batch_number=f"B{rng.randint(1000, 999999)}",
+                expiry_date=date(2027, rng.randint(1, 12), rng.randint(1, 28))
+            )
+
+    with open(args.output, 'wb') as output:
+        started = time.perf_counter()
+        labels, pages, _ = render_label_sheet(products(), output, args.template)
+        elapsed = time.perf_counter() - started
+        size = output.tell()
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{labels} labels on {pages} pages ({args.template}) in {elapsed:.2f}s")
+    print(f"{labels / elapsed:.0f} labels/s, {pages / elapsed:.1f} pages/s, "
+          f"{size / 1024:.0f} KB ({size / labels:.0f} bytes/label), peak RSS {peak_mb:.0f} MB")
+
+
+def bench_storage(args):
+    """Sequential puts vs batched put_many on a storage backend (local by default)."""
+    import tempfile
+    from barcode_storage import ImageStorage
+
+    with tempfile.TemporaryDirectory() as directory:
+        config = {'BARCODE_STORAGE': args.backend, 'BARCODE_LOCAL_DIR': directory, 'BARCODE_LOCAL_URL': '/static/uploads',
+                  'STORAGE_POOL_SIZE': args.pool_size}
+        if args.backend != 'local':
+            # Remote backends read credentials from the environment, as in app.py
+            import os
+            config.update({key: value for key, value in os.environ.items() if key.startswith(('CLOUDINARY_', 'S3_'))})
+        storage = ImageStorage()
+        storage.init_app(SimpleNamespace(config=config, extensions={}))
+
+        image_data = render_barcode(sample_barcode_values(1)[0], 'png')
+        # Fixed keys: each run overwrites the previous run's objects on a remote backend
+        keys = [f"benchmark/barcode_{i}" for i in range(args.count)]
+
+        started = time.perf_counter()
+        for key in keys:
+            storage.put(key, image_data)
+        sequential = time.perf_counter() - started
+
+        started = time.perf_counter()
+        urls = storage.put_many([(key, image_data, 'png') for key in keys], thumbnails=False)
+        batched = time.perf_counter() - started
+
+        print(f"{args.count} puts to {args.backend} ({len(image_data)} bytes each, pool of {args.pool_size})")
+        print(f"sequential: {sequential:.2f}s ({args.count / sequential:.0f}/s)")
+        print(f"put_many:   {batched:.2f}s ({args.count / batched:.0f}/s), {urls.count(None)} failed")
+        print(storage.get_stats())
+
+
+def bench_gs1(args):
+    """Batch encode/decode throughput of the GS1 AI engine over synthetic element lists."""
+    import gs1
+
+    rng = random.Random(42)
+    alphabet = 'ABCDEFGHJKLMNPQRSTUVWXYZ0123456789-/'
+    element_lists = []
+    for i in range(args.count):
+        elements = [('01', f"{20000100000000 + i:014d}"),
+                    ('17', f"{rng.randint(25, 35):02d}{rng.randint(1, 12):02d}{rng.randint(0, 28):02d}"),
+                    ('10', ''.join(rng.choice(alphabet) for _ in range(rng.randint(3, 20))))]
+        if i % 4 == 0:
+            # Variable-length field in the middle: needs an FNC1 separator in the raw form
+            elements.append(('21', str(rng.randint(1, 10 ** 9))))
+        element_lists.append(elements)
+
+    print(f"{args.count} synthetic element strings (01, 17, 10, and 21 on every fourth)")
+    for label, bracketed in (('bracketed', True), ('raw', False)):
+        started = time.perf_counter()
+        strings, errors = gs1.encode_many(element_lists, bracketed)
+        encode_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        decoded, decode_errors = gs1.decode_many(strings)
+        decode_seconds = time.perf_counter() - started
+
+        assert not any(errors) and not any(decode_errors)
+        assert decoded[-1] == element_lists[-1] and decoded[0] == element_lists[0]
+        print(f"{label:9s}  encode {args.count / encode_seconds:9.0f}/s   decode {args.count / decode_seconds:9.0f}/s")
+
+
+def bench_lookup(args):
+    """Scan lookups per second: parsing, cold vs cached resolution, and POST /barcode/lookup end to end."""
+    import os
+    import tempfile
+    from datetime import datetime, timedelta
+
+    # A throwaway SQLite database unless --database is given
+    directory = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = args.database or f"sqlite:///{directory}/lookup-benchmark.db"
+    from app import app
+    from extensions import db, lookup_cache
+    from gtin import format_gtins
+    from models import Product, User
+    from scan_lookup import lookup_scans, parse_scan
+
+    rng = random.Random(42)
+    with app.app_context():
+        db.create_all()
+        user = User(email=f"lookup-benchmark-{os.getpid()}@example.com", password_hash='x',
+                    payment_code=f"LB{os.getpid() % 100000}", payment_status='paid',
+                    paid_until=datetime.utcnow() + timedelta(days=1))
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+        gtins = format_gtins(user_id % 100000, range(1, args.products + 1))
+        rows = [{'user_id': user_id, 'name': f"Product {i}", 'gtin': gtin, 'batch_number': f"B{i}",
+                 'expiry_date': date(2027, 1 + i % 12, 1 + i % 28), 'created_at': datetime.utcnow()}
+                for i, gtin in enumerate(gtins)]
+        db.session.execute(Product.__table__.insert(), rows)
+        db.session.commit()
+
+        scans = []
+        for _ in range(args.count):
+            row = rows[rng.randrange(len(rows))]
+            scans.append(f"01{row['gtin']}17{row['expiry_date'].strftime('%y%m%d')}10{row['batch_number']}")
+
+        started = time.perf_counter()
+        for scan in scans:
+            parse_scan(scan)
+        parse_seconds = time.perf_counter() - started
+
+        batches = [scans[i:i + args.batch] for i in range(0, len(scans), args.batch)]
+        # Cold: every batch goes to the database; cached: the second pass over a warm cache
+        timings = {'cold': 0.0}
+        for batch in batches:
+            lookup_cache.clear()
+            started = time.perf_counter()
+            lookup_scans(lookup_cache, user_id, batch)
+            timings['cold'] += time.perf_counter() - started
+        for batch in batches:
+            lookup_scans(lookup_cache, user_id, batch)
+        started = time.perf_counter()
+        for batch in batches:
+            results = lookup_scans(lookup_cache, user_id, batch)
+        timings['cached'] = time.perf_counter() - started
+        assert all(result['status'] == 'ok' for result in results)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    started = time.perf_counter()
+    for batch in batches:
+        response = client.post('/barcode/lookup', json={'scans': batch})
+        assert response.status_code == 200
+    http_seconds = time.perf_counter() - started
+
+    print(f"{args.count} scans over {args.products} products, batches of {args.batch}")
+    print(f"parse:         {args.count / parse_seconds:10.0f} scans/s")
+    for label, seconds in timings.items():
+        print(f"resolve {label:6s} {args.count / seconds:10.0f} scans/s")
+    print(f"POST /lookup:  {args.count / http_seconds:10.0f} scans/s ({len(batches) / http_seconds:.0f} requests/s)")
+    print(lookup_cache.get_stats())
+
+
+def _export_worker(database_url, user_id, size, mode):
+    """
+    Export `size` products in a fresh process.
+
+    Returns:
+        Tuple (seconds, first byte seconds, bytes, baseline MB, peak MB)
+    """
+    import os
+    os.environ['DATABASE_URL'] = database_url
+    from io import BytesIO
+    from openpyxl import Workbook
+    from app import app
+    from models import Product
+    from routes_kemsa import EXPORT_COLUMNS, product_max_lengths, product_rows
+    from streaming import column_widths, spool_xlsx, stream_csv, stream_ndjson
+
+    with app.app_context():
+        query = Product.query.filter(Product.user_id == user_id, Product.id <= size)
+        query.limit(1).all()
+        baseline_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        started = time.perf_counter()
+        first_byte = None
+        headers = [heading for heading, _, _ in EXPORT_COLUMNS]
+        if mode == 'xlsx-legacy':
+            # The previous export: every product loaded, then a second walk over the cells for widths
+            wb = Workbook()
+            ws = wb.active
+            ws.append(headers)
+            for product in query.all():
+                ws.append([product.name, product.batch_number or '', product.expiry_date.isoformat(),
+                           product.quantity or 0, product.gtin or '', product.created_at.strftime('%Y-%m-%d'),
+                           product.barcode_url or '', ''])
+            for column in ws.columns:
+                ws.column_dimensions[column[0].column_letter].width = min(
+                    max(len(str(cell.value)) for cell in column) + 2, 50
+                )
+            buffer = BytesIO()
+            wb.save(buffer)
+            size_bytes = buffer.tell()
+        elif mode == 'xlsx':
+            _, max_lengths = product_max_lengths(query, EXPORT_COLUMNS)
+            spool, size_bytes = spool_xlsx(
+                "KEMSA Export", headers, product_rows(query, EXPORT_COLUMNS), column_widths(headers, max_lengths)
+            )
+            spool.close()
+        else:
+            rows = product_rows(query, EXPORT_COLUMNS)
+            chunks = stream_csv(headers, rows) if mode == 'csv' else stream_ndjson(headers, rows)
+            size_bytes = 0
+            for chunk in chunks:
+                if first_byte is None:
+                    first_byte = time.perf_counter() - started
+                size_bytes += len(chunk)
+        seconds = time.perf_counter() - started
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return seconds, first_byte if first_byte is not None else seconds, size_bytes, baseline_mb, peak_mb
+
+
+def bench_export(args):
+    """Time, time to first byte and peak RSS of KEMSA exports per format and catalogue size."""
+    import os
+    import tempfile
+    from datetime import datetime, timedelta
+
+    sizes = sorted(int(size) for size in args.sizes.split(','))
+    directory = tempfile.mkdtemp()
+    database_url = args.database or f"sqlite:///{directory}/export-benchmark.db"
+    os.environ['DATABASE_URL'] = database_url
+    from app import app
+    from extensions import db
+    from gtin import format_gtins
+    from models import Product, User
+
+    with app.app_context():
+        db.create_all()
+        user = User(email=f"export-benchmark-{os.getpid()}@example.com", password_hash='x',
+                    payment_code=f"XB{os.getpid() % 100000}", payment_status='paid',
+                    paid_until=datetime.utcnow() + timedelta(days=1))
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        # Product ids 1..N belong to the benchmark user (fresh database), so each size is an id range
+        created_at = datetime.utcnow()
+        for start in range(1, sizes[-1] + 1, 10000):
+            serials = range(start, min(start + 10000, sizes[-1] + 1))
+            db.session.execute(Product.__table__.insert(), [
+                {'user_id': user_id, 'name': f"Paracetamol 500mg Tablets {i}", 'gtin': gtin, 'batch_number': f"B{i:07d}",
+                 'expiry_date': date(2027, 1 + i % 12, 1 + i % 28), 'quantity': i % 1000,
+                 'barcode_url': f"https://res.cloudinary.com/demo/image/upload/barcodes/{gtin}.png",
+                 'barcode_format': 'png', 'created_at': created_at}
+                for i, gtin in zip(serials, format_gtins(user_id % 100000, serials))
+            ])
+            db.session.commit()
+
+    modes = args.formats.split(',') + (['xlsx-legacy'] if args.legacy else [])
+    context = multiprocessing.get_context('spawn')
+    print(f"{'products':>9} {'format':>11} {'seconds':>8} {'1st byte s':>10} {'MB out':>7} {'baseline MB':>12} {'peak RSS MB':>12}")
+    for size in sizes:
+        for mode in modes:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                seconds, first_byte, size_bytes, baseline_mb, peak_mb = pool.submit(
+                    _export_worker, database_url, user_id, size, mode
+                ).result()
+            print(f"{size:9d} {mode:>11} {seconds:8.2f} {first_byte:10.3f} {size_bytes / 1e6:7.1f} "
+                  f"{baseline_mb:12.0f} {peak_mb:12.0f}")
+
+
+def bench_import(args):
+    """Upload and /kemsa/import time for a mapped CSV, with a share of invalid rows."""
+    import io
+    import os
+    import tempfile
+    from datetime import datetime, timedelta
+
+    # A throwaway SQLite database unless --database is given
+    directory = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = args.database or f"sqlite:///{directory}/import-benchmark.db"
+    os.environ['UPLOAD_STAGING_DIR'] = os.path.join(directory, 'uploads')
+    from app import app
+    from extensions import db
+    from gtin import format_gtins
+    from models import Product, User
+
+    # Images are served on demand, so the import is not followed by N renders
+    app.config['BARCODE_EAGER_UPLOAD'] = False
+    with app.app_context():
+        db.create_all()
+        user = User(email=f"import-benchmark-{os.getpid()}@example.com", password_hash='x',
+                    payment_code=f"IB{os.getpid() % 100000}", payment_status='paid',
+                    paid_until=datetime.utcnow() + timedelta(days=1))
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+    # Every other row brings its own GTIN; one row in args.invalid_every has an invalid expiry date
+    gtins = format_gtins(99999, range(1, args.count + 1))
+    lines = ['Product Name,Quantity,Batch Number,Expiry Date,GTIN']
+    for i, gtin in enumerate(gtins, 1):
+        expiry = '2027-13-01' if i % args.invalid_every == 0 else f"2027-{1 + i % 12:02d}-{1 + i % 28:02d}"
+        lines.append(f"Paracetamol 500mg Tablets {i},{i % 1000},B{i:07d},{expiry},{gtin if i % 2 else ''}")
+    payload = ('\n'.join(lines) + '\n').encode()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+    started = time.perf_counter()
+    response = client.post('/kemsa/upload', data={'file': (io.BytesIO(payload), 'import-benchmark.csv')},
+                           content_type='multipart/form-data')
+    upload_seconds = time.perf_counter() - started
+    assert response.status_code == 200, response.get_json()
+    file_id = response.get_json()['file_id']
+
+    started = time.perf_counter()
+    response = client.post('/kemsa/import', json={'file_id': file_id, 'mappings': {
+        'product_name': 'product_name', 'quantity': 'quantity', 'batch_number': 'batch_number',
+        'expiry_date': 'expiry_date', 'gs1_barcode': 'gtin'
+    }})
+    import_seconds = time.perf_counter() - started
+    result = response.get_json()
+    assert response.status_code == 201, result
+
+    with app.app_context():
+        stored = db.session.query(Product).filter(Product.user_id == user_id).count()
+    print(f"{args.count} rows, {len(payload) / 1e6:.1f} MB CSV")
+    print(f"upload:  {upload_seconds:7.2f} s")
+    print(f"import:  {import_seconds:7.2f} s ({args.count / import_seconds:.0f} rows/s)")
+    print(f"imported {result['imported']}, failed {result['failed']}, stored {stored}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SupplierComply benchmarks')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    formats = subparsers.add_parser('formats', help='PNG vs SVG render time and size')
+    formats.add_argument('--count', type=int, default=200)
+    formats.set_defaults(func=bench_formats)
+
+    png_presets = subparsers.add_parser('png-presets', help='1-bit PNG bytes and encode time per preset')
+    png_presets.add_argument('--count', type=int, default=100)
+    png_presets.set_defaults(func=bench_png_presets)
+
+    check_digits = subparsers.add_parser('check-digits', help='Scalar vs vectorized GTIN validation')
+    check_digits.add_argument('--count', type=int, default=100000)
+    check_digits.set_defaults(func=bench_check_digits)
+
+    gtin_stress = subparsers.add_parser(
+        'gtin-stress', help='Concurrent GTIN allocation uniqueness check (uses DATABASE_URL)'
+    )
+    gtin_stress.add_argument('--user-id', type=int, default=1)
+    gtin_stress.add_argument('--processes', type=int, default=4)
+    gtin_stress.add_argument('--threads', type=int, default=4)
+    gtin_stress.add_argument('--count', type=int, default=200, help='allocation calls per thread')
+    gtin_stress.add_argument('--block-size', type=int, default=10)
+    gtin_stress.set_defaults(func=bench_gtin_stress)
+
+    labels = subparsers.add_parser('labels', help='Label-sheet PDF throughput')
+    labels.add_argument('--count', type=int, default=5000)
+    labels.add_argument('--template', default='a4-3x8')
+    labels.add_argument('--output', default='/tmp/labels-benchmark.pdf')
+    labels.set_defaults(func=bench_labels)
+
+    storage = subparsers.add_parser('storage', help='Image storage put/put_many throughput')
+    storage.add_argument('--backend', default='local', choices=['local', 'cloudinary', 's3'])
+    storage.add_argument('--count', type=int, default=200)
+    storage.add_argument('--pool-size', type=int, default=8)
+    storage.set_defaults(func=bench_storage)
+
+    gs1_engine = subparsers.add_parser('gs1', help='GS1 element string encode/decode throughput')
+    gs1_engine.add_argument('--count', type=int, default=1000000)
+    gs1_engine.set_defaults(func=bench_gs1)
+
+    lookup = subparsers.add_parser('lookup', help='Scan lookup throughput (temporary SQLite unless --database)')
+    lookup.add_argument('--count', type=int, default=20000, help='scans')
+    lookup.add_argument('--products', type=int, default=5000)
+    lookup.add_argument('--batch', type=int, default=100, help='scans per lookup request')
+    lookup.add_argument('--database', default=None, help='SQLAlchemy URL (default: temporary SQLite file)')
+    lookup.set_defaults(func=bench_lookup)
+
+    export = subparsers.add_parser(
+        'export', help='KEMSA export time, first byte and peak RSS per catalogue size (temporary SQLite unless --database)'
+    )
+    export.add_argument('--sizes', default='10000,100000,500000', help='comma-separated product counts')
+    export.add_argument('--formats', default='xlsx,csv,ndjson', help='comma-separated: xlsx, csv, ndjson')
+    export.add_argument('--legacy', action='store_true', help='also run the old in-memory workbook export')
+    export.add_argument('--database', default=None, help='SQLAlchemy URL of an empty database (default: temporary SQLite file)')
+    export.set_defaults(func=bench_export)
+
+    product_import = subparsers.add_parser('import', help='KEMSA CSV import throughput (temporary SQLite unless --database)')
+    product_import.add_argument('--count', type=int, default=100000, help='CSV rows')
+    product_import.add_argument('--invalid-every', type=int, default=100, help='one invalid row in this many')
+    product_import.add_argument('--database', default=None, help='SQLAlchemy URL (default: temporary SQLite file)')
+    product_import.set_defaults(func=bench_import)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+CLI Commands for SupplierComply
+Maintenance commands run with `flask <command>`
+"""
+
+import re
+
+import click
+from sqlalchemy import update
+
+from extensions import db, upload_queue, upload_staging
+from models import Product
+from usage import reconcile_usage
+from idempotency import purge_expired_keys
+from routes_barcode import image_signature
+
+# On-demand image URLs stored before they were signed
+UNSIGNED_IMAGE_URL = re.compile(r'/barcode/(\d+)\.(png|svg)\?id=(\d+)$')
+
+
+def register_commands(app):
+    """Register maintenance commands on the Flask CLI."""
+
+    @app.cli.command('retry-uploads')
+    @click.option('--include-failed/--pending-only', default=True,
+                  help='Also retry images whose upload gave up.')
+    def retry_uploads(include_failed):
+        """Re-upload barcode images left pending (e.g. after a restart) or failed."""
+        statuses = ['pending', 'failed'] if include_failed else ['pending']
+        product_ids = [row.id for row in db.session.query(Product.id).filter(
+            Product.image_status.in_(statuses)
+        )]
+        # Run inline so the command only exits once every upload has finished
+        upload_queue.asynchronous = False
+        upload_queue.submit(product_ids)
+        click.echo(f"Retried {len(product_ids)} barcode uploads")
+    
+    @app.cli.command('reencode-images')
+    @click.option('--batch-size', type=int, default=500, help='Products marked for re-upload at a time.')
+    @click.option('--all-formats', is_flag=True, help='Re-render SVG images too (e.g. after an encoding change).')
+    def reencode_images(batch_size, all_formats):
+        """Re-render uploaded barcodes with the current encoder and preset, replacing the stored files."""
+        # On-demand images (served by /barcode/<gtin>.png) re-render by themselves
+        query = db.session.query(Product.id).filter(
+            Product.image_status == 'ready',
+            Product.barcode_url.isnot(None),
+            Product.barcode_url.notlike('%/barcode/%')
+        )
+        if not all_formats:
+            query = query.filter(db.func.coalesce(Product.barcode_format, 'png') == 'png')
+        product_ids = [row.id for row in query.order_by(Product.id)]
+        
+        upload_queue.asynchronous = False
+        for start in range(0, len(product_ids), batch_size):
+            batch = product_ids[start:start + batch_size]
+            # Pending first, so an interrupted run is finished by retry-uploads
+            db.session.execute(update(Product).where(Product.id.in_(batch)).values(image_status='pending'))
+            db.session.commit()
+            upload_queue.submit(batch)
+            click.echo(f"Re-encoded {min(start + batch_size, len(product_ids))}/{len(product_ids)} images")
+    
+    @app.cli.command('reconcile-usage')
+    @click.option('--user-id', type=int, default=None, help='Only reconcile this user.')
+    def reconcile_usage_command(user_id):
+        """Recompute user_usage_counters from products (run once after deploying, then to repair drift)."""
+        rows = reconcile_usage(user_id)
+        click.echo(f"Wrote {rows} usage counter rows")
+    
+    @app.cli.command('purge-idempotency-keys')
+    def purge_idempotency_keys():
+        """Delete expired Idempotency-Key responses (run from cron, e.g. hourly)."""
+        deleted = purge_expired_keys()
+        click.echo(f"Deleted {deleted} expired idempotency keys")
+    
+    @app.cli.command('purge-staged-uploads')
+    def purge_staged_uploads():
+        """Delete staged KEMSA uploads past UPLOAD_STAGING_TTL (also done on every upload)."""
+        deleted = upload_staging.purge_expired()
+        click.echo(f"Deleted {deleted} expired staged uploads")
+    
+    @app.cli.command('sign-image-urls')
+    @click.option('--batch-size', type=int, default=1000, help='Products updated per transaction.')
+    def sign_image_urls(batch_size):
+        """Add signatures to stored on-demand image URLs, which are not served publicly without one."""
+        products = db.session.query(Product.id, Product.barcode_url).filter(
+            Product.barcode_url.like('%/barcode/%'),
+            Product.barcode_url.notlike('%sig=%')
+        ).order_by(Product.id).all()
+        updates = []
+        for product_id, barcode_url in products:
+            match = UNSIGNED_IMAGE_URL.search(barcode_url)
+            if match and int(match.group(3)) == product_id:
+                gtin, extension, _ = match.groups()
+                updates.append({
+                    'id': product_id,
+                    'barcode_url': f"{barcode_url}&sig={image_signature(product_id, gtin, extension)}"
+                })
+        for start in range(0, len(updates), batch_size):
+            db.session.execute(update(Product), updates[start:start + batch_size])
+            db.session.commit()
+        click.echo(f"Signed {len(updates)} image URLs")
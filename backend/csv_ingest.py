@@ -0,0 +1,176 @@
+"""
+CSV Ingestion for SupplierComply
+Reads uploaded CSV files as a decoded stream (encoding sniffed from the first
+bytes) and profiles them in a single pass, so memory does not grow with the
+size of the upload
+"""
+
+import codecs
+import csv
+import io
+from collections import namedtuple
+
+# Bytes read up front to pick the encoding
+SNIFF_BYTES = 64 * 1024
+
+# Byte order marks, longest first (the UTF-32 LE BOM starts with the UTF-16 LE one)
+BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+# Used when the file is not UTF-8: what Excel on Windows saves "CSV" as
+FALLBACK_ENCODING = 'cp1252'
+
+CSVProfile = namedtuple('CSVProfile', ['encoding', 'headers', 'header_mapping', 'preview_rows', 'total_rows', 'columns'])
+
+
+class CSVIngestError(ValueError):
+    """An upload that cannot be read as CSV."""
+
+
+def normalize_header(header):
+    """Normalize a CSV header: lowercase, underscores for spaces/dashes, no special chars."""
+    normalized = header.lower().strip().replace(' ', '_').replace('-', '_')
+    # Remove any non-alphanumeric characters except underscores
+    return ''.join(c for c in normalized if c.isalnum() or c == '_')
+
+
+def sniff_encoding(head):
+    """
+    Pick the text encoding of a file from its first bytes.
+
+    A byte order mark wins; otherwise UTF-8 if the bytes decode as UTF-8
+    (a character cut off at the end of the sample is allowed), else cp1252.
+    """
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return FALLBACK_ENCODING
+
+
+def open_text(stream):
+    """
+    Wrap an uploaded binary stream as text in its sniffed encoding.
+
+    The stream is decoded in chunks as it is read, never loaded whole.
+    Undefined cp1252 bytes become U+FFFD; invalid UTF-8 after the sniffed
+    sample raises CSVIngestError when reached.
+    """
+    head = stream.read(SNIFF_BYTES)
+    stream.seek(0)
+    encoding = sniff_encoding(head)
+    text = io.TextIOWrapper(
+        stream, encoding=encoding, newline='',
+        errors='replace' if encoding == FALLBACK_ENCODING else 'strict'
+    )
+    return text, encoding
+
+
+def _rows(text):
+    """CSV records from a text stream, skipping blank lines (as csv.DictReader does)."""
+    try:
+        for row in csv.reader(text):
+            if row:
+                yield row
+    except UnicodeDecodeError as e:
+        raise CSVIngestError(f'File is not valid {text.encoding} text: {e.reason}')
+    except csv.Error as e:
+        raise CSVIngestError(f'Malformed CSV: {e}')
+
+
+def profile_csv(stream, preview_limit=5):
+    """
+    Read an uploaded CSV once for its headers, preview, row count and column statistics.
+
+    Args:
+        stream: Binary file stream (e.g. FileStorage.stream); must be seekable
+        preview_limit: Number of data rows to return for the preview
+
+    Returns:
+        CSVProfile: headers are normalized; header_mapping maps each
+        normalized header to the original one; preview_rows are dicts keyed
+        by normalized header; columns holds per-column counts of filled,
+        empty and numeric values, the longest value and a sample value
+
+    Raises:
+        CSVIngestError: If the file is empty or cannot be decoded/parsed
+    """
+    text, encoding = open_text(stream)
+    rows = _rows(text)
+    original_headers = next(rows, None)
+    if original_headers is None:
+        raise CSVIngestError('The file is empty')
+
+    headers = [normalize_header(header) for header in original_headers]
+    # Duplicate normalized headers: the first column wins
+    indexes = {}
+    for index, header in enumerate(headers):
+        indexes.setdefault(header, index)
+    header_mapping = {header: original_headers[index] for header, index in indexes.items()}
+    columns = {header: {'filled': 0, 'empty': 0, 'max_length': 0, 'numeric': 0, 'sample': ''} for header in indexes}
+    stats = [(index, columns[header]) for header, index in indexes.items()]
+
+    preview_rows = []
+    total_rows = 0
+    for row in rows:
+        total_rows += 1
+        width = len(row)
+        if len(preview_rows) < preview_limit:
+            preview_rows.append({header: row[index] if index < width else '' for header, index in indexes.items()})
+        for index, column in stats:
+            value = row[index].strip() if index < width else ''
+            if not value:
+                column['empty'] += 1
+                continue
+            column['filled'] += 1
+            if len(value) > column['max_length']:
+                column['max_length'] = len(value)
+            if not column['sample']:
+                column['sample'] = value
+            if value.replace('.', '', 1).lstrip('-').isdigit():
+                column['numeric'] += 1
+
+    return CSVProfile(encoding, list(indexes), header_mapping, preview_rows, total_rows, columns)
+
+
+def read_mapped_rows(stream, mappings, fields):
+    """
+    Stream an uploaded CSV as dicts of product fields.
+
+    Args:
+        stream: Binary file stream
+        mappings: Dict of field -> CSV column (original or normalized header);
+            unmapped fields fall back to a column named like the field
+        fields: Fields to read
+
+    Yields:
+        Dicts keyed by the fields that were found in the file
+    """
+    text, _ = open_text(stream)
+    rows = _rows(text)
+    original_headers = next(rows, None) or []
+
+    # Resolve mappings against original headers first, then normalized ones
+    headers = {}
+    for index, header in enumerate(original_headers):
+        headers.setdefault(header, index)
+    for index, header in enumerate(original_headers):
+        headers.setdefault(normalize_header(header), index)
+
+    columns = {}
+    for field in fields:
+        column = mappings.get(field) or field
+        if column in headers:
+            columns[field] = headers[column]
+
+    for row in rows:
+        width = len(row)
+        yield {field: row[index] if index < width else '' for field, index in columns.items()}
@@ -5,7 +5,19 @@ Extensions module to avoid circular imports
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_mail import Mail
+from barcode_cache import RenderCache
+from upload_queue import UploadQueue
+from gtin import GtinAllocator
+from barcode_storage import ImageStorage
+from scan_lookup import ProductLookupCache
+from upload_staging import UploadStaging
 
 db = SQLAlchemy()
 login_manager = LoginManager()
 mail = Mail()
+render_cache = RenderCache()
+upload_queue = UploadQueue()
+gtin_allocator = GtinAllocator()
+image_storage = ImageStorage()
+lookup_cache = ProductLookupCache()
+upload_staging = UploadStaging()
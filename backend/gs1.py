@@ -0,0 +1,294 @@
+"""
+GS1 Application Identifiers for SupplierComply
+Encodes and decodes GS1 element strings (bracketed and raw/FNC1 forms)
+against a precompiled AI table with length, character set and date rules
+"""
+
+import calendar
+import re
+from collections import namedtuple
+from datetime import date
+from functools import lru_cache
+
+# Group separator standing in for FNC1 between fields of a raw element string
+GS = '\x1d'
+
+# AIM symbology identifiers scanners may prefix to the data (GS1-128, DataMatrix, QR)
+SYMBOLOGY_PREFIXES = (']C1', ']d2', ']Q3')
+
+# AI prefixes with a predefined length: only these may be followed by the next
+# AI without an FNC1 separator (GS1 General Specifications, figure 5.10.1-2)
+PREDEFINED_LENGTH_PREFIXES = frozenset([
+    '00', '01', '02', '03', '04', '11', '12', '13', '14', '15', '16', '17', '18', '19', '20',
+    '31', '32', '33', '34', '35', '36', '41'
+])
+
+# GS1 AI encodable character set 82, less the parentheses of the bracketed form
+_CSET82 = r"[!\"%&'*+,\-./0-9:;<=>?A-Z_a-z]"
+_CSET82_DESCRIPTION = "GS1 characters (letters, digits and !\"%&'*+,-./:;<=>?_)"
+
+AISpec = namedtuple('AISpec', ['ai', 'title', 'numeric', 'length', 'fixed', 'date', 'fnc1', 'pattern'])
+
+
+class GS1Error(ValueError):
+    """An element string or element value that breaks the GS1 AI rules."""
+
+
+def _spec(ai, title, charset, length, fixed=False, is_date=False):
+    chars = r'\d' if charset == 'N' else _CSET82
+    pattern = re.compile(f"{chars}{{{length}}}" if fixed else f"{chars}{{1,{length}}}")
+    return AISpec(ai, title, charset == 'N', length, fixed, is_date,
+                  ai[:2] not in PREDEFINED_LENGTH_PREFIXES, pattern)
+
+
+def _build_table():
+    specs = [
+        _spec('00', 'SSCC', 'N', 18, fixed=True),
+        _spec('01', 'GTIN', 'N', 14, fixed=True),
+        _spec('02', 'CONTENT', 'N', 14, fixed=True),
+        _spec('10', 'BATCH/LOT', 'X', 20),
+        _spec('11', 'PROD DATE', 'N', 6, fixed=True, is_date=True),
+        _spec('12', 'DUE DATE', 'N', 6, fixed=True, is_date=True),
+        _spec('13', 'PACK DATE', 'N', 6, fixed=True, is_date=True),
+        _spec('15', 'BEST BEFORE', 'N', 6, fixed=True, is_date=True),
+        _spec('16', 'SELL BY', 'N', 6, fixed=True, is_date=True),
+        _spec('17', 'USE BY OR EXPIRY', 'N', 6, fixed=True, is_date=True),
+        _spec('20', 'VARIANT', 'N', 2, fixed=True),
+        _spec('21', 'SERIAL', 'X', 20),
+        _spec('22', 'CPV', 'X', 20),
+        _spec('240', 'ADDITIONAL ID', 'X', 30),
+        _spec('241', 'CUST. PART No.', 'X', 30),
+        _spec('30', 'VAR. COUNT', 'N', 8),
+        _spec('37', 'COUNT', 'N', 8),
+        _spec('400', 'ORDER NUMBER', 'X', 30),
+        _spec('420', 'SHIP TO POST', 'X', 20),
+        _spec('422', 'ORIGIN', 'N', 3, fixed=True),
+        _spec('7003', 'EXPIRY TIME', 'N', 10, fixed=True),
+        _spec('8005', 'PRICE PER UNIT', 'N', 6, fixed=True),
+        _spec('90', 'INTERNAL', 'X', 30),
+    ]
+    # Measures with the decimal point position as the fourth digit (310n, 320n, ...)
+    for base, title in (('310', 'NET WEIGHT (kg)'), ('320', 'NET WEIGHT (lb)'), ('330', 'GROSS WEIGHT (kg)')):
+        specs.extend(_spec(f"{base}{n}", title, 'N', 6, fixed=True) for n in range(6))
+    specs.extend(_spec(f"390{n}", 'AMOUNT', 'N', 15) for n in range(10))
+    specs.extend(_spec(f"41{n}", 'GLN', 'N', 13, fixed=True) for n in range(6))
+    specs.extend(_spec(str(ai), 'INTERNAL', 'X', 90) for ai in range(91, 100))
+    return {spec.ai: spec for spec in specs}
+
+
+AI_TABLE = _build_table()
+
+# Length of an AI by its first two digits, for reading AIs out of a raw string
+AI_LENGTHS = {ai[:2]: len(ai) for ai in AI_TABLE}
+
+_BRACKETED = re.compile(r'\((\d{2,4})\)([^(]*)')
+_BRACKETED_STRING = re.compile(r'(?:\(\d{2,4}\)[^(]*)+')
+
+
+def parse_date(value, today=None):
+    """
+    Read a YYMMDD date field.
+
+    The century is the one that puts the year within 49 years back or 50
+    years ahead of today (GS1 General Specifications 7.12); day 00 means
+    the last day of the month.
+    """
+    if len(value) != 6 or not value.isdigit():
+        raise GS1Error('Dates must be YYMMDD')
+    today = today or date.today()
+    year = today.year - today.year % 100 + int(value[:2])
+    if year - today.year >= 51:
+        year -= 100
+    elif year - today.year <= -50:
+        year += 100
+    month, day = int(value[2:4]), int(value[4:])
+    try:
+        if day == 0:
+            day = calendar.monthrange(year, month)[1]
+        return date(year, month, day)
+    except ValueError:
+        raise GS1Error(f'Invalid date: {value}')
+
+
+@lru_cache(maxsize=65536)
+def _check_date(value):
+    # Validity of a YYMMDD value barely depends on the day it is checked, so
+    # repeated dates in a batch skip the calendar work
+    parse_date(value)
+
+
+def format_date(value):
+    """Format a date (or a 'YYYY-MM-DD' string) as YYMMDD."""
+    if isinstance(value, str):
+        try:
+            value = date.fromisoformat(value)
+        except ValueError:
+            raise GS1Error(f'Dates must be YYYY-MM-DD: {value}')
+    return value.strftime('%y%m%d')
+
+
+def _pattern_message(spec):
+    if spec.fixed:
+        return f"AI ({spec.ai}) {spec.title} must be {spec.length} {'digits' if spec.numeric else 'characters'}"
+    return f"AI ({spec.ai}) {spec.title} must be 1-{spec.length} {'digits' if spec.numeric else _CSET82_DESCRIPTION}"
+
+
+def _check(ai, value):
+    spec = AI_TABLE.get(ai)
+    if spec is None:
+        raise GS1Error(f'Unknown AI ({ai})')
+    if not spec.pattern.fullmatch(value):
+        raise GS1Error(_pattern_message(spec))
+    if spec.date:
+        _check_date(value)
+    return spec
+
+
+def validate_element(ai, value):
+    """
+    Check one element value against its AI.
+
+    Raises:
+        GS1Error: If the AI is unknown or the value breaks its rules
+    """
+    _check(ai, value)
+
+
+def client_rules(ais):
+    """
+    AI rules for browser-side validation (static/js/barcode-preview.js).
+
+    Patterns are plain regular expressions valid in JavaScript, and messages
+    are the ones the server raises, so a value the preview accepts is one
+    encode() accepts.
+
+    Returns:
+        Dict of AI -> {title, pattern, date, fnc1, message}
+    """
+    return {
+        ai: {
+            'title': AI_TABLE[ai].title,
+            'pattern': AI_TABLE[ai].pattern.pattern,
+            'date': AI_TABLE[ai].date,
+            'fnc1': AI_TABLE[ai].fnc1,
+            'message': _pattern_message(AI_TABLE[ai])
+        }
+        for ai in ais
+    }
+
+
+def encode(elements, bracketed=True):
+    """
+    Build a GS1 element string.
+
+    Args:
+        elements: Iterable of (ai, value) pairs, in symbol order; pairs with
+            an empty value are left out
+        bracketed: True for the human-readable "(01)...(10)..." form; False
+            for the raw form, with GS after every field that needs an FNC1
+            separator (never after the last)
+
+    Raises:
+        GS1Error: If an element breaks the AI rules
+    """
+    parts = []
+    separate = False
+    for ai, value in elements:
+        if not value:
+            continue
+        spec = _check(ai, value)
+        if bracketed:
+            parts.append(f"({ai}){value}")
+        else:
+            parts.append(f"{GS if separate else ''}{ai}{value}")
+            separate = spec.fnc1
+    if not parts:
+        raise GS1Error('No elements to encode')
+    return ''.join(parts)
+
+
+def encode_many(element_lists, bracketed=True):
+    """
+    Build many element strings in one call.
+
+    Returns:
+        Tuple (strings, errors): strings[i] is None where errors[i] holds the message
+    """
+    strings, errors = [], []
+    for elements in element_lists:
+        try:
+            strings.append(encode(elements, bracketed))
+            errors.append(None)
+        except GS1Error as e:
+            strings.append(None)
+            errors.append(str(e))
+    return strings, errors
+
+
+def decode(text):
+    """
+    Split a GS1 element string into (ai, value) pairs.
+
+    Reads the bracketed form and the raw form (with an optional symbology
+    prefix, a leading FNC1/GS and GS separators); every value is checked
+    against its AI.
+
+    Raises:
+        GS1Error: If the string cannot be read or an element breaks its AI rules
+    """
+    text = (text or '').strip()
+    for prefix in SYMBOLOGY_PREFIXES:
+        if text.startswith(prefix):
+            text = text[len(prefix):]
+            break
+
+    elements = []
+    if text.startswith('('):
+        if not _BRACKETED_STRING.fullmatch(text):
+            raise GS1Error('Malformed bracketed element string')
+        for ai, value in _BRACKETED.findall(text):
+            _check(ai, value)
+            elements.append((ai, value))
+    else:
+        position = 0
+        length = len(text)
+        while position < length:
+            if text[position] == GS:
+                position += 1
+                continue
+            ai = text[position:position + AI_LENGTHS.get(text[position:position + 2], 2)]
+            spec = AI_TABLE.get(ai)
+            if spec is None:
+                raise GS1Error(f'Unknown AI at position {position}: {ai}')
+            start = position + len(ai)
+            if spec.fixed:
+                end = start + spec.length
+            else:
+                end = text.find(GS, start)
+                end = length if end == -1 else end
+            value = text[start:end]
+            _check(ai, value)
+            elements.append((ai, value))
+            position = end
+
+    if not elements:
+        raise GS1Error('No elements found')
+    return elements
+
+
+def decode_many(texts):
+    """
+    Split many element strings in one call.
+
+    Returns:
+        Tuple (element_lists, errors): element_lists[i] is None where errors[i] holds the message
+    """
+    element_lists, errors = [], []
+    for text in texts:
+        try:
+            element_lists.append(decode(text))
+            errors.append(None)
+        except GS1Error as e:
+            element_lists.append(None)
+            errors.append(str(e))
+    return element_lists, errors
@@ -0,0 +1,212 @@
+"""
+GTIN Utilities for SupplierComply
+Vectorized GS1 check digits and collision-free GTIN-14 allocation backed by
+a per-user counter table, with blocks of serials reserved per worker process
+"""
+
+import logging
+import os
+import threading
+import numpy as np
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+# GTIN-14 layout: indicator (1) + user id (5) + serial (7) + check digit (1)
+GTIN_INDICATOR = '2'
+USER_DIGITS = 5
+SERIAL_DIGITS = 7
+MAX_SERIAL = 10 ** SERIAL_DIGITS - 1
+
+# Full code lengths accepted by the batch validator: GTIN-8/12/13/14 and SSCC (18)
+GS1_CODE_LENGTHS = (8, 12, 13, 14, 18)
+GTIN_LENGTHS = (8, 12, 13, 14)
+MAX_CODE_LENGTH = 18
+
+# GS1 weights for a right-aligned base of up to 17 digits: 3 on the rightmost digit, alternating with 1
+_CHECK_WEIGHTS = np.array(
+    [3 if (MAX_CODE_LENGTH - 2 - i) % 2 == 0 else 1 for i in range(MAX_CODE_LENGTH - 1)],
+    dtype=np.int64
+)
+
+
+def _digit_matrix(values, width):
+    """
+    Right-align digit strings into an (n, width) integer matrix.
+
+    Left padding with zeros does not change a GS1 check digit, so codes of
+    different lengths can share one matrix.
+
+    Returns:
+        Tuple (digits, well_formed) where well_formed flags rows that were
+        all digits and no wider than width
+    """
+    values = [str(value).strip() for value in values]
+    lengths = np.fromiter(map(len, values), dtype=np.int64, count=len(values))
+    padded = ''.join(value.rjust(width, '0') if len(value) <= width else '?' * width for value in values)
+    digits = np.frombuffer(padded.encode('ascii', errors='replace'), dtype=np.uint8)
+    digits = digits.reshape(len(values), width).astype(np.int64) - ord('0')
+    well_formed = (lengths <= width) & ((digits >= 0) & (digits <= 9)).all(axis=1)
+    return digits, well_formed
+
+
+def calculate_check_digits(bases):
+    """
+    Compute GS1 check digits for many code bases (codes without their check digit).
+
+    Args:
+        bases: Iterable of digit strings of up to 17 digits (any GTIN or SSCC base)
+
+    Returns:
+        NumPy int array of check digits, -1 where a base is not purely digits
+    """
+    digits, well_formed = _digit_matrix(bases, MAX_CODE_LENGTH - 1)
+    check_digits = (10 - (digits @ _CHECK_WEIGHTS) % 10) % 10
+    check_digits[~well_formed] = -1
+    return check_digits
+
+
+def validate_gtins(codes, lengths=GS1_CODE_LENGTHS):
+    """
+    Validate a column of GTIN-8/12/13/14 or SSCC codes in one vectorized pass.
+
+    Args:
+        codes: Iterable of code strings including their check digit
+        lengths: Code lengths to accept
+
+    Returns:
+        Tuple (valid, corrected): a boolean mask, and an object array holding
+        each code with a recomputed check digit (None if it cannot be fixed,
+        i.e. wrong length or non-digits)
+    """
+    codes = [str(code).strip() for code in codes]
+    if not codes:
+        return np.zeros(0, dtype=bool), np.empty(0, dtype=object)
+
+    digits, well_formed = _digit_matrix(codes, MAX_CODE_LENGTH)
+    code_lengths = np.fromiter(map(len, codes), dtype=np.int64, count=len(codes))
+    fixable = well_formed & np.isin(code_lengths, lengths)
+
+    check_digits = (10 - (digits[:, :-1] @ _CHECK_WEIGHTS) % 10) % 10
+    valid = fixable & (check_digits == digits[:, -1])
+
+    # Valid codes are their own correction; only rebuild the ones with a wrong check digit
+    corrected = np.empty(len(codes), dtype=object)
+    corrected[valid] = np.array(codes, dtype=object)[valid]
+    for i in np.flatnonzero(fixable & ~valid).tolist():
+        corrected[i] = f"{codes[i][:-1]}{check_digits[i]}"
+    return valid, corrected
+
+
+def calculate_check_digit(gtin_base):
+    """Calculate GTIN-14 check digit."""
+    return int(calculate_check_digits([gtin_base])[0])
+
+
+def is_valid_gtin(gtin):
+    """Check that a GTIN-14 is all digits with a correct check digit."""
+    return bool(validate_gtins([gtin], lengths=(14,))[0][0])
+
+
+def pad_gtin(gtin):
+    """
+    Left-pad a GTIN-8/12/13 with zeros to its GTIN-14 form (the check digit
+    stays valid). Products from before GTIN-14 allocation store 12 digits.
+    Other values are returned unchanged.
+    """
+    if gtin and len(gtin) in GTIN_LENGTHS:
+        return gtin.zfill(14)
+    return gtin
+
+
+def format_gtins(user_id, serials):
+    """Build GTIN-14s from a user id and serial numbers, check digits computed in one pass."""
+    if user_id >= 10 ** USER_DIGITS:
+        raise ValueError(f"User id {user_id} does not fit in a GTIN")
+    if serials and max(serials) > MAX_SERIAL:
+        raise ValueError(f"GTIN serials exhausted for user {user_id}")
+    bases = [f"{GTIN_INDICATOR}{user_id:0{USER_DIGITS}d}{serial:0{SERIAL_DIGITS}d}" for serial in serials]
+    return [f"{base}{check_digit}" for base, check_digit in zip(bases, calculate_check_digits(bases).tolist())]
+
+
+class GtinAllocator:
+    """
+    Hands out unique GTIN serials per user.
+
+    Each worker process reserves a block of serials with a single atomic
+    UPDATE on gtin_counters and then allocates from memory, so uniqueness
+    holds across gunicorn workers and nodes without a DB round trip per
+    barcode. Serials left in a block when a worker exits are skipped.
+    """
+
+    def __init__(self, app=None):
+        self.block_size = 100
+        self._blocks = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configure the reservation block size from the Flask app config."""
+        self.block_size = app.config.get('GTIN_BLOCK_SIZE', self.block_size)
+        app.extensions['gtin_allocator'] = self
+
+    def allocate(self, user_id, count=1):
+        """
+        Allocate GTINs for a user.
+
+        Args:
+            user_id: Owner of the GTINs
+            count: Number of GTINs to allocate
+
+        Returns:
+            List of unique GTIN-14 strings
+        """
+        with self._lock:
+            # Blocks must never be shared with a forked child process
+            if self._pid != os.getpid():
+                self._blocks = {}
+                self._pid = os.getpid()
+
+            serials = []
+            while len(serials) < count:
+                next_serial, end = self._blocks.get(user_id, (0, 0))
+                if next_serial >= end:
+                    size = max(self.block_size, count - len(serials))
+                    next_serial = self._reserve_block(user_id, size)
+                    end = next_serial + size
+                take = min(end - next_serial, count - len(serials))
+                serials.extend(range(next_serial, next_serial + take))
+                self._blocks[user_id] = (next_serial + take, end)
+
+        return format_gtins(user_id, serials)
+
+    def _reserve_block(self, user_id, size):
+        """Atomically advance the user's counter by size and return the first serial of the block."""
+        # Import here to avoid circular imports (extensions imports this module)
+        from extensions import db
+        from models import GtinCounter
+
+        counters = GtinCounter.__table__
+        for _ in range(3):
+            # Own transaction so the reservation survives a rollback of the request
+            with db.engine.begin() as conn:
+                end = conn.execute(
+                    update(counters)
+                    .where(counters.c.user_id == user_id)
+                    .values(next_serial=counters.c.next_serial + size)
+                    .returning(counters.c.next_serial)
+                ).scalar()
+            if end is not None:
+                return end - size
+
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(insert(counters).values(user_id=user_id, next_serial=1))
+            except IntegrityError:
+                # Another worker created the counter first
+                pass
+
+        raise RuntimeError(f"Could not reserve GTIN serials for user {user_id}")
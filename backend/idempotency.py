@@ -0,0 +1,197 @@
+"""
+Idempotency Keys for SupplierComply
+Replays the stored response when a client retries a request with the same
+Idempotency-Key header, instead of generating or exporting a second time
+"""
+
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import Response, current_app, jsonify, make_response, request
+from flask_login import current_user
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+# Response headers stored with the body and sent again on replay
+REPLAY_HEADERS = ('Content-Type', 'Content-Disposition', 'Location')
+
+FORM_MIMETYPES = ('multipart/form-data', 'application/x-www-form-urlencoded')
+
+
+def request_fingerprint():
+    """
+    Hash the method, path, query string and body of the current request.
+
+    Uploaded files are hashed in chunks and rewound, so the view can still
+    read them.
+    """
+    digest = hashlib.sha256(f"{request.method} {request.full_path}".encode('utf-8'))
+    if request.mimetype in FORM_MIMETYPES:
+        for name, value in sorted(request.form.items(multi=True)):
+            digest.update(f"\0{name}={value}".encode('utf-8'))
+        for name, file in sorted(request.files.items(multi=True), key=lambda item: item[0]):
+            digest.update(f"\0{name}:{file.filename}\0".encode('utf-8'))
+            for chunk in iter(lambda: file.stream.read(64 * 1024), b''):
+                digest.update(chunk)
+            file.stream.seek(0)
+    else:
+        digest.update(request.get_data(cache=True))
+    return digest.hexdigest()
+
+
+def _claim(key, fingerprint):
+    """
+    Reserve a key for the current user before the view runs.
+
+    Returns:
+        None when the key was claimed (run the view), otherwise the existing
+        IdempotencyKey row (replay it, or reject the request)
+    """
+    now = datetime.utcnow()
+    ttl = timedelta(hours=current_app.config.get('IDEMPOTENCY_TTL_HOURS', 24))
+    lock_timeout = timedelta(seconds=current_app.config.get('IDEMPOTENCY_LOCK_SECONDS', 300))
+
+    record = db.session.get(IdempotencyKey, (current_user.id, key))
+    if record is not None and record.expires_at <= now:
+        db.session.delete(record)
+        db.session.flush()
+        record = None
+
+    if record is None:
+        db.session.add(IdempotencyKey(
+            user_id=current_user.id, key=key, fingerprint=fingerprint, created_at=now, expires_at=now + ttl
+        ))
+        try:
+            db.session.commit()
+            return None
+        except IntegrityError:
+            # A concurrent request with the same key got there first
+            db.session.rollback()
+            return db.session.get(IdempotencyKey, (current_user.id, key))
+
+    # A request that never finished (e.g. its worker was killed) gives up the key
+    if record.status_code is None and record.created_at <= now - lock_timeout:
+        taken = db.session.execute(
+            update(IdempotencyKey).where(
+                IdempotencyKey.user_id == current_user.id,
+                IdempotencyKey.key == key,
+                IdempotencyKey.status_code.is_(None),
+                IdempotencyKey.created_at == record.created_at
+            ).values(fingerprint=fingerprint, created_at=now, expires_at=now + ttl)
+        ).rowcount
+        db.session.commit()
+        if taken:
+            return None
+        db.session.refresh(record)
+    return record
+
+
+def _store(key, response):
+    """Save the view's response for replay, or release the key if it cannot be replayed."""
+    max_body = current_app.config.get('IDEMPOTENCY_MAX_BODY_BYTES', 10 * 1024 * 1024)
+    # Streams of unknown length (e.g. CSV exports) would have to be buffered whole
+    unbounded = response.is_streamed and response.content_length is None
+    keep = response.status_code < 500 and not unbounded and (response.content_length or 0) <= max_body
+    if keep:
+        # Buffer send_file responses so their body can be saved (and still sent)
+        response.direct_passthrough = False
+        body = response.get_data()
+        keep = len(body) <= max_body
+
+    where = (IdempotencyKey.user_id == current_user.id, IdempotencyKey.key == key)
+    if keep:
+        db.session.execute(update(IdempotencyKey).where(*where).values(
+            status_code=response.status_code,
+            headers=json.dumps({name: response.headers[name] for name in REPLAY_HEADERS if name in response.headers}),
+            body=body
+        ))
+    else:
+        # Server errors, unbounded streams and oversized bodies are not replayed; let the client retry
+        db.session.execute(delete(IdempotencyKey).where(*where))
+    db.session.commit()
+
+
+def _replay(record):
+    """Rebuild the stored response."""
+    response = Response(record.body, status=record.status_code)
+    for name, value in json.loads(record.headers or '{}').items():
+        response.headers[name] = value
+    response.headers[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(view):
+    """
+    Make a view safe to retry with an Idempotency-Key header.
+
+    The first request with a key runs the view and stores its response (for
+    IDEMPOTENCY_TTL_HOURS); retries with the same key and body get that
+    response back without running the view. Requests without the header are
+    unaffected. Use below @login_required, since keys are per user.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER, '').strip()
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({
+                'success': False,
+                'error': f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters'
+            }), 400
+
+        try:
+            fingerprint = request_fingerprint()
+            record = _claim(key, fingerprint)
+        except Exception as e:
+            logger.error(f"Idempotency key lookup error: {str(e)}")
+            db.session.rollback()
+            return jsonify({'success': False, 'error': 'Failed to check idempotency key'}), 500
+
+        if record is not None:
+            if record.fingerprint != fingerprint:
+                return jsonify({
+                    'success': False,
+                    'error': f'{IDEMPOTENCY_HEADER} was already used for a different request'
+                }), 422
+            if record.status_code is None:
+                return jsonify({
+                    'success': False,
+                    'error': f'A request with this {IDEMPOTENCY_HEADER} is still in progress'
+                }), 409
+            return _replay(record)
+
+        response = make_response(view(*args, **kwargs))
+        try:
+            _store(key, response)
+        except Exception as e:
+            logger.error(f"Idempotency key store error: {str(e)}")
+            db.session.rollback()
+        return response
+
+    return wrapper
+
+
+def purge_expired_keys():
+    """
+    Delete idempotency keys past their TTL.
+
+    Returns:
+        Number of keys deleted
+    """
+    deleted = db.session.execute(
+        delete(IdempotencyKey).where(IdempotencyKey.expires_at <= datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    return deleted
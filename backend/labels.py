@@ -0,0 +1,176 @@
+"""
+Label Sheets for SupplierComply
+Lays GS1-128 barcodes out on printable label stock as a PDF, drawn with
+ReportLab's native Code128 so no barcode images need to be fetched
+"""
+
+import logging
+import tempfile
+from reportlab.graphics.barcode.code128 import Code128
+from reportlab.lib.pagesizes import A4, letter
+from reportlab.lib.units import mm
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+
+from barcode_render import FNC1, build_product_barcode_value, symbol_data
+from gs1 import GS1Error
+
+logger = logging.getLogger(__name__)
+
+# Sheet layouts: page size, grid, margins and gaps between labels (points)
+LABEL_TEMPLATES = {
+    'a4-3x8': {'pagesize': A4, 'columns': 3, 'rows': 8, 'margin_x': 0, 'margin_y': 4.5 * mm,
+               'gap_x': 0, 'gap_y': 0, 'label': 'A4, 24 labels (70 x 36 mm)'},
+    'a4-3x7': {'pagesize': A4, 'columns': 3, 'rows': 7, 'margin_x': 0, 'margin_y': 15 * mm,
+               'gap_x': 0, 'gap_y': 0, 'label': 'A4, 21 labels (70 x 38 mm)'},
+    'a4-4x10': {'pagesize': A4, 'columns': 4, 'rows': 10, 'margin_x': 5 * mm, 'margin_y': 13.5 * mm,
+                'gap_x': 2.5 * mm, 'gap_y': 0, 'label': 'A4, 40 labels (48.5 x 27 mm)'},
+    'a4-2x7': {'pagesize': A4, 'columns': 2, 'rows': 7, 'margin_x': 4.5 * mm, 'margin_y': 15 * mm,
+               'gap_x': 2.5 * mm, 'gap_y': 0, 'label': 'A4, 14 labels (99 x 38 mm)'},
+    'letter-3x10': {'pagesize': letter, 'columns': 3, 'rows': 10, 'margin_x': 4.8 * mm, 'margin_y': 12.7 * mm,
+                    'gap_x': 3.2 * mm, 'gap_y': 0, 'label': 'Letter, 30 labels (66.7 x 25.4 mm)'},
+}
+
+DEFAULT_TEMPLATE = 'a4-3x8'
+
+# Padding inside each label and the share of its height given to the bars
+LABEL_PADDING = 2 * mm
+BAR_HEIGHT_RATIO = 0.5
+
+
+def _label_cells(template):
+    """Lower-left corner of every label on a page, in reading order."""
+    page_width, page_height = template['pagesize']
+    columns, rows = template['columns'], template['rows']
+    width = (page_width - 2 * template['margin_x'] - (columns - 1) * template['gap_x']) / columns
+    height = (page_height - 2 * template['margin_y'] - (rows - 1) * template['gap_y']) / rows
+    cells = [
+        (template['margin_x'] + column * (width + template['gap_x']),
+         page_height - template['margin_y'] - (row + 1) * height - row * template['gap_y'])
+        for row in range(rows) for column in range(columns)
+    ]
+    return cells, width, height
+
+
+def _fit_text(text, font, size, width):
+    """Shrink text (down to 4pt, then truncate) so it fits the given width."""
+    while size > 4 and stringWidth(text, font, size) > width:
+        size -= 0.5
+    while text and stringWidth(text, font, size) > width:
+        text = text[:-1]
+    return text, size
+
+
+def _bar_path(barcode_value):
+    """
+    GS1-128 bars as a PDF fill path in module units (one unit wide, one unit high).
+
+    The bars encode FNC1 and the raw AI data; the bracketed element string
+    is only drawn as text.
+
+    Emitting integer rectangles once and scaling them with the graphics state is
+    several times faster than ReportLab drawing each bar with float coordinates.
+
+    Returns:
+        Tuple (path, modules)
+    """
+    barcode = Code128(FNC1 + symbol_data(barcode_value), humanReadable=False, quiet=0)
+    barcode.validate()
+    barcode.encode()
+
+    left = 0
+    rects = []
+    for c in barcode.decompose():
+        if c.isupper():
+            width = ord(c) - ord('A') + 1
+            rects.append(f"{left} 0 {width} 1 re")
+            left += width
+        elif c.islower():
+            left += ord(c) - ord('a') + 1
+    return ' '.join(rects) + ' f', left
+
+
+def _draw_label(pdf, product, barcode_value, x, y, width, height):
+    """Draw one product label: name, GS1-128 bars, element string and batch/expiry line."""
+    inner_width = width - 2 * LABEL_PADDING
+    bar_height = height * BAR_HEIGHT_RATIO
+
+    # Scale the bars to fill the label width
+    bar_path, modules = _bar_path(barcode_value)
+
+    top = y + height - LABEL_PADDING
+    name, size = _fit_text(product.name, 'Helvetica-Bold', 7, inner_width)
+    pdf.setFont('Helvetica-Bold', size)
+    pdf.drawString(x + LABEL_PADDING, top - 7, name)
+    pdf.saveState()
+    pdf.transform(inner_width / modules, 0, 0, bar_height, x + LABEL_PADDING, top - 9 - bar_height)
+    pdf.addLiteral(bar_path)
+    pdf.restoreState()
+
+    details = f"Batch: {product.batch_number or 'N/A'}"
+    if product.expiry_date:
+        details += f"  Exp: {product.expiry_date.strftime('%Y-%m-%d')}"
+    for offset, line in ((16, barcode_value), (23, details)):
+        line, size = _fit_text(line, 'Helvetica', 6, inner_width)
+        pdf.setFont('Helvetica', size)
+        pdf.drawCentredString(x + width / 2, top - offset - bar_height, line)
+
+
+def render_label_sheet(products, output, template_name=DEFAULT_TEMPLATE, copies=1):
+    """
+    Draw labels for products onto sheets of label stock.
+
+    Pages are drawn straight onto the canvas as products arrive, so only the
+    compressed page streams are kept, never a list of flowables. Products
+    whose stored fields are not valid GS1 data get no label and are logged.
+
+    Args:
+        products: Iterable of Product-like objects (name, gtin, batch_number, expiry_date)
+        output: Binary file object to write the PDF to
+        template_name: Key of LABEL_TEMPLATES
+        copies: Labels printed per product
+
+    Returns:
+        Tuple (labels, pages, skipped): skipped lists the ids of products without a label
+    """
+    template = LABEL_TEMPLATES[template_name]
+    cells, width, height = _label_cells(template)
+    pdf = canvas.Canvas(output, pagesize=template['pagesize'], pageCompression=1)
+    pdf.setTitle('SupplierComply Barcode Labels')
+
+    labels = 0
+    skipped = []
+    for product in products:
+        try:
+            barcode_value = build_product_barcode_value(product)
+        except GS1Error as e:
+            logger.warning(f"Label sheet skipped product {product.id}: {str(e)}")
+            skipped.append(product.id)
+            continue
+        for _ in range(copies):
+            if labels and labels % len(cells) == 0:
+                pdf.showPage()
+            x, y = cells[labels % len(cells)]
+            _draw_label(pdf, product, barcode_value, x, y, width, height)
+            labels += 1
+
+    pdf.showPage()
+    pdf.save()
+    return labels, max(1, -(-labels // len(cells))), skipped
+
+
+def stream_label_sheet(products, template_name=DEFAULT_TEMPLATE, copies=1, chunk_size=64 * 1024):
+    """
+    Render a label sheet and yield the PDF in chunks.
+
+    ReportLab writes the cross-reference table only once every page is known,
+    so the file is spooled (to disk once it grows) and then streamed.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=4 * 1024 * 1024) as output:
+        render_label_sheet(products, output, template_name, copies)
+        output.seek(0)
+        while True:
+            chunk = output.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
@@ -19,6 +19,7 @@ class User(db.Model):
     payment_status = db.Column(db.String(20), default='free_trial')
     trial_ends_at = db.Column(db.DateTime)
     paid_until = db.Column(db.DateTime)
+    barcode_format = db.Column(db.String(10), default='png')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -55,29 +56,36 @@ class User(db.Model):
         return self.is_paid() or self.is_trial_active()
     
     def get_barcode_count_this_month(self):
-        """Get number of barcodes generated this month."""
-        from sqlalchemy import extract
-        start_of_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        return Product.query.filter(
-            Product.user_id == self.id,
-            Product.created_at >= start_of_month
-        ).count()
+        """Get number of barcodes generated this month (from the usage counters)."""
+        from usage import get_usage
+        return get_usage(self.id)[0]
     
     def get_expiring_products(self, days):
         """Get products expiring within specified days."""
+        query = self.expiring_products_query(days)
+        return query.all() if query is not None else []
+    
+    def expiring_products_query(self, days):
+        """Query for products expiring within specified days (None for unpaid accounts)."""
         if not self.is_paid():
-            return []
+            return None
         expiry_threshold = datetime.utcnow().date() + timedelta(days=days)
         return Product.query.filter(
             Product.user_id == self.id,
             Product.expiry_date <= expiry_threshold,
             Product.expiry_date >= datetime.utcnow().date()
-        ).all()
+        )
 
 
 class Product(db.Model):
     """Product model for barcode generation."""
     __tablename__ = 'products'
+    __table_args__ = (
+        # Keyset pagination of a user's history on (created_at, id)
+        db.Index('idx_products_user_created_at', 'user_id', 'created_at', 'id'),
+        # On-demand image lookups by GTIN
+        db.Index('idx_products_gtin', 'gtin'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -87,9 +95,43 @@ class Product(db.Model):
     quantity = db.Column(db.Integer)
     gtin = db.Column(db.String(14))
     barcode_url = db.Column(db.String(500))
+    barcode_format = db.Column(db.String(10), default='png')
+    image_status = db.Column(db.String(20), default='ready')
+    watermarked = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
+class GtinCounter(db.Model):
+    """Next unreserved GTIN serial per user (advanced a block at a time)."""
+    __tablename__ = 'gtin_counters'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    next_serial = db.Column(db.BigInteger, nullable=False, default=1)
+
+
+class UsageCounter(db.Model):
+    """Barcodes created per user, per month ('YYYY-MM') and in total ('total')."""
+    __tablename__ = 'user_usage_counters'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    period = db.Column(db.String(7), primary_key=True)
+    barcode_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class IdempotencyKey(db.Model):
+    """Response of a request sent with an Idempotency-Key header, replayed for retries until it expires."""
+    __tablename__ = 'idempotency_keys'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    key = db.Column(db.String(255), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer)  # NULL while the first request is running
+    headers = db.Column(db.Text)
+    body = db.Column(db.LargeBinary)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
 class Payment(db.Model):
     """Payment log model."""
     __tablename__ = 'payments'
@@ -0,0 +1,123 @@
+"""
+Product Import for SupplierComply
+Loads validated product rows in batches: PostgreSQL COPY where available,
+a single executemany Core INSERT per batch elsewhere (SQLite in development),
+and reports the ids of the rows it wrote
+"""
+
+import csv
+import io
+import logging
+
+from sqlalchemy import bindparam, text
+
+from extensions import db
+from models import Product
+
+logger = logging.getLogger(__name__)
+
+# Rows sent to the database per COPY / INSERT (each batch is its own savepoint)
+IMPORT_BATCH_ROWS = 5000
+
+# Product columns written by an import, in COPY column order (COPY sets
+# ids reserved from the products sequence)
+IMPORT_COLUMNS = (
+    'id', 'user_id', 'name', 'batch_number', 'expiry_date', 'quantity', 'gtin',
+    'barcode_url', 'barcode_format', 'image_status', 'watermarked', 'created_at'
+)
+
+# Columns whose empty value COPY reads as NULL (batch_number keeps '' like other inserts)
+COPY_NULL_COLUMNS = ('expiry_date', 'barcode_url')
+
+RESERVE_IDS_SQL = text("SELECT nextval(pg_get_serial_sequence('products', 'id')) FROM generate_series(1, :count)")
+
+
+def _copy_value(value):
+    # Booleans as PostgreSQL spells them; None is written as "" (see COPY_NULL_COLUMNS)
+    if value is True:
+        return 't'
+    if value is False:
+        return 'f'
+    if value is None or isinstance(value, (int, str)):
+        return value
+    return value.isoformat()
+
+
+def copy_products(connection, rows):
+    """
+    Write product rows with COPY ... FROM STDIN (psycopg2).
+
+    Args:
+        connection: SQLAlchemy Connection bound to PostgreSQL
+        rows: List of dicts keyed by IMPORT_COLUMNS
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC, lineterminator='\n')
+    writer.writerows([_copy_value(row[column]) for column in IMPORT_COLUMNS] for row in rows)
+    buffer.seek(0)
+
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY products ({', '.join(IMPORT_COLUMNS)}) FROM STDIN "
+            f"WITH (FORMAT csv, FORCE_NULL ({', '.join(COPY_NULL_COLUMNS)}))",
+            buffer
+        )
+    finally:
+        cursor.close()
+
+
+def load_products(rows, batch_rows=IMPORT_BATCH_ROWS, make_url=None):
+    """
+    Insert product rows in the current session's transaction, batch by batch.
+
+    A batch the database rejects is rolled back to its savepoint and
+    reported; the batches before and after it are still loaded. The caller
+    commits.
+
+    Args:
+        rows: List of dicts keyed by IMPORT_COLUMNS other than id
+        batch_rows: Rows per COPY / INSERT
+        make_url: Optional callable (product_id, row) -> barcode_url, for
+            URLs that embed the product id; set in the COPY itself on
+            PostgreSQL, by one executemany UPDATE per batch elsewhere
+
+    Returns:
+        Tuple (product_ids, failed): product_ids of the rows written, in
+        row order; failed lists (start, stop, error) index ranges of rows
+        that were not
+    """
+    connection = db.session.connection()
+    use_copy = connection.dialect.name == 'postgresql' and connection.dialect.driver == 'psycopg2'
+
+    product_ids = []
+    failed = []
+    for start in range(0, len(rows), batch_rows):
+        batch = rows[start:start + batch_rows]
+        savepoint = db.session.begin_nested()
+        try:
+            if use_copy:
+                # Ids are reserved up front so COPY can write them (and URLs built from them)
+                ids = db.session.execute(RESERVE_IDS_SQL, {'count': len(batch)}).scalars().all()
+                for product_id, row in zip(ids, batch):
+                    row['id'] = product_id
+                    if make_url:
+                        row['barcode_url'] = make_url(product_id, row)
+                copy_products(db.session.connection(), batch)
+            else:
+                table = Product.__table__
+                ids = db.session.execute(
+                    table.insert().returning(table.c.id, sort_by_parameter_order=True), batch
+                ).scalars().all()
+                if make_url:
+                    db.session.execute(
+                        table.update().where(table.c.id == bindparam('product_id')).values(barcode_url=bindparam('url')),
+                        [{'product_id': product_id, 'url': make_url(product_id, row)} for product_id, row in zip(ids, batch)]
+                    )
+            savepoint.commit()
+            product_ids.extend(ids)
+        except Exception as e:
+            savepoint.rollback()
+            logger.warning(f"Product import batch {start}-{start + len(batch)} rejected: {str(e)}")
+            failed.append((start, start + len(batch), 'Rejected by the database'))
+    return product_ids, failed
@@ -10,7 +10,7 @@ from flask_login import login_required, current_user
 from sqlalchemy import func, extract, or_
 
 # Import from extensions and models (no circular import issue)
-from extensions import db
+from extensions import db, render_cache, image_storage
 from models import User, Product, Payment, Activity
 
 logger = logging.getLogger(__name__)
@@ -412,3 +412,21 @@ def search_payment_code():
         return jsonify({'success': False, 'error': 'Search failed'}), 500
 
 
+@admin_bp.route('/api/render-cache')
+@login_required
+@admin_required
+def get_render_cache_stats():
+    """Get barcode render cache hit/miss counters for this worker."""
+    return jsonify({'success': True, 'render_cache': render_cache.get_stats()}), 200
+
+
+@admin_bp.route('/api/storage')
+@login_required
+@admin_required
+def get_storage_stats():
+    """Get image storage latency and error metrics per backend for this worker."""
+    return jsonify({
+        'success': True,
+        'backend': image_storage.backend_name,
+        'storage': image_storage.get_stats()
+    }), 200
@@ -14,6 +14,7 @@ from werkzeug.security import generate_password_hash, check_password_hash
 # Import from extensions and models (no circular import issue)
 from extensions import db
 from models import User, Activity
+from barcode_render import resolve_format
 
 logger = logging.getLogger(__name__)
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
@@ -273,7 +274,8 @@ def profile():
             'payment_code': current_user.payment_code,
             'payment_status': current_user.payment_status,
             'trial_ends_at': current_user.trial_ends_at.isoformat() if current_user.trial_ends_at else None,
-            'paid_until': current_user.paid_until.isoformat() if current_user.paid_until else None
+            'paid_until': current_user.paid_until.isoformat() if current_user.paid_until else None,
+            'barcode_format': current_user.barcode_format or 'png'
         }), 200
     
     try:
@@ -283,6 +285,11 @@ def profile():
             current_user.company_name = data['company_name'].strip()
         if 'phone' in data:
             current_user.phone = data['phone'].strip()
+        if 'barcode_format' in data:
+            barcode_format = resolve_format(data['barcode_format'])
+            if not barcode_format:
+                return jsonify({'success': False, 'error': 'Barcode format must be png or svg'}), 400
+            current_user.barcode_format = barcode_format
         
         db.session.commit()
         log_activity(current_user.id, 'profile_updated')
@@ -1,25 +1,58 @@
 """
 Barcode Generation Routes for SupplierComply
-Handles GS1 barcode generation and Cloudinary upload
+Handles GS1 barcode generation and queues image uploads
 """
 
+import atexit
+import base64
+import binascii
+import csv
+import hashlib
+import hmac
+import json
 import logging
+import multiprocessing
+import os
+import tempfile
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from flask import Blueprint, render_template, request, jsonify
+from functools import lru_cache
+from flask import Blueprint, render_template, request, jsonify, current_app, url_for, Response, stream_with_context
 from flask_login import login_required, current_user
-from barcode import Code128
-from barcode.writer import ImageWriter
-from io import BytesIO
-import cloudinary.uploader
+from itertools import islice, repeat
+from sqlalchemy import insert, update, or_, and_
 
 # Import from extensions and models (no circular import issue)
-from extensions import db
+from extensions import db, render_cache, upload_queue, gtin_allocator, lookup_cache
 from models import Product, Activity
+from barcode_cache import CachedRender, RenderCache
+from barcode_render import (
+    BARCODE_FORMATS, DEFAULT_PRESET, PNG_PRESETS, THUMBNAIL_WIDTHS, build_barcode_value,
+    build_barcode_values, build_product_barcode_value, render_barcode, render_thumbnail, resolve_format, writer_options
+)
+from barcode_storage import thumbnail_srcset, thumbnail_url
+from labels import DEFAULT_TEMPLATE, LABEL_TEMPLATES, stream_label_sheet
+from thermal import (
+    DEFAULT_DPI, DEFAULT_LABEL_SIZE_MM, PRINTER_DPI, PRINTER_LANGUAGES, stream_printer_labels
+)
+from gs1 import GS1Error, client_rules, validate_element
+from gtin import GTIN_LENGTHS, is_valid_gtin, validate_gtins
+from csv_ingest import CSVIngestError, read_mapped_rows
+from streaming import stream_zip
+from idempotency import idempotent
+from scan_lookup import lookup_scans
+from usage import FREE_TIER_MONTHLY_LIMIT, free_tier_remaining, get_usage, record_barcodes
 
 logger = logging.getLogger(__name__)
 barcode_bp = Blueprint('barcode', __name__, url_prefix='/barcode')
 
+# Process pool for bulk rendering (created lazily per worker process)
+_render_pool = None
+_render_pool_pid = None
+_render_pool_lock = threading.Lock()
+
 
 @barcode_bp.route('/')
 @login_required
@@ -27,11 +60,12 @@ def index():
     """Render barcode generation page."""
     if not current_user.can_access():
         return jsonify({'success': False, 'error': 'Subscription required'}), 403
-    return render_template('barcode.html')
+    return render_template('barcode.html', gs1_rules=client_rules(('01', '10', '17')))
 
 
 @barcode_bp.route('/generate', methods=['POST'])
 @login_required
+@idempotent
 def generate():
     """Generate GS1 barcode."""
     if not current_user.can_access():
@@ -57,29 +91,33 @@ def generate():
         if not name:
             return jsonify({'success': False, 'error': 'Product name is required'}), 400
         
-        # Generate GTIN (14 digits)
-        gtin = generate_gtin(current_user.id)
+        # Free tier: monthly limit read from the usage counters, and watermarked images
+        remaining = free_tier_remaining(current_user)
+        if remaining == 0:
+            return jsonify({'success': False, 'error': free_tier_limit_error()}), 403
+        watermark = remaining is not None
         
-        # Generate barcode
-        barcode_value = f"(01){gtin}(10){batch_number}(17){expiry_date.replace('-', '') if expiry_date else ''}"
+        # Output format: per request, falling back to the account preference
+        image_format = resolve_format(data.get('format'), current_user.barcode_format)
+        if not image_format:
+            return jsonify({'success': False, 'error': 'Format must be png or svg'}), 400
         
-        # Create barcode image
-        code128 = Code128(barcode_value, writer=ImageWriter())
-        buffer = BytesIO()
-        code128.write(buffer)
-        buffer.seek(0)
+        # Reuse a supplied GTIN-14 (reprints), otherwise generate one
+        requested_gtin = str(data.get('gtin') or '').strip()
+        if requested_gtin and not is_valid_gtin(requested_gtin):
+            return jsonify({'success': False, 'error': 'GTIN must be 14 digits with a valid check digit'}), 400
+        gtin = requested_gtin or gtin_allocator.allocate(current_user.id)[0]
         
-        # Upload to Cloudinary
+        # Generate barcode
         try:
-            upload_result = cloudinary.uploader.upload(
-                buffer,
-                folder=f"barcodes/user_{current_user.id}",
-                public_id=f"barcode_{gtin}"
-            )
-            barcode_url = upload_result['secure_url']
-        except Exception as e:
-            logger.error(f"Cloudinary upload failed: {str(e)}")
-            return jsonify({'success': False, 'error': 'Failed to upload barcode image'}), 500
+            barcode_value = build_barcode_value(gtin, batch_number, expiry_date)
+        except GS1Error as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        # Render now (or reuse the cache) and upload in the background, unless
+        # images are rendered lazily on first view
+        eager = current_app.config.get('BARCODE_EAGER_UPLOAD', True)
+        barcode_url = render_cached(barcode_value, image_format, watermark=watermark).url if eager else None
         
         # Save to database
         product = Product(
@@ -89,11 +127,22 @@ def generate():
             expiry_date=datetime.strptime(expiry_date, '%Y-%m-%d').date() if expiry_date else None,
             quantity=quantity,
             gtin=gtin,
-            barcode_url=barcode_url
+            barcode_url=barcode_url,
+            barcode_format=image_format,
+            image_status='pending' if eager and not barcode_url else 'ready',
+            watermarked=watermark
         )
         
         db.session.add(product)
+        if not eager:
+            db.session.flush()
+            product.barcode_url = lazy_image_url(product.id, gtin, image_format)
+        if not record_barcodes(current_user.id, limit=FREE_TIER_MONTHLY_LIMIT if watermark else None):
+            # A concurrent request used up the free tier since the check above
+            db.session.rollback()
+            return jsonify({'success': False, 'error': free_tier_limit_error()}), 403
         db.session.commit()
+        lookup_cache.invalidate(current_user.id, [gtin])
         
         # Log activity
         activity = Activity(
@@ -104,99 +153,903 @@ def generate():
         db.session.add(activity)
         db.session.commit()
         
+        if product.image_status == 'pending':
+            upload_queue.submit([product.id])
+            if not upload_queue.asynchronous:
+                db.session.refresh(product)
+        
         return jsonify({
             'success': True,
             'message': 'Barcode generated successfully',
-            'barcode_url': barcode_url,
-            'gtin': gtin
+            'id': product.id,
+            'barcode_url': product.barcode_url,
+            'barcode_format': image_format,
+            'image_status': product.image_status,
+            'status_url': url_for('barcode.status', ids=product.id),
+            'gtin': gtin,
+            'gs1_data': barcode_value
         }), 201
         
     except Exception as e:
         logger.error(f"Barcode generation error: {str(e)}")
         db.session.rollback()
         return jsonify({'success': False, 'error': 'Failed to generate barcode'}), 500
+
+
+@barcode_bp.route('/generate/bulk', methods=['POST'])
+@login_required
+@idempotent
+def generate_bulk():
+    """
+    Generate GS1 barcodes for many products in one request.
+    
+    Accepts a JSON array of products (or {"products": [...], "format": "svg"})
+    or a CSV file upload with optional "mappings" (product field -> CSV column)
+    and "format" form fields. Images are rendered in a process pool, all rows
+    are inserted in one bulk statement and uploads are queued in the background.
+    """
+    if not current_user.can_access():
+        return jsonify({'success': False, 'error': 'Subscription required'}), 403
+    
+    try:
+        started = time.perf_counter()
         
-        # Save to database
-        product = Product(
-            user_id=current_user.id,
-            name=name,
-            batch_number=batch_number,
-            expiry_date=datetime.strptime(expiry_date, '%Y-%m-%d').date() if expiry_date else None,
-            quantity=quantity,
-            gtin=gtin,
-            barcode_url=barcode_url
+        if 'file' in request.files:
+            try:
+                mappings = json.loads(request.form.get('mappings') or '{}')
+            except ValueError:
+                return jsonify({'success': False, 'error': 'Invalid mappings'}), 400
+            try:
+                rows = read_bulk_csv(request.files['file'], mappings)
+            except CSVIngestError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+            requested_format = request.form.get('format')
+        else:
+            data = request.get_json(silent=True)
+            rows = data.get('products') if isinstance(data, dict) else data
+            requested_format = data.get('format') if isinstance(data, dict) else None
+        
+        image_format = resolve_format(requested_format, current_user.barcode_format)
+        if not image_format:
+            return jsonify({'success': False, 'error': 'Format must be png or svg'}), 400
+        
+        if not isinstance(rows, list) or not rows:
+            return jsonify({'success': False, 'error': 'No products provided'}), 400
+        
+        max_rows = current_app.config.get('BULK_MAX_ROWS', 20000)
+        if len(rows) > max_rows:
+            return jsonify({
+                'success': False,
+                'error': f'A bulk request can contain at most {max_rows} products'
+            }), 400
+        
+        # Validate rows and allocate GTINs where none was supplied
+        manifest = []
+        pending = []
+        parsed = [parse_product_fields(row) for row in rows]
+        
+        # Validate supplied GTINs in one vectorized pass; GTIN-8/12/13 are zero-padded to GTIN-14
+        supplied = [i for i, (fields, error) in enumerate(parsed) if not error and fields['gtin']]
+        valid, corrected = validate_gtins([parsed[i][0]['gtin'] for i in supplied], lengths=GTIN_LENGTHS)
+        for i, is_valid, fixed in zip(supplied, valid, corrected):
+            if is_valid:
+                parsed[i][0]['gtin'] = parsed[i][0]['gtin'].zfill(14)
+            elif fixed:
+                parsed[i] = (None, f'Invalid GTIN check digit (expected {fixed})')
+            else:
+                parsed[i] = (None, 'GTIN must be 8, 12, 13 or 14 digits')
+        
+        # Free tier: the whole request must fit in what is left of the monthly limit
+        remaining = free_tier_remaining(current_user)
+        if remaining is not None and sum(1 for _, error in parsed if not error) > remaining:
+            return jsonify({
+                'success': False,
+                'error': free_tier_limit_error(),
+                'remaining': remaining
+            }), 403
+        watermark = remaining is not None
+        
+        gtins = iter(gtin_allocator.allocate(
+            current_user.id,
+            sum(1 for fields, error in parsed if not error and not fields['gtin'])
+        ))
+        for fields, error in parsed:
+            if not error:
+                fields['gtin'] = fields['gtin'] or next(gtins)
+        
+        # Build every element string in one batch call to the GS1 encoder
+        valid_rows = [fields for fields, error in parsed if not error]
+        values, encode_errors = build_barcode_values(
+            [(fields['gtin'], fields['batch_number'], fields['expiry_date']) for fields in valid_rows]
         )
+        encoded = iter(zip(values, encode_errors))
+        for index, (fields, error) in enumerate(parsed):
+            if not error:
+                fields['barcode_value'], error = next(encoded)
+            if error:
+                manifest.append({'row': index, 'success': False, 'error': error})
+                continue
+            manifest.append({'row': index, 'success': True, 'gtin': fields['gtin']})
+            pending.append((index, fields))
         
-        db.session.add(product)
+        # Render images (cache hits skip rendering, and the upload too once uploaded);
+        # with lazy images nothing is rendered until first viewed
+        eager = current_app.config.get('BARCODE_EAGER_UPLOAD', True)
+        if eager:
+            renders = render_cached_many([fields['barcode_value'] for _, fields in pending], image_format, watermark)
+        else:
+            renders = [CachedRender(None, None)] * len(pending)
+        
+        product_rows = []
+        activity_rows = []
+        now = datetime.utcnow()
+        for (index, fields), cached in zip(pending, renders):
+            manifest[index]['barcode_url'] = cached.url
+            manifest[index]['image_status'] = 'pending' if eager and not cached.url else 'ready'
+            product_rows.append({
+                'user_id': current_user.id,
+                'name': fields['name'],
+                'batch_number': fields['batch_number'],
+                'expiry_date': parse_expiry_date(fields['expiry_date']) if fields['expiry_date'] else None,
+                'quantity': fields['quantity'],
+                'gtin': fields['gtin'],
+                'barcode_url': cached.url,
+                'barcode_format': image_format,
+                'image_status': manifest[index]['image_status'],
+                'watermarked': watermark,
+                'created_at': now
+            })
+            activity_rows.append({
+                'user_id': current_user.id,
+                'action': 'barcode_generated',
+                'details': f"Product: {fields['name']}, GTIN: {fields['gtin']}",
+                'created_at': now
+            })
+        
+        # Save to database in one transaction, then queue the uploads
+        if product_rows:
+            product_ids = db.session.execute(
+                insert(Product).returning(Product.id, sort_by_parameter_order=True),
+                product_rows
+            ).scalars().all()
+            db.session.execute(insert(Activity), activity_rows)
+            if not record_barcodes(current_user.id, len(product_rows), now,
+                                   limit=FREE_TIER_MONTHLY_LIMIT if watermark else None):
+                db.session.rollback()
+                return jsonify({
+                    'success': False,
+                    'error': free_tier_limit_error(),
+                    'remaining': free_tier_remaining(current_user)
+                }), 403
+            
+            for (index, fields), product_id in zip(pending, product_ids):
+                manifest[index]['id'] = product_id
+                if not eager:
+                    manifest[index]['barcode_url'] = lazy_image_url(product_id, fields['gtin'], image_format)
+            if not eager:
+                db.session.execute(update(Product), [
+                    {'id': product_id, 'barcode_url': manifest[index]['barcode_url']}
+                    for (index, _), product_id in zip(pending, product_ids)
+                ])
+            db.session.commit()
+            lookup_cache.invalidate(current_user.id, [row['gtin'] for row in product_rows])
+            
+            upload_queue.submit([
+                product_id for product_id, row in zip(product_ids, product_rows)
+                if row['image_status'] == 'pending'
+            ])
+        
+        elapsed = time.perf_counter() - started
+        generated = len(product_rows)
+        throughput = round(len(rows) / elapsed, 2) if elapsed > 0 else None
+        logger.info(f"Bulk generation for user {current_user.id}: {generated}/{len(rows)} rows in {elapsed:.2f}s ({throughput} rows/sec)")
+        
+        return jsonify({
+            'success': True,
+            'total': len(rows),
+            'generated': generated,
+            'failed': len(rows) - generated,
+            'elapsed_seconds': round(elapsed, 3),
+            'rows_per_second': throughput,
+            'barcode_format': image_format,
+            'results': manifest
+        }), 201 if generated else 200
+        
+    except Exception as e:
+        logger.error(f"Bulk barcode generation error: {str(e)}")
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Failed to generate barcodes'}), 500
+
+
+# History fields: column and serializer
+HISTORY_FIELDS = {
+    'id': (Product.id, lambda v: v),
+    'name': (Product.name, lambda v: v),
+    'batch_number': (Product.batch_number, lambda v: v),
+    'expiry_date': (Product.expiry_date, lambda v: v.isoformat() if v else None),
+    'gtin': (Product.gtin, lambda v: v),
+    'barcode_url': (Product.barcode_url, lambda v: v),
+    'thumbnail_url': (Product.barcode_url, lambda v: thumbnail_url(v, THUMBNAIL_WIDTHS[0])),
+    'srcset': (Product.barcode_url, thumbnail_srcset),
+    'barcode_format': (Product.barcode_format, lambda v: v or 'png'),
+    'image_status': (Product.image_status, lambda v: v or 'ready'),
+    'created_at': (Product.created_at, lambda v: v.isoformat()),
+}
+HISTORY_MAX_PER_PAGE = 100
+
+# Browser/CDN lifetime of on-demand images (one year; their content never changes)
+IMAGE_MAX_AGE = 365 * 24 * 3600
+
+# Hex digits of the HMAC in signed on-demand image URLs
+IMAGE_SIGNATURE_LENGTH = 16
+
+# Upper bound on labels printed per product in one sheet
+LABEL_MAX_COPIES = 100
+
+# Upper bound on scans resolved in one lookup request
+LOOKUP_MAX_SCANS = 1000
+
+
+def encode_history_cursor(created_at, product_id):
+    """Encode a history position as an opaque cursor."""
+    payload = json.dumps([created_at.isoformat(), product_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_history_cursor(cursor):
+    """
+    Decode a history cursor.
+    
+    Returns:
+        Tuple (created_at, product_id)
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, product_id = json.loads(payload)
+        return datetime.fromisoformat(created_at), int(product_id)
+    except (TypeError, ValueError, binascii.Error) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+# Filter parameters accepted by filter_products()
+PRODUCT_FILTERS = ('ids', 'start_date', 'end_date', 'batch_number', 'expiry_from', 'expiry_to', 'expiring_days')
+
+
+def filter_products(query, params):
+    """
+    Apply selection filters to a Product query.
+    
+    Args:
+        query: Base Product query (already limited to the user)
+        params: Dict-like with any of PRODUCT_FILTERS
+    
+    Returns:
+        Filtered query
+    
+    Raises:
+        ValueError: If a filter value is malformed
+    """
+    def parse_date(key):
+        try:
+            return datetime.strptime(str(params.get(key)), '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError(f'{key} must be in YYYY-MM-DD format')
+    
+    ids = params.get('ids')
+    if ids:
+        if isinstance(ids, str):
+            ids = ids.split(',')
+        try:
+            query = query.filter(Product.id.in_([int(i) for i in ids]))
+        except (TypeError, ValueError):
+            raise ValueError('ids must be a list of product ids')
+    
+    if params.get('start_date'):
+        query = query.filter(Product.created_at >= parse_date('start_date'))
+    if params.get('end_date'):
+        query = query.filter(Product.created_at < parse_date('end_date') + timedelta(days=1))
+    if params.get('batch_number'):
+        query = query.filter(Product.batch_number == str(params.get('batch_number')).strip())
+    if params.get('expiry_from'):
+        query = query.filter(Product.expiry_date >= parse_date('expiry_from'))
+    if params.get('expiry_to'):
+        query = query.filter(Product.expiry_date <= parse_date('expiry_to'))
+    if params.get('expiring_days'):
+        try:
+            days = int(params.get('expiring_days'))
+        except (TypeError, ValueError):
+            raise ValueError('expiring_days must be a number')
+        today = datetime.utcnow().date()
+        query = query.filter(Product.expiry_date >= today, Product.expiry_date <= today + timedelta(days=days))
+    
+    return query
+
+
+def barcode_zip_entries(query):
+    """
+    Yield ZIP entries (filename, content, compress) for the selected products.
+    
+    Products are read with a server-side cursor; the manifest is spooled to
+    disk as it grows and written last. Products whose stored fields are not
+    valid GS1 data (e.g. older batch numbers) get no image; their manifest
+    row says why.
+    """
+    manifest = tempfile.SpooledTemporaryFile(max_size=1024 * 1024, mode='w+', newline='')
+    writer = csv.writer(manifest)
+    preset = png_preset()
+    writer.writerow(['File', 'Product ID', 'Product Name', 'GTIN', 'Batch Number', 'Expiry Date', 'Format', 'Barcode URL', 'Error'])
+    
+    try:
+        for product in query.order_by(Product.id).yield_per(200):
+            image_format = product.barcode_format or 'png'
+            filename = f"{product.gtin}_{product.id}.{BARCODE_FORMATS[image_format]['extension']}"
+            error = ''
+            try:
+                barcode_value = build_product_barcode_value(product)
+            except GS1Error as e:
+                logger.warning(f"ZIP download skipped product {product.id}: {str(e)}")
+                filename, error = '', f'Skipped: {str(e)}'
+            else:
+                # Prefer a cached render, otherwise re-render (cheaper than fetching from Cloudinary)
+                watermark = bool(product.watermarked)
+                cached = render_cache.get(RenderCache.make_key(
+                    barcode_value, image_format, writer_options(image_format, preset, watermark)
+                ))
+                image_data = cached.data if cached else render_barcode(barcode_value, image_format, preset, watermark)
+            
+            writer.writerow([
+                filename,
+                product.id,
+                product.name,
+                product.gtin or '',
+                product.batch_number or '',
+                product.expiry_date.isoformat() if product.expiry_date else '',
+                image_format.upper(),
+                product.barcode_url or '',
+                error
+            ])
+            if filename:
+                yield filename, image_data, False
+        
+        manifest.seek(0)
+        yield 'manifest.csv', (line.encode('utf-8') for line in manifest), True
+    finally:
+        manifest.close()
+
+
+@lru_cache(maxsize=65536)
+def parse_expiry_date(value):
+    """Read a YYYY-MM-DD expiry date (cached: a batch of rows repeats the same few dates)."""
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def parse_product_fields(data):
+    """
+    Validate and normalise product fields from a request row.
+    
+    Args:
+        data: Dict-like row with product_name/name, batch_number, expiry_date, gtin, quantity
+    
+    Returns:
+        Tuple (fields, error) where error is None for a valid row
+    """
+    if not isinstance(data, dict):
+        return None, 'Row must be an object'
+    
+    name = str(data.get('product_name') or data.get('name') or '').strip()
+    batch_number = str(data.get('batch_number') or '').strip()
+    expiry_date = str(data.get('expiry_date') or '').strip() or None
+    gtin = str(data.get('gtin') or '').strip()
+    quantity = data.get('quantity', 1)
+    
+    if isinstance(quantity, str):
+        quantity = int(quantity) if quantity.strip().isdigit() else 1
+    elif not isinstance(quantity, int):
+        quantity = 1
+    
+    if not name:
+        return None, 'Product name is required'
+    
+    if expiry_date:
+        try:
+            parse_expiry_date(expiry_date)
+        except ValueError:
+            return None, 'Expiry date must be in YYYY-MM-DD format'
+    
+    if batch_number:
+        try:
+            validate_element('10', batch_number)
+        except GS1Error as e:
+            return None, str(e)
+    
+    return {
+        'name': name,
+        'batch_number': batch_number,
+        'expiry_date': expiry_date,
+        'gtin': gtin,
+        'quantity': quantity
+    }, None
+
+
+def read_bulk_csv(file, mappings):
+    """
+    Read product rows from an uploaded CSV file.
+    
+    Reading stops one row past BULK_MAX_ROWS, so an oversized file is
+    rejected without parsing all of it.
+    
+    Args:
+        file: Uploaded file storage
+        mappings: Dict of product field -> CSV column (original or normalized header)
+    
+    Returns:
+        List of dicts keyed by product field
+    
+    Raises:
+        CSVIngestError: If the file cannot be decoded or parsed
+    """
+    fields = ('product_name', 'batch_number', 'expiry_date', 'gtin', 'quantity')
+    max_rows = current_app.config.get('BULK_MAX_ROWS', 20000)
+    return list(islice(read_mapped_rows(file.stream, mappings, fields), max_rows + 1))
+
+
+def image_signature(product_id, gtin, extension, preset=''):
+    """
+    HMAC (keyed by SECRET_KEY) that lets an on-demand image URL be served
+    without a login; it covers the product, GTIN, format and preset, so
+    other products cannot be enumerated from one URL.
+    """
+    message = f"{product_id}:{gtin}:{extension}:{preset}".encode('utf-8')
+    return hmac.new(current_app.secret_key.encode('utf-8'), message, hashlib.sha256).hexdigest()[:IMAGE_SIGNATURE_LENGTH]
+
+
+def lazy_image_url(product_id, gtin, image_format, preset=None):
+    """Absolute, signed URL of a product's on-demand image (see barcode_image)."""
+    extension = BARCODE_FORMATS[image_format]['extension']
+    return url_for(
+        'barcode.barcode_image', gtin=gtin, ext=extension, id=product_id, preset=preset,
+        sig=image_signature(product_id, gtin, extension, preset or ''), _external=True
+    )
+
+
+def lazy_image_url_builder(image_format):
+    """
+    lazy_image_url for many products: url_for runs once, and each URL is
+    then formatted (and signed) from (product_id, gtin).
+    """
+    extension = BARCODE_FORMATS[image_format]['extension']
+    base = url_for('barcode.barcode_image', gtin='0', ext=extension, _external=True)[:-len(f'0.{extension}')]
+    return lambda product_id, gtin: (
+        f"{base}{gtin}.{extension}?id={product_id}&sig={image_signature(product_id, gtin, extension)}"
+    )
+
+
+def free_tier_limit_error():
+    """Error message for a free-tier account that has used its monthly barcodes."""
+    return f'Free tier accounts can generate {FREE_TIER_MONTHLY_LIMIT} barcodes per month. Upgrade for unlimited barcodes.'
+
+
+def png_preset():
+    """PNG resolution preset for stored images (BARCODE_PNG_PRESET)."""
+    return current_app.config.get('BARCODE_PNG_PRESET', DEFAULT_PRESET)
+
+
+def render_cached(barcode_value, image_format, preset=None, watermark=False):
+    """Render one barcode image, reusing the render cache where possible."""
+    preset = preset or png_preset()
+    key = RenderCache.make_key(barcode_value, image_format, writer_options(image_format, preset, watermark))
+    cached = render_cache.get(key)
+    if cached:
+        return cached
+    return render_cache.put(key, render_barcode(barcode_value, image_format, preset, watermark))
+
+
+def render_cached_many(barcode_values, image_format, watermark=False):
+    """
+    Render many barcode images, reusing the render cache where possible.
+    
+    Args:
+        barcode_values: List of GS1 element strings
+        image_format: Output format ('png' or 'svg')
+        watermark: Draw the free-tier watermark
+    
+    Returns:
+        List of CachedRender in the same order; url is None until uploaded
+    """
+    options = writer_options(image_format, png_preset(), watermark)
+    keys = [RenderCache.make_key(value, image_format, options) for value in barcode_values]
+    results = [render_cache.get(key) for key in keys]
+    
+    misses = [i for i, entry in enumerate(results) if entry is None]
+    rendered = render_barcodes_parallel([barcode_values[i] for i in misses], image_format, png_preset(), watermark)
+    for i, image_data in zip(misses, rendered):
+        results[i] = render_cache.put(keys[i], image_data)
+    
+    return results
+
+
+def render_barcodes_parallel(barcode_values, image_format, preset=DEFAULT_PRESET, watermark=False):
+    """Render many barcodes, using a process pool for large batches."""
+    if len(barcode_values) < current_app.config.get('BARCODE_POOL_THRESHOLD', 16):
+        return [render_barcode(value, image_format, preset, watermark) for value in barcode_values]
+    
+    workers = current_app.config.get('BARCODE_RENDER_WORKERS') or os.cpu_count() or 1
+    chunksize = max(1, len(barcode_values) // (workers * 4))
+    return list(_get_render_pool(workers).map(
+        render_barcode, barcode_values, repeat(image_format), repeat(preset), repeat(watermark),
+        chunksize=chunksize
+    ))
+
+
+def _get_render_pool(workers):
+    """
+    Get the process pool used for bulk rendering, created once per worker process.
+
+    Pool processes are spawned rather than forked: a fork of a threaded
+    worker (upload queue, DB connections) can copy held locks and sockets.
+    """
+    global _render_pool, _render_pool_pid
+    with _render_pool_lock:
+        if _render_pool is None or _render_pool_pid != os.getpid():
+            _render_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _render_pool_pid = os.getpid()
+            atexit.register(_render_pool.shutdown, cancel_futures=True)
+        return _render_pool
+
+
+@barcode_bp.route('/status')
+@login_required
+def status():
+    """Get the image upload state of one or more products (?ids=1,2,3)."""
+    try:
+        ids = [int(i) for i in request.args.get('ids', '').split(',') if i.strip().isdigit()][:500]
+        if not ids:
+            return jsonify({'success': False, 'error': 'Product ids are required'}), 400
+        
+        products = Product.query.filter(
+            Product.user_id == current_user.id,
+            Product.id.in_(ids)
+        ).with_entities(Product.id, Product.image_status, Product.barcode_url).all()
+        
+        return jsonify({
+            'success': True,
+            'products': [{
+                'id': p.id,
+                'image_status': p.image_status or 'ready',
+                'barcode_url': p.barcode_url,
+                'thumbnail_url': thumbnail_url(p.barcode_url, THUMBNAIL_WIDTHS[0]),
+                'srcset': thumbnail_srcset(p.barcode_url)
+            } for p in products]
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Status fetch error: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to fetch status'}), 500
+
+
+@barcode_bp.route('/download', methods=['GET', 'POST'])
+@login_required
+def download_zip():
+    """
+    Stream a ZIP of barcode images for a product selection.
+    
+    Filters come from the query string or a JSON body: ids, start_date/end_date
+    (generated), batch_number, expiry_from/expiry_to or expiring_days. Images
+    are taken from the render cache or re-rendered as the archive streams, and
+    a manifest.csv is added as the last entry.
+    """
+    if not current_user.can_access():
+        return jsonify({'success': False, 'error': 'Subscription required'}), 403
+    
+    try:
+        params = request.get_json(silent=True) or request.args
+        try:
+            query = filter_products(Product.query.filter_by(user_id=current_user.id), params)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        # Log activity
+        activity = Activity(
+            user_id=current_user.id,
+            action='barcode_zip_download',
+            details=f'Filters: {json.dumps({k: params.get(k) for k in PRODUCT_FILTERS if params.get(k)})}'
+        )
+        db.session.add(activity)
         db.session.commit()
         
+        filename = f"Barcodes_{current_user.company_name or 'Supplier'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        response = Response(
+            stream_with_context(stream_zip(barcode_zip_entries(query))),
+            mimetype='application/zip'
+        )
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+        
+    except Exception as e:
+        logger.error(f"ZIP download error: {str(e)}")
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Failed to prepare download'}), 500
+
+
+@barcode_bp.route('/labels', methods=['GET', 'POST'])
+@login_required
+def download_labels():
+    """
+    Stream a printable PDF label sheet for a product selection.
+    
+    Takes the same filters as /download plus template (a LABEL_TEMPLATES key,
+    default a4-3x8) and copies (labels per product). Barcodes are drawn as
+    vectors, so nothing is fetched from image storage.
+    """
+    if not current_user.can_access():
+        return jsonify({'success': False, 'error': 'Subscription required'}), 403
+    
+    try:
+        params = request.get_json(silent=True) or request.args
+        template_name = str(params.get('template') or DEFAULT_TEMPLATE).strip().lower()
+        if template_name not in LABEL_TEMPLATES:
+            return jsonify({'success': False, 'error': f"Template must be one of: {', '.join(LABEL_TEMPLATES)}"}), 400
+        try:
+            copies = int(params.get('copies') or 1)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'copies must be a number'}), 400
+        if not 1 <= copies <= LABEL_MAX_COPIES:
+            return jsonify({'success': False, 'error': f'copies must be between 1 and {LABEL_MAX_COPIES}'}), 400
+        try:
+            query = filter_products(Product.query.filter_by(user_id=current_user.id), params)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
         # Log activity
         activity = Activity(
             user_id=current_user.id,
-            action='barcode_generated',
-            details=f'Product: {name}, GTIN: {gtin}'
+            action='label_sheet_download',
+            details=f'Template: {template_name}, copies: {copies}'
         )
         db.session.add(activity)
         db.session.commit()
         
-        return jsonify({
-            'success': True,
-            'message': 'Barcode generated successfully',
-            'barcode_url': barcode_url,
-            'gtin': gtin
-        }), 201
+        filename = f"Labels_{current_user.company_name or 'Supplier'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        response = Response(
+            stream_with_context(stream_label_sheet(
+                query.order_by(Product.id).yield_per(500), template_name, copies
+            )),
+            mimetype='application/pdf'
+        )
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
         
     except Exception as e:
-        logger.error(f"Barcode generation error: {str(e)}")
+        logger.error(f"Label sheet error: {str(e)}")
         db.session.rollback()
-        return jsonify({'success': False, 'error': 'Failed to generate barcode'}), 500
+        return jsonify({'success': False, 'error': 'Failed to prepare labels'}), 500
 
 
-def generate_gtin(user_id):
-    """Generate unique 14-digit GTIN."""
-    # Simple GTIN generation: prefix (2) + user_id (4) + timestamp (6) + check digit (2)
-    timestamp = int(time.time()) % 1000000
-    gtin_base = f"2{user_id:04d}{timestamp:06d}"
+@barcode_bp.route('/print', methods=['GET', 'POST'])
+@login_required
+def print_labels():
+    """
+    Stream a thermal printer job (ZPL II or EPL2) for a product selection.
+    
+    Takes the same filters as /download (ids=<id> for a single label) plus
+    language (zpl or epl), dpi, width_mm, height_mm and copies. The printer
+    draws the GS1-128 symbol, so no image is rendered.
+    """
+    if not current_user.can_access():
+        return jsonify({'success': False, 'error': 'Subscription required'}), 403
     
-    # Calculate check digit (simplified)
-    check_digit = calculate_check_digit(gtin_base)
-    return f"{gtin_base}{check_digit}"
+    try:
+        params = request.get_json(silent=True) or request.args
+        language = str(params.get('language') or 'zpl').strip().lower()
+        if language not in PRINTER_LANGUAGES:
+            return jsonify({'success': False, 'error': 'Language must be zpl or epl'}), 400
+        try:
+            dpi = int(params.get('dpi') or DEFAULT_DPI)
+            size_mm = (
+                int(params.get('width_mm') or DEFAULT_LABEL_SIZE_MM[0]),
+                int(params.get('height_mm') or DEFAULT_LABEL_SIZE_MM[1])
+            )
+            copies = int(params.get('copies') or 1)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'dpi, width_mm, height_mm and copies must be numbers'}), 400
+        if dpi not in PRINTER_DPI:
+            return jsonify({'success': False, 'error': f"dpi must be one of: {', '.join(map(str, PRINTER_DPI))}"}), 400
+        if not all(20 <= side <= 200 for side in size_mm):
+            return jsonify({'success': False, 'error': 'Label sides must be between 20 and 200 mm'}), 400
+        if not 1 <= copies <= LABEL_MAX_COPIES:
+            return jsonify({'success': False, 'error': f'copies must be between 1 and {LABEL_MAX_COPIES}'}), 400
+        try:
+            query = filter_products(Product.query.filter_by(user_id=current_user.id), params)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        # Log activity
+        activity = Activity(
+            user_id=current_user.id,
+            action='printer_labels_download',
+            details=f'Language: {language}, dpi: {dpi}, size: {size_mm[0]}x{size_mm[1]} mm, copies: {copies}'
+        )
+        db.session.add(activity)
+        db.session.commit()
+        
+        filename = f"Labels_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{PRINTER_LANGUAGES[language]['extension']}"
+        response = Response(
+            stream_with_context(stream_printer_labels(
+                query.order_by(Product.id).yield_per(500), language, dpi, size_mm, copies
+            )),
+            mimetype=PRINTER_LANGUAGES[language]['mimetype']
+        )
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+        
+    except Exception as e:
+        logger.error(f"Printer label error: {str(e)}")
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Failed to prepare printer labels'}), 500
 
 
-def calculate_check_digit(gtin_base):
-    """Calculate GTIN-14 check digit."""
-    total = 0
-    for i, digit in enumerate(gtin_base):
-        if i % 2 == 0:
-            total += int(digit) * 3
+@barcode_bp.route('/lookup', methods=['GET', 'POST'])
+@login_required
+def lookup():
+    """
+    Resolve scanned GS1-128 strings to products and check them against what was issued.
+    
+    GET ?scan=<element string> (repeatable), or POST {"scans": [...]} with up
+    to LOOKUP_MAX_SCANS scans. Scans may be bracketed ("(01)...(10)...") or
+    raw scanner output with GS separators. Each result has a status: ok,
+    mismatch (batch or expiry differs from the issued product), unknown
+    (GTIN not issued by this account) or invalid.
+    """
+    if not current_user.can_access():
+        return jsonify({'success': False, 'error': 'Subscription required'}), 403
+    
+    try:
+        if request.method == 'POST':
+            data = request.get_json(silent=True)
+            scans = data.get('scans') if isinstance(data, dict) else data
         else:
-            total += int(digit)
+            scans = request.args.getlist('scan')
+        
+        if not isinstance(scans, list) or not scans:
+            return jsonify({'success': False, 'error': 'No scans provided'}), 400
+        if len(scans) > LOOKUP_MAX_SCANS:
+            return jsonify({
+                'success': False,
+                'error': f'A lookup can contain at most {LOOKUP_MAX_SCANS} scans'
+            }), 400
+        
+        results = lookup_scans(lookup_cache, current_user.id, scans)
+        counts = {status: 0 for status in ('ok', 'mismatch', 'unknown', 'invalid')}
+        for result in results:
+            counts[result['status']] += 1
+        
+        return jsonify({'success': True, 'results': results, 'counts': counts}), 200
+        
+    except Exception as e:
+        logger.error(f"Scan lookup error: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to look up scans'}), 500
+
+
+@barcode_bp.route('/<gtin>.<ext>')
+def barcode_image(gtin, ext):
+    """
+    Serve a barcode image, rendering it on first request.
+    
+    Public with the ?sig= that lazy_image_url signs for the product (and
+    ?preset=, if any); without a valid signature only the owner's products
+    are served, to a logged-in owner. The image is rendered from the stored
+    product fields (?id= picks the product when a GTIN was reprinted, otherwise
+    the first product with the GTIN) and kept in the render cache; ?w= asks
+    for one of the THUMBNAIL_WIDTHS of a PNG. The ETag is the render cache
+    key, which hashes exactly what was drawn, so the URL can be cached as
+    immutable.
+    """
+    image_format = next((name for name, spec in BARCODE_FORMATS.items() if spec['extension'] == ext), None)
+    width = request.args.get('w', type=int)
+    product_id = request.args.get('id', type=int)
+    signed = bool(product_id) and hmac.compare_digest(
+        request.args.get('sig', ''), image_signature(product_id, gtin, ext, request.args.get('preset', ''))
+    )
+    if not signed and not current_user.is_authenticated:
+        return jsonify({'success': False, 'error': 'Not found'}), 404
+    preset = request.args.get('preset') or png_preset()
+    if not image_format or not gtin.isdigit() or (width and (image_format != 'png' or width not in THUMBNAIL_WIDTHS)):
+        return jsonify({'success': False, 'error': 'Not found'}), 404
+    if preset not in PNG_PRESETS:
+        return jsonify({'success': False, 'error': f"Preset must be one of: {', '.join(PNG_PRESETS)}"}), 400
     
-    check_digit = (10 - (total % 10)) % 10
-    return check_digit
+    try:
+        query = Product.query.filter_by(gtin=gtin)
+        if product_id:
+            query = query.filter_by(id=product_id)
+        if not signed:
+            query = query.filter_by(user_id=current_user.id)
+        product = query.order_by(Product.id).first()
+        if not product:
+            return jsonify({'success': False, 'error': 'Not found'}), 404
+        
+        try:
+            barcode_value = build_product_barcode_value(product)
+        except GS1Error as e:
+            return jsonify({'success': False, 'error': f'Stored product is not valid GS1 data: {str(e)}'}), 422
+        watermark = bool(product.watermarked)
+        options = writer_options(image_format, preset, watermark)
+        key = RenderCache.make_key(barcode_value, image_format, dict(options, thumbnail_width=width) if width else options)
+        if key in request.if_none_match:
+            response = Response(status=304)
+        else:
+            if not width:
+                image_data = render_cached(barcode_value, image_format, preset, watermark).data
+            else:
+                cached = render_cache.get(key)
+                image_data = cached.data if cached else render_cache.put(
+                    key, render_thumbnail(render_cached(barcode_value, image_format, preset, watermark).data, width)
+                ).data
+            response = Response(image_data, mimetype=BARCODE_FORMATS[image_format]['mimetype'])
+        response.set_etag(key)
+        # Images served on the owner's session must not be shared by caches
+        response.headers['Cache-Control'] = f"{'public' if signed else 'private'}, max-age={IMAGE_MAX_AGE}, immutable"
+        return response
+        
+    except Exception as e:
+        logger.error(f"Barcode image error: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to render barcode'}), 500
 
 
 @barcode_bp.route('/history')
 @login_required
 def history():
-    """Get barcode generation history."""
+    """
+    Get barcode generation history, newest first.
+    
+    Keyset-paginated on (created_at, id): pass the returned next_cursor as
+    ?cursor= to get the next page. per_page is capped at HISTORY_MAX_PER_PAGE
+    and ?fields=id,name,... limits the columns returned.
+    """
     if not current_user.can_access():
         return jsonify({'success': False, 'error': 'Subscription required'}), 403
     
     try:
-        products = Product.query.filter_by(user_id=current_user.id).order_by(Product.created_at.desc()).all()
+        per_page = min(max(request.args.get('per_page', 20, type=int), 1), HISTORY_MAX_PER_PAGE)
+        
+        fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()] or list(HISTORY_FIELDS)
+        unknown = [f for f in fields if f not in HISTORY_FIELDS]
+        if unknown:
+            return jsonify({'success': False, 'error': f"Unknown fields: {', '.join(unknown)}"}), 400
+        
+        # Always select the keyset columns so the cursor can be built
+        columns = {name: HISTORY_FIELDS[name][0] for name in fields}
+        columns.setdefault('id', Product.id)
+        columns.setdefault('created_at', Product.created_at)
+        query = db.session.query(*[column.label(name) for name, column in columns.items()]).filter(
+            Product.user_id == current_user.id
+        )
+        
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                created_at, last_id = decode_history_cursor(cursor)
+            except ValueError:
+                return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+            query = query.filter(or_(
+                Product.created_at < created_at,
+                and_(Product.created_at == created_at, Product.id < last_id)
+            ))
+        
+        rows = query.order_by(Product.created_at.desc(), Product.id.desc()).limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
         
         return jsonify({
             'success': True,
             'products': [{
-                'id': p.id,
-                'name': p.name,
-                'batch_number': p.batch_number,
-                'expiry_date': p.expiry_date.isoformat() if p.expiry_date else None,
-                'gtin': p.gtin,
-                'barcode_url': p.barcode_url,
-                'created_at': p.created_at.isoformat()
-            } for p in products]
+                name: HISTORY_FIELDS[name][1](getattr(row, name)) for name in fields
+            } for row in rows],
+            'per_page': per_page,
+            'next_cursor': encode_history_cursor(rows[-1].created_at, rows[-1].id) if has_more else None
         }), 200
         
     except Exception as e:
@@ -209,24 +1062,13 @@ def history():
 def stats():
     """Get barcode usage statistics."""
     try:
-        from sqlalchemy import extract
-        
-        current_month = datetime.utcnow().month
-        current_year = datetime.utcnow().year
-        
-        monthly_count = Product.query.filter(
-            Product.user_id == current_user.id,
-            extract('month', Product.created_at) == current_month,
-            extract('year', Product.created_at) == current_year
-        ).count()
-        
-        total_count = Product.query.filter_by(user_id=current_user.id).count()
+        monthly_count, total_count = get_usage(current_user.id)
         
         return jsonify({
             'success': True,
             'monthly_count': monthly_count,
             'total_count': total_count,
-            'limit': 10 if not current_user.is_paid() else None
+            'limit': FREE_TIER_MONTHLY_LIMIT if not current_user.is_paid() else None
         }), 200
         
     except Exception as e:
@@ -19,6 +19,10 @@ from reportlab.lib.units import inch
 # Import from extensions and models (no circular import issue)
 from extensions import db
 from models import Product, Activity
+from idempotency import idempotent
+from usage import FREE_TIER_MONTHLY_LIMIT, get_usage
+from barcode_render import THUMBNAIL_WIDTHS
+from barcode_storage import thumbnail_srcset, thumbnail_url
 
 logger = logging.getLogger(__name__)
 dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/dashboard')
@@ -204,8 +208,7 @@ def get_stats():
     """Get dashboard statistics."""
     try:
         # Basic stats
-        total_products = Product.query.filter_by(user_id=current_user.id).count()
-        this_month = current_user.get_barcode_count_this_month()
+        this_month, total_products = get_usage(current_user.id)
         
         # Payment status
         payment_status = {
@@ -264,7 +267,7 @@ def get_stats():
             'stats': {
                 'total_barcodes': total_products,
                 'this_month': this_month,
-                'free_tier_limit': 10 if not current_user.is_paid() else None
+                'free_tier_limit': FREE_TIER_MONTHLY_LIMIT if not current_user.is_paid() else None
             },
             'payment_status': payment_status,
             'expiry_alerts': expiry_alerts
@@ -327,6 +330,9 @@ def get_products():
                 'quantity': p.quantity,
                 'gtin': p.gtin,
                 'barcode_url': p.barcode_url,
+                'thumbnail_url': thumbnail_url(p.barcode_url, THUMBNAIL_WIDTHS[0]),
+                'srcset': thumbnail_srcset(p.barcode_url),
+                'image_status': p.image_status or 'ready',
                 'created_at': p.created_at.isoformat(),
                 'expiry_status': {
                     'status': status,
@@ -389,6 +395,7 @@ def get_expiring_products():
 
 @dashboard_bp.route('/api/audit-report', methods=['POST'])
 @login_required
+@idempotent
 def generate_audit_report():
     """Generate PDF audit report."""
     try:
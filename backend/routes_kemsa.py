@@ -4,22 +4,239 @@ Handles KEMSA-compliant export file generation
 """
 
 import logging
+import time
 from datetime import datetime, timedelta
-from flask import Blueprint, render_template, request, jsonify, send_file
+from itertools import islice
+from flask import Blueprint, render_template, request, jsonify, send_file, Response, stream_with_context, current_app
 from flask_login import login_required, current_user
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
-from io import BytesIO
-import csv
-import io
+from sqlalchemy import String, case, cast, func
 
 # Import from extensions and models (no circular import issue)
-from extensions import db
+from extensions import db, upload_staging, upload_queue, gtin_allocator, lookup_cache
 from models import Product, Activity
+from barcode_render import resolve_format
+from csv_ingest import CSVIngestError, normalize_header
+from gs1 import GS1Error
+from gtin import GTIN_LENGTHS, validate_gtins
+from idempotency import idempotent
+from product_import import IMPORT_BATCH_ROWS, load_products
+from routes_barcode import free_tier_limit_error, lazy_image_url_builder, parse_expiry_date, parse_product_fields
+from scan_lookup import parse_scan
+from streaming import column_widths, spool_xlsx, stream_csv, stream_ndjson
+from usage import FREE_TIER_MONTHLY_LIMIT, free_tier_remaining, get_usage, record_barcodes
 
 logger = logging.getLogger(__name__)
 kemsa_bp = Blueprint('kemsa', __name__, url_prefix='/kemsa')
 
+# KEMSA columns, in export order: field key and column heading
+KEMSA_FIELDS = (
+    ('product_name', 'Product Name'),
+    ('quantity', 'Quantity'),
+    ('batch_number', 'Batch Number'),
+    ('expiry_date', 'Expiry Date'),
+    ('unit_of_measure', 'Unit of Measure'),
+    ('product_code', 'Product Code'),
+    ('gs1_barcode', 'GS1 Barcode Data'),
+)
+
+# Rows shown by /kemsa/preview and row numbers listed per validation message
+PREVIEW_ROWS = 10
+MAX_REPORTED_ROWS = 5
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# /kemsa/export formats: content type and file extension
+EXPORT_FORMATS = {
+    'xlsx': {'mimetype': XLSX_MIMETYPE, 'extension': 'xlsx'},
+    'csv': {'mimetype': 'text/csv', 'extension': 'csv'},
+    'ndjson': {'mimetype': 'application/x-ndjson', 'extension': 'ndjson'},
+}
+
+# Products fetched per round trip while an export is written
+EXPORT_BATCH_ROWS = 1000
+
+# Per-row errors listed in a /kemsa/import response (the counts cover every row)
+IMPORT_MAX_ERRORS = 1000
+
+# Largest quantity a products row can hold (INTEGER column)
+MAX_QUANTITY = 2 ** 31 - 1
+
+
+def format_date(value):
+    """Date cell text (YYYY-MM-DD), blank when missing."""
+    return value.strftime('%Y-%m-%d') if value else ''
+
+
+# Product export columns: heading, SQL expression and Python formatter.
+# Unformatted columns are exported as the database returns them; formatted
+# ones are dates, always YYYY-MM-DD wide.
+DOWNLOAD_COLUMNS = (
+    ('Product Name', Product.name, None),
+    ('Quantity', func.coalesce(Product.quantity, 0), None),
+    ('Batch Number', func.coalesce(Product.batch_number, ''), None),
+    ('Expiry Date', Product.expiry_date, format_date),
+    ('GTIN/Barcode', func.coalesce(Product.gtin, ''), None),
+)
+
+EXPORT_COLUMNS = (
+    ('Product Name', Product.name, None),
+    ('Batch Number', func.coalesce(Product.batch_number, ''), None),
+    ('Expiry Date', Product.expiry_date, format_date),
+    ('Quantity', func.coalesce(Product.quantity, 0), None),
+    ('GTIN', func.coalesce(Product.gtin, ''), None),
+    ('Generated Date', Product.created_at, format_date),
+    ('Barcode Image', func.coalesce(Product.barcode_url, ''), None),
+    ('Image Format', case(
+        (Product.barcode_url.isnot(None), func.upper(func.coalesce(Product.barcode_format, 'png'))), else_=''
+    ), None),
+)
+
+DATE_WIDTH = len('YYYY-MM-DD')
+
+
+def product_max_lengths(query, columns):
+    """
+    Count a product query and measure its longest value per column, in one aggregate query.
+    
+    Returns:
+        Tuple (count, max_lengths)
+    """
+    measured = [func.max(func.length(cast(expression, String))) for _, expression, formatter in columns if formatter is None]
+    count, *lengths = query.order_by(None).with_entities(func.count(Product.id), *measured).one()
+    lengths = iter(lengths)
+    return count, [(next(lengths) or 0) if formatter is None else DATE_WIDTH for _, _, formatter in columns]
+
+
+def product_rows(query, columns):
+    """
+    Yield export rows for a product query, read in batches through a server-side cursor.
+    
+    Rows come in idx_products_user_created_at order, so the database streams
+    them off the index instead of sorting the whole result before the first row.
+    """
+    formatters = [formatter for _, _, formatter in columns]
+    rows = query.with_entities(*[expression for _, expression, _ in columns]).order_by(Product.created_at, Product.id)
+    for row in rows.yield_per(EXPORT_BATCH_ROWS):
+        yield [formatter(value) if formatter else value for formatter, value in zip(formatters, row)]
+
+
+def send_xlsx(spool, size, filename):
+    """Stream a spooled XLSX file as an attachment (closed once sent)."""
+    response = send_file(spool, mimetype=XLSX_MIMETYPE, as_attachment=True, download_name=filename)
+    response.content_length = size
+    return response
+
+
+def mapped_rows(staged, mappings):
+    """
+    Stream the staged upload's rows mapped to the KEMSA fields.
+
+    Args:
+        staged: StagedUpload
+        mappings: Dict of KEMSA field -> normalized CSV header
+
+    Returns:
+        Iterator of dicts keyed by every KEMSA field (unmapped ones are blank)
+    """
+    return upload_staging.read_rows(staged, mappings, [field for field, _ in KEMSA_FIELDS])
+
+
+def validate_mapped(rows):
+    """
+    Check mapped upload rows against the KEMSA format, in one pass.
+
+    Returns:
+        Tuple (errors, warnings) of messages; row numbers count from 1 after the header
+    """
+    def report(message, rows):
+        listed = ', '.join(str(row) for row in rows[:MAX_REPORTED_ROWS])
+        more = f' and {len(rows) - MAX_REPORTED_ROWS} more' if len(rows) > MAX_REPORTED_ROWS else ''
+        return f'{message} (row {listed}{more})'
+
+    missing_names, bad_quantities, bad_dates = [], [], []
+    for row, fields in enumerate(rows, 1):
+        if not fields['product_name']:
+            missing_names.append(row)
+        if fields['quantity'] and not fields['quantity'].replace(',', '').isdigit():
+            bad_quantities.append(row)
+        if fields['expiry_date']:
+            try:
+                parse_expiry_date(fields['expiry_date'])
+            except ValueError:
+                bad_dates.append(row)
+
+    errors, warnings = [], []
+    if missing_names:
+        errors.append(report(f'{len(missing_names)} rows have no product name', missing_names))
+    if bad_quantities:
+        errors.append(report(f'{len(bad_quantities)} rows have a quantity that is not a whole number', bad_quantities))
+    if bad_dates:
+        warnings.append(report(f'{len(bad_dates)} expiry dates are not YYYY-MM-DD', bad_dates))
+    return errors, warnings
+
+
+def kemsa_rows(rows):
+    """Spreadsheet rows for mapped upload rows: KEMSA column order, whole-number quantities as numbers."""
+    for fields in rows:
+        quantity = fields['quantity'].replace(',', '')
+        if quantity.isdigit():
+            fields['quantity'] = int(quantity)
+        yield [fields[field] for field, _ in KEMSA_FIELDS]
+
+
+def import_fields(rows, start):
+    """
+    Validate one batch of mapped upload rows as products.
+
+    The GS1 Barcode column may hold a GTIN (8, 12, 13 or 14 digits, padded
+    to GTIN-14) or a GS1 element string, whose (01) GTIN is used; check
+    digits of the whole batch are validated in one vectorized pass.
+
+    Args:
+        rows: Mapped rows of the batch (see mapped_rows)
+        start: Index of the batch's first row in the upload
+
+    Returns:
+        List of (row, fields, error): row counts from 1 after the header;
+        fields is None where error is set
+    """
+    results = []
+    for index, mapped in enumerate(rows, start):
+        quantity = mapped['quantity'].replace(',', '')
+        fields, error = parse_product_fields({
+            'product_name': mapped['product_name'],
+            'batch_number': mapped['batch_number'],
+            'expiry_date': mapped['expiry_date'],
+            'gtin': mapped['gs1_barcode'],
+            'quantity': quantity or 1
+        })
+        if not error:
+            if quantity and not quantity.isdigit():
+                error = 'Quantity must be a whole number'
+            elif fields['quantity'] > MAX_QUANTITY:
+                error = f'Quantity must be at most {MAX_QUANTITY}'
+            elif len(fields['name']) > 255:
+                error = 'Product name must be at most 255 characters'
+            elif fields['gtin'] and not fields['gtin'].isdigit():
+                try:
+                    fields['gtin'] = parse_scan(fields['gtin'])['gtin']
+                except GS1Error as e:
+                    error = f'GS1 barcode data: {str(e)}'
+        results.append((index + 1, None if error else fields, error))
+
+    # GTIN-8/12/13 are zero-padded to GTIN-14, as for bulk generation
+    supplied = [i for i, (_, fields, _) in enumerate(results) if fields and fields['gtin']]
+    valid, corrected = validate_gtins([results[i][1]['gtin'] for i in supplied], lengths=GTIN_LENGTHS)
+    for i, is_valid, fixed in zip(supplied, valid, corrected):
+        row, fields, _ = results[i]
+        if is_valid:
+            fields['gtin'] = fields['gtin'].zfill(14)
+        elif fixed:
+            results[i] = (row, None, f'Invalid GTIN check digit (expected {fixed})')
+        else:
+            results[i] = (row, None, 'GTIN must be 8, 12, 13 or 14 digits')
+    return results
+
 
 @kemsa_bp.route('/')
 @login_required
@@ -48,47 +265,13 @@ def upload():
         if not file.filename.endswith('.csv'):
             return jsonify({'success': False, 'error': 'Please upload a CSV file'}), 400
         
-        # Read CSV file - handle both bytes and string
-        file_content = file.stream.read()
-        if isinstance(file_content, bytes):
-            file_content = file_content.decode("UTF-8")
-        stream = io.StringIO(file_content, newline=None)
-        csv_reader = csv.DictReader(stream)
-        
-        # Get original headers
-        original_headers = csv_reader.fieldnames or []
-        
-        # Normalize headers: lowercase, replace spaces with underscores, remove special chars
-        header_mapping = {}
-        normalized_headers = []
-        
-        for header in original_headers:
-            normalized = header.lower().strip().replace(' ', '_').replace('-', '_')
-            # Remove any non-alphanumeric characters except underscores
-            normalized = ''.join(c for c in normalized if c.isalnum() or c == '_')
-            header_mapping[normalized] = header
-            normalized_headers.append(normalized)
-        
-        # Read rows with normalized headers
-        rows = []
-        for i, row in enumerate(csv_reader):
-            if i >= 5:  # Only first 5 rows for preview
-                break
-            
-            # Create normalized row
-            normalized_row = {}
-            for norm_key, orig_key in header_mapping.items():
-                normalized_row[norm_key] = row.get(orig_key, '')
-            
-            rows.append(normalized_row)
-        
-        # Count total rows
-        stream.seek(0)
-        total_rows = sum(1 for _ in csv.DictReader(io.StringIO(stream.read()))) - 1  # -1 for header
-        
-        # Generate file ID
-        import uuid
-        file_id = str(uuid.uuid4())
+        # Stage the file under its file_id; profiling it (headers, first rows,
+        # row count and column statistics) is one pass
+        try:
+            staged, profile = upload_staging.stage(current_user.id, file)
+        except CSVIngestError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        normalized_headers = profile.headers
         
         # Generate suggested mappings based on common patterns
         suggested_mappings = {}
@@ -113,12 +296,15 @@ def upload():
         
         return jsonify({
             'success': True,
-            'file_id': file_id,
+            'file_id': staged.file_id,
+            'expires_at': datetime.utcfromtimestamp(staged.expires_at).isoformat(),
+            'encoding': profile.encoding,
             'headers': normalized_headers,
-            'preview_rows': rows,
+            'preview_rows': profile.preview_rows[:5],
+            'column_stats': profile.columns,
             'suggested_mappings': suggested_mappings,
             'can_download': can_download,
-            'total_rows': max(0, total_rows)
+            'total_rows': profile.total_rows
         }), 200
         
     except Exception as e:
@@ -136,7 +322,7 @@ def preview():
     try:
         # If POST, process mappings from uploaded data
         if request.method == 'POST':
-            data = request.get_json()
+            data = request.get_json() or {}
             mappings = data.get('mappings', {})
             
             # Validate required fields
@@ -146,36 +332,37 @@ def preview():
                     'error': 'Product Name mapping is required'
                 }), 400
             
-            # Get user's existing products as sample preview
-            products = Product.query.filter_by(user_id=current_user.id).order_by(
-                Product.created_at.desc()
-            ).limit(10).all()
+            # Map the staged upload: preview rows were kept when it was
+            # uploaded, validation streams the file
+            staged = upload_staging.get(data.get('file_id'), current_user.id)
+            if staged is None:
+                return jsonify({'success': False, 'error': 'Upload not found or expired. Please upload the file again.'}), 404
             
-            preview_data = []
-            for p in products:
-                preview_data.append({
-                    'product_name': p.name,
-                    'quantity': p.quantity or 0,
-                    'batch_number': p.batch_number or '',
-                    'expiry_date': p.expiry_date.isoformat() if p.expiry_date else '',
-                    'gtin': p.gtin or ''
-                })
+            unknown = sorted(header for header in mappings.values() if header and header not in staged.header_mapping)
+            if unknown:
+                return jsonify({'success': False, 'error': f"Unknown columns: {', '.join(unknown)}"}), 400
+            
+            preview_data = [
+                {field: row.get(mappings[field], '').strip() for field, _ in KEMSA_FIELDS if mappings.get(field)}
+                for row in staged.preview_rows[:PREVIEW_ROWS]
+            ]
             
             # Validation results
-            validation_errors = []
-            if not preview_data:
-                validation_errors.append('No products found to preview')
+            validation_errors, validation_warnings = validate_mapped(mapped_rows(staged, mappings))
+            if not staged.total_rows:
+                validation_errors.append('The file has no rows')
             
             # PRODUCTION: Only paid users can download
             can_download = current_user.is_paid()
             
             return jsonify({
                 'success': True,
+                'file_id': staged.file_id,
                 'preview': preview_data,
-                'total_rows': len(preview_data),
+                'total_rows': staged.total_rows,
                 'validation': {
                     'errors': validation_errors,
-                    'warnings': []
+                    'warnings': validation_warnings
                 },
                 'can_download': can_download
             }), 200
@@ -195,9 +382,10 @@ def preview():
                     'expiry_date': p.expiry_date.isoformat() if p.expiry_date else None,
                     'quantity': p.quantity,
                     'gtin': p.gtin,
-                    'barcode_url': p.barcode_url
+                    'barcode_url': p.barcode_url,
+                    'barcode_format': p.barcode_format or 'png'
                 } for p in products],
-                'total_count': Product.query.filter_by(user_id=current_user.id).count()
+                'total_count': get_usage(current_user.id)[1]
             }), 200
         
     except Exception as e:
@@ -207,8 +395,14 @@ def preview():
 
 @kemsa_bp.route('/download', methods=['POST'])
 @login_required
+@idempotent
 def download():
-    """Download KEMSA-formatted Excel file."""
+    """
+    Download KEMSA-formatted Excel file.
+    
+    With a file_id (and mappings), exports the staged upload mapped to the
+    KEMSA columns; without one, exports the user's products.
+    """
     if not current_user.can_access():
         return jsonify({'success': False, 'error': 'Subscription required'}), 403
     
@@ -221,72 +415,60 @@ def download():
         }), 403
     
     try:
-        # Get user's products
-        products = Product.query.filter_by(user_id=current_user.id).all()
-        
-        if not products:
-            return jsonify({'success': False, 'error': 'No products to export'}), 404
-        
-        # Create Excel workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "KEMSA Export"
-        
-        # KEMSA format headers
-        headers = ['Product Name', 'Quantity', 'Batch Number', 'Expiry Date', 'GTIN/Barcode']
-        ws.append(headers)
-        
-        # Style headers
-        for cell in ws[1]:
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-            cell.alignment = Alignment(horizontal="center")
-        
-        # Add data
-        for product in products:
-            ws.append([
-                product.name,
-                product.quantity or 0,
-                product.batch_number or '',
-                product.expiry_date.strftime('%Y-%m-%d') if product.expiry_date else '',
-                product.gtin or ''
+        data = request.get_json(silent=True) or {}
+        
+        if data.get('file_id'):
+            # Staged upload, mapped to the KEMSA columns
+            staged = upload_staging.get(data['file_id'], current_user.id)
+            if staged is None:
+                return jsonify({'success': False, 'error': 'Upload not found or expired. Please upload the file again.'}), 404
+            mappings = data.get('mappings') or {}
+            if not mappings.get('product_name'):
+                return jsonify({'success': False, 'error': 'Product Name mapping is required'}), 400
+            if not staged.total_rows:
+                return jsonify({'success': False, 'error': 'No products to export'}), 404
+            
+            unknown = sorted(header for header in mappings.values() if header and header not in staged.header_mapping)
+            if unknown:
+                return jsonify({'success': False, 'error': f"Unknown columns: {', '.join(unknown)}"}), 400
+            
+            headers = [label for _, label in KEMSA_FIELDS]
+            # Longest values were measured when the file was parsed
+            widths = column_widths(headers, [
+                staged.column_stats.get(mappings.get(field) or '', {}).get('max_length', 0)
+                for field, _ in KEMSA_FIELDS
             ])
+            rows = kemsa_rows(mapped_rows(staged, mappings))
+            row_count = staged.total_rows
+            source = f' from {staged.filename}'
+        else:
+            # Get user's products
+            query = Product.query.filter_by(user_id=current_user.id)
+            row_count, max_lengths = product_max_lengths(query, DOWNLOAD_COLUMNS)
+            
+            if not row_count:
+                return jsonify({'success': False, 'error': 'No products to export'}), 404
+            
+            # KEMSA format headers
+            headers = [heading for heading, _, _ in DOWNLOAD_COLUMNS]
+            widths = column_widths(headers, max_lengths)
+            rows = product_rows(query, DOWNLOAD_COLUMNS)
+            source = ''
         
-        # Auto-adjust column widths
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Save to buffer
-        buffer = BytesIO()
-        wb.save(buffer)
-        buffer.seek(0)
+        spool, size = spool_xlsx("KEMSA Export", headers, rows, widths)
         
         # Log activity
         activity = Activity(
             user_id=current_user.id,
             action='kemsa_download',
-            details=f'Downloaded {len(products)} products'
+            details=f'Downloaded {row_count} products{source}'
         )
         db.session.add(activity)
         db.session.commit()
         
         filename = f"KEMSA_Export_{current_user.company_name or 'Supplier'}_{datetime.now().strftime('%Y%m%d')}.xlsx"
         
-        return send_file(
-            buffer,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
-        )
+        return send_xlsx(spool, size, filename)
         
     except Exception as e:
         logger.error(f"Download error: {str(e)}")
@@ -295,87 +477,229 @@ def download():
 
 @kemsa_bp.route('/export', methods=['POST'])
 @login_required
+@idempotent
 def export():
-    """Generate KEMSA-compliant Excel export."""
+    """
+    Generate KEMSA-compliant export.
+    
+    format=xlsx (default) builds a styled workbook; csv and ndjson are
+    encoded row by row from a database cursor and streamed as they are
+    produced, so the first bytes go out at once and memory stays flat.
+    """
     if not current_user.can_access():
         return jsonify({'success': False, 'error': 'Subscription required'}), 403
     
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         export_type = data.get('type', 'full')  # 'full' or 'expiring'
+        export_format = str(data.get('format') or request.args.get('format') or 'xlsx').lower()
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'success': False, 'error': 'Format must be xlsx, csv or ndjson'}), 400
         
         # Get products based on export type
         if export_type == 'expiring':
             days = data.get('days', 30)
-            products = current_user.get_expiring_products(days)
+            query = current_user.expiring_products_query(days)
         else:
-            products = Product.query.filter_by(user_id=current_user.id).all()
+            query = Product.query.filter_by(user_id=current_user.id)
         
-        if not products:
-            return jsonify({'success': False, 'error': 'No products found for export'}), 404
+        if export_format != 'xlsx':
+            return stream_export(query, export_type, export_format)
         
-        # Create Excel workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "KEMSA Export"
+        row_count, max_lengths = product_max_lengths(query, EXPORT_COLUMNS) if query is not None else (0, None)
+        if not row_count:
+            return jsonify({'success': False, 'error': 'No products found for export'}), 404
         
         # Headers
-        headers = ['Product Name', 'Batch Number', 'Expiry Date', 'Quantity', 'GTIN', 'Generated Date']
-        ws.append(headers)
-        
-        # Style headers
-        for cell in ws[1]:
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-            cell.alignment = Alignment(horizontal="center")
-        
-        # Add data
-        for product in products:
-            ws.append([
-                product.name,
-                product.batch_number or '',
-                product.expiry_date.isoformat() if product.expiry_date else '',
-                product.quantity or 0,
-                product.gtin or '',
-                product.created_at.strftime('%Y-%m-%d') if product.created_at else ''
-            ])
-        
-        # Auto-adjust column widths
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Save to buffer
-        buffer = BytesIO()
-        wb.save(buffer)
-        buffer.seek(0)
+        headers = [heading for heading, _, _ in EXPORT_COLUMNS]
+        spool, size = spool_xlsx(
+            "KEMSA Export", headers, product_rows(query, EXPORT_COLUMNS), column_widths(headers, max_lengths)
+        )
         
         # Log activity
         activity = Activity(
             user_id=current_user.id,
             action='kemsa_export',
-            details=f'Exported {len(products)} products, type: {export_type}'
+            details=f'Exported {row_count} products, type: {export_type}'
         )
         db.session.add(activity)
         db.session.commit()
         
         filename = f"KEMSA_Export_{current_user.company_name}_{datetime.now().strftime('%Y%m%d')}.xlsx"
         
-        return send_file(
-            buffer,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
-        )
+        return send_xlsx(spool, size, filename)
         
     except Exception as e:
         logger.error(f"KEMSA export error: {str(e)}")
-        return jsonify({'success': False, 'error': 'Failed to generate export'}), 500
\ No newline at end of file
+        return jsonify({'success': False, 'error': 'Failed to generate export'}), 500
+
+
+def stream_export(query, export_type, export_format):
+    """Stream a CSV or NDJSON export of a product query (no count or width pass first)."""
+    if query is None or query.with_entities(Product.id).first() is None:
+        return jsonify({'success': False, 'error': 'No products found for export'}), 404
+    
+    # Log activity
+    activity = Activity(
+        user_id=current_user.id,
+        action='kemsa_export',
+        details=f'Exported products, type: {export_type}, format: {export_format}'
+    )
+    db.session.add(activity)
+    db.session.commit()
+    
+    headers = [heading for heading, _, _ in EXPORT_COLUMNS]
+    rows = product_rows(query, EXPORT_COLUMNS)
+    if export_format == 'csv':
+        chunks = stream_csv(headers, rows)
+    else:
+        chunks = stream_ndjson([normalize_header(heading) for heading in headers], rows)
+    
+    filename = f"KEMSA_Export_{current_user.company_name or 'Supplier'}_{datetime.now().strftime('%Y%m%d')}.{EXPORT_FORMATS[export_format]['extension']}"
+    response = Response(stream_with_context(chunks), mimetype=EXPORT_FORMATS[export_format]['mimetype'])
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@kemsa_bp.route('/import', methods=['POST'])
+@login_required
+@idempotent
+def import_products():
+    """
+    Import a staged upload into the user's products.
+    
+    Applies the column mapping, validates the rows in batches and loads the
+    valid ones with COPY (a single executemany INSERT per batch off
+    PostgreSQL), allocating GTINs for rows without one. Invalid rows are
+    reported by row number and skipped; the rest are still imported.
+    Barcode images are queued, or served on demand with lazy images.
+    """
+    if not current_user.can_access():
+        return jsonify({'success': False, 'error': 'Subscription required'}), 403
+    
+    try:
+        started = time.perf_counter()
+        user_id = current_user.id
+        data = request.get_json(silent=True) or {}
+        mappings = data.get('mappings') or {}
+        if not mappings.get('product_name'):
+            return jsonify({'success': False, 'error': 'Product Name mapping is required'}), 400
+        
+        image_format = resolve_format(data.get('format'), current_user.barcode_format)
+        if not image_format:
+            return jsonify({'success': False, 'error': 'Format must be png or svg'}), 400
+        
+        staged = upload_staging.get(data.get('file_id'), user_id)
+        if staged is None:
+            return jsonify({'success': False, 'error': 'Upload not found or expired. Please upload the file again.'}), 404
+        
+        unknown = sorted(header for header in mappings.values() if header and header not in staged.header_mapping)
+        if unknown:
+            return jsonify({'success': False, 'error': f"Unknown columns: {', '.join(unknown)}"}), 400
+        if not staged.total_rows:
+            return jsonify({'success': False, 'error': 'The file has no rows'}), 400
+        
+        # Validate batch by batch as the file is streamed; invalid rows are reported, not fatal
+        rows = mapped_rows(staged, mappings)
+        valid_rows = []
+        errors = []
+        for start in range(0, staged.total_rows, IMPORT_BATCH_ROWS):
+            for row, fields, error in import_fields(list(islice(rows, IMPORT_BATCH_ROWS)), start):
+                if error:
+                    errors.append({'row': row, 'error': error})
+                else:
+                    valid_rows.append((row, fields))
+        
+        # Free tier: the whole import must fit in what is left of the monthly limit
+        remaining = free_tier_remaining(current_user)
+        if remaining is not None and len(valid_rows) > remaining:
+            return jsonify({
+                'success': False,
+                'error': free_tier_limit_error(),
+                'remaining': remaining
+            }), 403
+        watermark = remaining is not None
+        
+        gtins = iter(gtin_allocator.allocate(user_id, sum(1 for _, fields in valid_rows if not fields['gtin'])))
+        
+        # With eager images, rows are imported pending and rendered by the upload
+        # queue; larger imports get on-demand images so the queue is not flooded
+        eager = (current_app.config.get('BARCODE_EAGER_UPLOAD', True)
+                 and len(valid_rows) <= current_app.config.get('IMPORT_EAGER_MAX_ROWS', 1000))
+        now = datetime.utcnow()
+        product_rows = []
+        for _, fields in valid_rows:
+            product_rows.append({
+                'user_id': user_id,
+                'name': fields['name'],
+                'batch_number': fields['batch_number'],
+                'expiry_date': parse_expiry_date(fields['expiry_date']) if fields['expiry_date'] else None,
+                'quantity': fields['quantity'],
+                'gtin': fields['gtin'] or next(gtins),
+                'barcode_url': None,
+                'barcode_format': image_format,
+                'image_status': 'pending' if eager else 'ready',
+                'watermarked': watermark,
+                'created_at': now
+            })
+        
+        # Count the rows before loading them, so a concurrent request cannot
+        # take the same free-tier allowance (the counter row stays locked)
+        limit = FREE_TIER_MONTHLY_LIMIT if watermark else None
+        if product_rows and not record_barcodes(user_id, len(product_rows), now, limit=limit):
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'error': free_tier_limit_error(),
+                'remaining': free_tier_remaining(current_user)
+            }), 403
+        
+        make_url = None
+        if not eager:
+            image_url = lazy_image_url_builder(image_format)
+            make_url = lambda product_id, row: image_url(product_id, row['gtin'])
+        product_ids, rejected = load_products(product_rows, make_url=make_url)
+        for batch_start, batch_stop, error in rejected:
+            errors.extend({'row': row, 'error': error} for row, _ in valid_rows[batch_start:batch_stop])
+        
+        imported = len(product_ids)
+        if imported < len(product_rows):
+            # Give back the rows of rejected batches
+            record_barcodes(user_id, imported - len(product_rows), now)
+        if imported:
+            db.session.add(Activity(
+                user_id=user_id,
+                action='kemsa_import',
+                details=f'Imported {imported} products from {staged.filename}',
+                created_at=now
+            ))
+        db.session.commit()
+        
+        if imported:
+            lookup_cache.invalidate(user_id, {row['gtin'] for row in product_rows})
+            if eager:
+                upload_queue.submit(product_ids)
+        
+        errors.sort(key=lambda error: error['row'])
+        elapsed = time.perf_counter() - started
+        throughput = round(staged.total_rows / elapsed, 2) if elapsed > 0 else None
+        logger.info(f"KEMSA import for user {user_id}: {imported}/{staged.total_rows} rows in {elapsed:.2f}s ({throughput} rows/sec)")
+        
+        return jsonify({
+            'success': True,
+            'file_id': staged.file_id,
+            'total': staged.total_rows,
+            'imported': imported,
+            'failed': staged.total_rows - imported,
+            'elapsed_seconds': round(elapsed, 3),
+            'rows_per_second': throughput,
+            'barcode_format': image_format,
+            'lazy_images': not eager,
+            'errors': errors[:IMPORT_MAX_ERRORS],
+            'errors_truncated': len(errors) > IMPORT_MAX_ERRORS
+        }), 201 if imported else 200
+        
+    except Exception as e:
+        logger.error(f"KEMSA import error: {str(e)}")
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Failed to import products'}), 500
@@ -0,0 +1,244 @@
+"""
+Scan Lookup for SupplierComply
+Parses scanned GS1-128 element strings and resolves them to products through
+the GTIN index, with an in-process read-through cache for scanner traffic
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import gs1
+from gtin import pad_gtin, validate_gtins
+
+# Labels printed before element strings went through the gs1 encoder carry
+# the expiry as (17)YYYYMMDD, may end with empty (10)/(17) elements and have
+# 12-digit GTINs
+_LEGACY_EXPIRY = re.compile(r'\(17\)\d\d(\d{6})(?=\(|$)')
+_LEGACY_GTIN = re.compile(r'\(01\)(\d{8}|\d{12,13})(?=\(|$)')
+_LEGACY_EMPTY = re.compile(r'\(\d{2,4}\)(?=\(|$)')
+
+# Product columns kept per cached GTIN
+LookupProduct = namedtuple('LookupProduct', ['id', 'name', 'batch_number', 'expiry_date', 'quantity', 'barcode_url'])
+
+
+def _normalize_legacy(text):
+    """Rewrite the old bracketed label format into valid GS1 element strings."""
+    text = (text or '').strip()
+    if text.startswith('('):
+        text = _LEGACY_EMPTY.sub('', _LEGACY_EXPIRY.sub(r'(17)\1', text))
+        text = _LEGACY_GTIN.sub(lambda match: f"(01){pad_gtin(match.group(1))}", text)
+    return text
+
+
+def _scan_fields(elements):
+    """Pick GTIN (01), batch (10) and expiry (17) out of decoded elements; other AIs are ignored."""
+    values = dict(elements)
+    if '01' not in values:
+        raise gs1.GS1Error('Scan has no GTIN (01)')
+    return {
+        'gtin': pad_gtin(values['01']),
+        'batch_number': values.get('10'),
+        'expiry_date': gs1.parse_date(values['17']) if '17' in values else None
+    }
+
+
+def parse_scan(text):
+    """
+    Parse a scanned GS1 element string into its GTIN (01), batch (10) and expiry (17).
+
+    Accepts whatever gs1.decode reads (bracketed or raw scanner output) plus
+    labels printed in the old bracketed format.
+
+    Returns:
+        Dict with gtin, batch_number and expiry_date (None when absent)
+
+    Raises:
+        gs1.GS1Error: If the string cannot be decoded or has no GTIN
+    """
+    return _scan_fields(gs1.decode(_normalize_legacy(text)))
+
+
+def verify_scan(scan, products):
+    """
+    Check a parsed scan against the products issued with its GTIN.
+
+    Returns:
+        Tuple (status, product, mismatches): status is 'ok', 'mismatch'
+        or 'unknown'; product is the best match (or None)
+    """
+    if not products:
+        return 'unknown', None, []
+
+    mismatches = []
+    candidates = products
+    if scan['batch_number'] is not None:
+        candidates = [p for p in products if p.batch_number == scan['batch_number']]
+        if not candidates:
+            mismatches.append('batch_number')
+            candidates = products
+    if scan['expiry_date'] is not None:
+        matching = [p for p in candidates if p.expiry_date == scan['expiry_date']]
+        if matching:
+            candidates = matching
+        else:
+            mismatches.append('expiry_date')
+    return ('mismatch' if mismatches else 'ok'), candidates[-1], mismatches
+
+
+def lookup_scans(cache, user_id, scans):
+    """
+    Parse, verify and resolve a batch of scans for one user.
+
+    Check digits are validated in one vectorized pass and every GTIN not in
+    the cache is fetched with a single query.
+
+    Args:
+        cache: ProductLookupCache
+        user_id: Owner of the products
+        scans: List of scanned strings
+
+    Returns:
+        List of result dicts (scan, status, gtin, batch_number, expiry_date,
+        mismatches, product), in input order
+    """
+    element_lists, errors = gs1.decode_many([_normalize_legacy(str(text)) for text in scans])
+    parsed = []
+    for elements, error in zip(element_lists, errors):
+        try:
+            parsed.append((_scan_fields(elements), None) if elements else (None, error))
+        except gs1.GS1Error as e:
+            parsed.append((None, str(e)))
+
+    gtins = [scan['gtin'] for scan, _ in parsed if scan]
+    valid = dict(zip(gtins, validate_gtins(gtins, lengths=(14,))[0].tolist())) if gtins else {}
+    products = cache.resolve(user_id, [gtin for gtin, is_valid in valid.items() if is_valid])
+
+    results = []
+    for text, (scan, error) in zip(scans, parsed):
+        if scan is None or not valid[scan['gtin']]:
+            results.append({'scan': text, 'status': 'invalid', 'error': error or 'Invalid GTIN check digit'})
+            continue
+        status, product, mismatches = verify_scan(scan, products[scan['gtin']])
+        results.append({
+            'scan': text,
+            'status': status,
+            'gtin': scan['gtin'],
+            'batch_number': scan['batch_number'],
+            'expiry_date': scan['expiry_date'].isoformat() if scan['expiry_date'] else None,
+            'mismatches': mismatches,
+            'product': {
+                'id': product.id,
+                'name': product.name,
+                'batch_number': product.batch_number,
+                'expiry_date': product.expiry_date.isoformat() if product.expiry_date else None,
+                'quantity': product.quantity,
+                'barcode_url': product.barcode_url
+            } if product else None
+        })
+    return results
+
+
+class ProductLookupCache:
+    """
+    Per-process LRU of a user's products by GTIN, read through to the database.
+
+    Entries expire after a TTL so products created or deleted by other workers
+    show up within LOOKUP_CACHE_TTL seconds; GTINs with no products are not
+    cached, so a new product is found on its first scan.
+    """
+
+    def __init__(self, app=None):
+        self.max_items = 10000
+        self.ttl = 60
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'queries': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configure the cache size and TTL from the Flask app config."""
+        self.max_items = app.config.get('LOOKUP_CACHE_ITEMS', self.max_items)
+        self.ttl = app.config.get('LOOKUP_CACHE_TTL', self.ttl)
+        app.extensions['lookup_cache'] = self
+
+    def resolve(self, user_id, gtins):
+        """
+        Find a user's products for many GTINs, with one query for all cache misses.
+
+        Returns:
+            Dict of GTIN -> tuple of LookupProduct, oldest first (missing GTINs map to ())
+        """
+        now = time.monotonic()
+        found = {}
+        misses = []
+        with self._lock:
+            for gtin in set(gtins):
+                entry = self._entries.get((user_id, gtin))
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end((user_id, gtin))
+                    found[gtin] = entry[1]
+                    self.stats['hits'] += 1
+                else:
+                    misses.append(gtin)
+                    self.stats['misses'] += 1
+
+        if misses:
+            loaded = self._load(user_id, misses)
+            with self._lock:
+                self.stats['queries'] += 1
+                for gtin, products in loaded.items():
+                    self._entries[(user_id, gtin)] = (now + self.ttl, products)
+                    self._entries.move_to_end((user_id, gtin))
+                while len(self._entries) > self.max_items:
+                    self._entries.popitem(last=False)
+            found.update(loaded)
+
+        return {gtin: found.get(gtin, ()) for gtin in gtins}
+
+    def invalidate(self, user_id, gtins):
+        """Drop cached GTINs after this process creates or deletes their products."""
+        with self._lock:
+            for gtin in gtins:
+                self._entries.pop((user_id, pad_gtin(gtin)), None)
+
+    def clear(self):
+        """Drop every cached GTIN."""
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def _load(user_id, gtins):
+        """
+        Fetch products for GTIN-14s through idx_products_gtin.
+
+        Legacy products store the short GTIN a zero-padded GTIN-14 stands
+        for (e.g. 12 digits), so those forms are queried too and filed
+        under the GTIN-14.
+        """
+        # Import here to avoid circular imports (extensions imports this module)
+        from extensions import db
+        from models import Product
+
+        stored = {}
+        for gtin in gtins:
+            stored[gtin] = gtin
+            for length in (8, 12, 13):
+                if not gtin[:14 - length].strip('0'):
+                    stored[gtin[14 - length:]] = gtin
+
+        products = {}
+        rows = db.session.query(Product.gtin, *[getattr(Product, field) for field in LookupProduct._fields]).filter(
+            Product.user_id == user_id,
+            Product.gtin.in_(list(stored))
+        ).order_by(Product.id)
+        for gtin, *fields in rows:
+            products.setdefault(stored[gtin], []).append(LookupProduct(*fields))
+        return {gtin: tuple(items) for gtin, items in products.items()}
+
+    def get_stats(self):
+        """Hit/miss counters and current size."""
+        with self._lock:
+            return dict(self.stats, items=len(self._entries))
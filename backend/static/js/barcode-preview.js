@@ -0,0 +1,191 @@
+/**
+ * SupplierComply - Barcode Preview
+ * Builds the product's GS1 element string with the same AI rules as the
+ * server (gs1.py) and draws it as a GS1-128 SVG in the browser, so nothing
+ * is rendered or uploaded until the barcode is saved
+ */
+
+const BarcodePreview = (function() {
+    // Code 128 symbol patterns (1 = bar module), values 0-105
+    const CODES = [
+        '11011001100', '11001101100', '11001100110', '10010011000', '10010001100', '10001001100', '10011001000', '10011000100',
+        '10001100100', '11001001000', '11001000100', '11000100100', '10110011100', '10011011100', '10011001110', '10111001100',
+        '10011101100', '10011100110', '11001110010', '11001011100', '11001001110', '11011100100', '11001110100', '11101101110',
+        '11101001100', '11100101100', '11100100110', '11101100100', '11100110100', '11100110010', '11011011000', '11011000110',
+        '11000110110', '10100011000', '10001011000', '10001000110', '10110001000', '10001101000', '10001100010', '11010001000',
+        '11000101000', '11000100010', '10110111000', '10110001110', '10001101110', '10111011000', '10111000110', '10001110110',
+        '11101110110', '11010001110', '11000101110', '11011101000', '11011100010', '11011101110', '11101011000', '11101000110',
+        '11100010110', '11101101000', '11101100010', '11100011010', '11101111010', '11001000010', '11110001010', '10100110000',
+        '10100001100', '10010110000', '10010000110', '10000101100', '10000100110', '10110010000', '10110000100', '10011010000',
+        '10011000010', '10000110100', '10000110010', '11000010010', '11001010000', '11110111010', '11000010100', '10001111010',
+        '10100111100', '10010111100', '10010011110', '10111100100', '10011110100', '10011110010', '11110100100', '11110010100',
+        '11110010010', '11011011110', '11011110110', '11110110110', '10101111000', '10100011110', '10001011110', '10111101000',
+        '10111100010', '11110101000', '11110100010', '10111011110', '10111101110', '11101011110', '11110101110', '11010000100',
+        '11010010000', '11010011100'
+    ];
+    const STOP = '1100011101011';
+    const START_B = 104, START_C = 105, TO_B = 100, TO_C = 99, FNC1 = 102;
+
+    // FNC1 in the data string (the character python-barcode uses for it)
+    const FNC1_CHAR = '\xf1';
+
+    // Stand-in GTIN for the preview until the server allocates one
+    const PLACEHOLDER_GTIN = '00000000000000';
+
+    /**
+     * Encode printable ASCII and FNC1 as Code 128 modules, switching between
+     * code sets B and C the way the server's encoder (python-barcode) does,
+     * so the preview has the same bars as the saved image.
+     */
+    function encodeCode128(text) {
+        const encoded = [START_B];
+        let charset = 'B';
+        let buffer = '';
+
+        for (let i = 0; i < text.length; i++) {
+            const char = text[i];
+            const code = char.charCodeAt(0);
+            if (char !== FNC1_CHAR && (code < 32 || code > 126)) {
+                throw new Error(`Character not allowed in a barcode: ${char}`);
+            }
+            const isDigit = char >= '0' && char <= '9';
+            if (charset === 'C' && !isDigit) {
+                encoded.push(TO_B);
+                charset = 'B';
+                if (buffer.length === 1) {
+                    encoded.push(buffer.charCodeAt(0) - 32);
+                    buffer = '';
+                }
+            } else if (charset === 'B' && /^\d{4}/.test(text.slice(i, i + 10))) {
+                encoded.push(TO_C);
+                charset = 'C';
+            }
+
+            if (char === FNC1_CHAR) {
+                encoded.push(FNC1);
+            } else if (charset === 'B') {
+                encoded.push(code - 32);
+            } else {
+                buffer += char;
+                if (buffer.length === 2) {
+                    encoded.push(parseInt(buffer, 10));
+                    buffer = '';
+                }
+            }
+        }
+        if (buffer.length === 1) {
+            encoded.push(TO_B, buffer.charCodeAt(0) - 32);
+        }
+        // Start directly in code set C rather than switching after the start symbol
+        if (encoded[1] === TO_C) {
+            encoded.splice(0, 2, START_C);
+        }
+
+        let checksum = encoded[0];
+        for (let i = 1; i < encoded.length; i++) {
+            checksum += i * encoded[i];
+        }
+        encoded.push(checksum % 103);
+        return encoded.map(value => CODES[value]).join('') + STOP;
+    }
+
+    /**
+     * Draw Code 128 modules for `data` as an SVG string, with `text` (the
+     * bracketed element string) below the bars.
+     */
+    function renderSvg(data, text, options = {}) {
+        const modules = encodeCode128(data);
+        const moduleWidth = options.moduleWidth || 2;
+        const barHeight = options.barHeight || 80;
+        const quietZone = 10 * moduleWidth;
+        const fontSize = options.fontSize || 14;
+        const width = modules.length * moduleWidth + 2 * quietZone;
+        const height = barHeight + fontSize + 12;
+
+        let bars = '';
+        for (let i = 0; i < modules.length; i++) {
+            if (modules[i] !== '1') continue;
+            let run = 1;
+            while (modules[i + run] === '1') run++;
+            bars += `M${quietZone + i * moduleWidth},0h${run * moduleWidth}v${barHeight}h-${run * moduleWidth}z`;
+            i += run - 1;
+        }
+        const label = text.replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
+        return `<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 ${width} ${height}" width="100%" role="img" aria-label="${label}">` +
+            `<rect width="${width}" height="${height}" fill="#fff"/>` +
+            `<path d="${bars}" fill="#000"/>` +
+            `<text x="${width / 2}" y="${barHeight + fontSize + 4}" text-anchor="middle" font-family="monospace" font-size="${fontSize}">${label}</text>` +
+            `</svg>`;
+    }
+
+    /**
+     * Check one element value against the server's AI rule ({title, pattern, date}).
+     *
+     * @returns {string|null} Error message, or null when valid
+     */
+    function validateElement(rules, ai, value) {
+        const rule = rules[ai];
+        if (!new RegExp(`^(?:${rule.pattern})$`).test(value)) {
+            return rule.message;
+        }
+        if (rule.date) {
+            const month = parseInt(value.slice(2, 4), 10);
+            const day = parseInt(value.slice(4, 6), 10);
+            // Century as gs1.parse_date picks it: 49 years back to 50 ahead
+            // of this year; day 00 (the last day of the month) passes
+            const thisYear = new Date().getFullYear();
+            let year = thisYear - thisYear % 100 + parseInt(value.slice(0, 2), 10);
+            if (year - thisYear >= 51) {
+                year -= 100;
+            } else if (year - thisYear <= -50) {
+                year += 100;
+            }
+            const lastDay = new Date(Date.UTC(year, month, 0)).getUTCDate();
+            if (month < 1 || month > 12 || day > lastDay) {
+                return `Invalid date: ${value}`;
+            }
+        }
+        return null;
+    }
+
+    /**
+     * Build the element string the server will store: (01) GTIN, (17) expiry
+     * as YYMMDD, then (10) batch, leaving out empty fields. `value` is the
+     * bracketed form for display; `data` is what the bars encode, a leading
+     * FNC1 and the raw AI data with FNC1 after each variable-length field
+     * that is not last (as gs1.encode places GS).
+     *
+     * @returns {{value: string, data: string, errors: Object}} errors keyed by form field
+     */
+    function buildElementString(rules, fields) {
+        const errors = {};
+        const gtin = fields.gtin || PLACEHOLDER_GTIN;
+        if (fields.gtin && !window.SupplierComply.validateGTIN(fields.gtin)) {
+            errors.gtin = 'GTIN must be 14 digits with a valid check digit';
+        }
+
+        const elements = [['01', gtin]];
+        if (fields.expiry_date) {
+            const expiry = fields.expiry_date.slice(2, 4) + fields.expiry_date.slice(5, 7) + fields.expiry_date.slice(8, 10);
+            const error = validateElement(rules, '17', expiry);
+            if (error) errors.expiry_date = error;
+            elements.push(['17', expiry]);
+        }
+        if (fields.batch_number) {
+            const error = validateElement(rules, '10', fields.batch_number);
+            if (error) errors.batch_number = error;
+            elements.push(['10', fields.batch_number]);
+        }
+
+        return {
+            value: elements.map(([ai, value]) => `(${ai})${value}`).join(''),
+            data: FNC1_CHAR + elements.map(([ai, value], i) =>
+                ai + value + (rules[ai].fnc1 && i < elements.length - 1 ? FNC1_CHAR : '')).join(''),
+            errors
+        };
+    }
+
+    return { PLACEHOLDER_GTIN, encodeCode128, renderSvg, validateElement, buildElementString };
+})();
+
+window.BarcodePreview = BarcodePreview;
@@ -0,0 +1,167 @@
+"""
+Streaming Response Helpers for SupplierComply
+Generators that produce large downloads incrementally so memory stays flat
+"""
+
+import csv
+import io
+import json
+import tempfile
+import time
+import zipfile
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+# Rows encoded per chunk of a streamed CSV/NDJSON export
+TEXT_CHUNK_ROWS = 500
+
+# Finished XLSX files up to this size stay in memory; larger ones spill to disk
+XLSX_SPOOL_BYTES = 8 * 1024 * 1024
+
+# Column widths (characters) as the old auto-fit computed them: content + 2, at most 50
+XLSX_MAX_COLUMN_WIDTH = 50
+
+
+class _ChunkBuffer:
+    """Write-only file object that collects bytes until drained (not seekable, so zipfile streams)."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(entries):
+    """
+    Build a ZIP archive incrementally.
+
+    Args:
+        entries: Iterable of (filename, content, compress) where content is
+            bytes or an iterable of byte chunks; it is consumed lazily so the
+            first bytes go out before later entries are produced
+
+    Yields:
+        Chunks of the ZIP file
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for filename, content, compress in entries:
+            info = zipfile.ZipInfo(filename, date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+            with archive.open(info, 'w') as entry:
+                for chunk in ([content] if isinstance(content, bytes) else content):
+                    entry.write(chunk)
+            data = buffer.drain()
+            if data:
+                yield data
+    yield buffer.drain()
+
+
+def stream_csv(headers, rows, chunk_rows=TEXT_CHUNK_ROWS):
+    """
+    Encode rows as UTF-8 CSV incrementally.
+
+    The header line is yielded before the first row is read, so the first
+    bytes go out before the rows are fetched.
+
+    Yields:
+        Chunks of the CSV file
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    yield buffer.getvalue().encode('utf-8')
+
+    pending = 0
+    buffer.seek(0)
+    buffer.truncate()
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending == chunk_rows:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue().encode('utf-8')
+
+
+def stream_ndjson(keys, rows, chunk_rows=TEXT_CHUNK_ROWS):
+    """
+    Encode rows as newline-delimited JSON objects incrementally.
+
+    Yields:
+        Chunks of the NDJSON file, each holding whole lines
+    """
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(keys, row)), ensure_ascii=False, separators=(',', ':')))
+        if len(lines) == chunk_rows:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+            lines = []
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def column_widths(headers, max_lengths):
+    """Excel column widths from each column's longest value (headings included)."""
+    return [
+        min(max(len(header), length or 0) + 2, XLSX_MAX_COLUMN_WIDTH)
+        for header, length in zip(headers, max_lengths)
+    ]
+
+
+def spool_xlsx(title, headers, rows, widths):
+    """
+    Write a single-sheet XLSX with openpyxl's write-only mode.
+
+    Rows are written as they are produced, so a cursor can feed them without
+    the workbook ever holding them. XLSX stores column widths before the
+    rows, so they are passed in (see column_widths) rather than measured
+    from the cells afterwards.
+
+    Args:
+        title: Sheet title
+        headers: Column headings (bold, white on blue)
+        rows: Iterable of row value lists
+        widths: Column widths in characters
+
+    Returns:
+        Tuple (file, size): a spooled temporary file rewound to the start
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+    for index, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(index)].width = width
+
+    font = Font(bold=True, color="FFFFFF")
+    fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    alignment = Alignment(horizontal="center")
+    heading = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font, cell.fill, cell.alignment = font, fill, alignment
+        heading.append(cell)
+    ws.append(heading)
+
+    for row in rows:
+        ws.append(row)
+
+    spool = tempfile.SpooledTemporaryFile(max_size=XLSX_SPOOL_BYTES)
+    wb.save(spool)
+    size = spool.tell()
+    spool.seek(0)
+    return spool, size
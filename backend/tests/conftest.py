@@ -0,0 +1,72 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+# Backend modules import each other by bare name (run from backend/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """The Flask app on a SQLite file database, with local image storage and inline uploads."""
+    directory = tmp_path_factory.mktemp('app')
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{directory / 'test.db'}",
+        'BARCODE_STORAGE': 'local',
+        'BARCODE_LOCAL_DIR': str(directory / 'uploads'),
+        'BARCODE_UPLOAD_ASYNC': 'False',
+        'UPLOAD_STAGING_DIR': str(directory / 'staging'),
+    })
+    from app import create_app
+
+    app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def database(app):
+    """Empty tables for one test. Not left in an app context: requests push
+    their own, so flask_login's current user is not shared between clients."""
+    from extensions import db
+
+    with app.app_context():
+        db.create_all()
+    yield db
+    with app.app_context():
+        db.drop_all()
+
+
+@pytest.fixture
+def make_user(app, database):
+    """Create a user with a paid subscription (or a free trial with paid=False) and return its id."""
+    from models import User
+
+    def make_user(email, paid=True):
+        user = User(email=email, password_hash='x', payment_code=email.split('@')[0][:10].upper())
+        if paid:
+            user.payment_status = 'paid'
+            user.paid_until = datetime.utcnow() + timedelta(days=30)
+        else:
+            user.trial_ends_at = datetime.utcnow() + timedelta(days=7)
+        with app.app_context():
+            database.session.add(user)
+            database.session.commit()
+            return user.id
+
+    return make_user
+
+
+@pytest.fixture
+def login(app):
+    """Return a test client logged in as the user with the given id."""
+    def login(user_id):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        return client
+
+    return login
@@ -0,0 +1,147 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from gtin import (
+    MAX_SERIAL, GtinAllocator, calculate_check_digits, format_gtins, is_valid_gtin, pad_gtin, validate_gtins
+)
+
+# Published examples: GTIN-8, GTIN-12 (UPC-A), GTIN-13 (EAN-13), GTIN-14 and SSCC
+VALID_CODES = ['96385074', '036000291452', '4006381333931', '20000700000014', '106141411234567897']
+
+
+def serial(gtin):
+    """Serial number part of an allocated GTIN-14."""
+    return int(gtin[6:13])
+
+
+def reference_check_digit(base):
+    """GS1 check digit computed digit by digit: weights 3, 1, 3, ... from the right."""
+    total = sum(int(digit) * (3 if i % 2 == 0 else 1) for i, digit in enumerate(reversed(base)))
+    return (10 - total % 10) % 10
+
+
+def make_allocator(block_size):
+    allocator = GtinAllocator()
+    allocator.block_size = block_size
+    return allocator
+
+
+def test_format_gtins_layout_and_check_digits():
+    gtins = format_gtins(7, [1, 2, 9999999])
+
+    assert gtins == ['20000700000014', '20000700000021', '20000799999992']
+    assert all(is_valid_gtin(gtin) for gtin in gtins)
+
+
+def test_format_gtins_rejects_out_of_range_values():
+    with pytest.raises(ValueError):
+        format_gtins(100000, [1])
+    with pytest.raises(ValueError):
+        format_gtins(7, [MAX_SERIAL + 1])
+
+
+def test_allocate_rolls_over_to_a_new_block(app, database):
+    from models import GtinCounter
+
+    allocator = make_allocator(block_size=3)
+    with app.app_context():
+        first = allocator.allocate(1, 2)
+        second = allocator.allocate(1, 2)
+        next_serial = database.session.get(GtinCounter, 1).next_serial
+
+    assert [serial(gtin) for gtin in first + second] == [1, 2, 3, 4]
+    # The second call used up the first block (1-3) and reserved 4-6
+    assert next_serial == 7
+
+
+def test_allocate_reserves_a_block_large_enough_for_the_request(app, database):
+    from models import GtinCounter
+
+    allocator = make_allocator(block_size=3)
+    with app.app_context():
+        gtins = allocator.allocate(1, 10)
+        next_serial = database.session.get(GtinCounter, 1).next_serial
+
+    assert [serial(gtin) for gtin in gtins] == list(range(1, 11))
+    assert next_serial == 11
+
+
+def test_allocate_raises_when_serials_are_exhausted(app, database):
+    from models import GtinCounter
+
+    with app.app_context():
+        database.session.add(GtinCounter(user_id=1, next_serial=MAX_SERIAL - 1))
+        database.session.commit()
+        allocator = make_allocator(block_size=3)
+
+        assert [serial(gtin) for gtin in allocator.allocate(1, 2)] == [MAX_SERIAL - 1, MAX_SERIAL]
+        with pytest.raises(ValueError, match='exhausted'):
+            allocator.allocate(1, 1)
+
+
+def test_concurrent_allocation_is_unique(app, database):
+    """Several workers (allocators), each used from several threads, share one counter table."""
+    workers = [make_allocator(block_size=7) for _ in range(4)]
+
+    def allocate(allocator):
+        with app.app_context():
+            return [gtin for _ in range(25) for gtin in allocator.allocate(1, 2)]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(allocate, workers * 2))
+
+    gtins = [gtin for result in results for gtin in result]
+    assert len(gtins) == 400
+    assert len(set(gtins)) == len(gtins)
+    assert all(is_valid_gtin(gtin) for gtin in gtins)
+
+
+def test_calculate_check_digits_for_every_code_length():
+    assert calculate_check_digits([code[:-1] for code in VALID_CODES]).tolist() == [int(code[-1]) for code in VALID_CODES]
+
+
+def test_calculate_check_digits_marks_non_digit_bases():
+    assert calculate_check_digits(['2000070000001', '20000700000A1', '1' * 18]).tolist() == [4, -1, -1]
+
+
+def test_validate_gtins_accepts_every_code_length():
+    valid, corrected = validate_gtins(VALID_CODES)
+
+    assert valid.tolist() == [True] * len(VALID_CODES)
+    assert corrected.tolist() == VALID_CODES
+
+
+def test_validate_gtins_corrects_check_digits_and_rejects_malformed_rows():
+    codes = ['4006381333932', '40063813339', '400638133393X', ' 4006381333931 ', '', '4006381333931' * 2]
+    valid, corrected = validate_gtins(codes)
+
+    assert valid.tolist() == [False, False, False, True, False, False]
+    assert corrected.tolist() == ['4006381333931', None, None, '4006381333931', None, None]
+
+
+def test_validate_gtins_lengths_filter():
+    valid, corrected = validate_gtins(VALID_CODES, lengths=(14,))
+
+    assert valid.tolist() == [False, False, False, True, False]
+    assert corrected.tolist() == [None, None, None, '20000700000014', None]
+
+
+def test_vector_results_match_scalar_checks():
+    rng = random.Random(6)
+    codes = [''.join(rng.choice('0123456789') for _ in range(rng.choice((8, 12, 13, 14, 18)))) for _ in range(2000)]
+    codes += [code[:-1] + str(reference_check_digit(code[:-1])) for code in codes]
+
+    valid, corrected = validate_gtins(codes)
+    check_digits = calculate_check_digits([code[:-1] for code in codes]).tolist()
+
+    assert check_digits == [reference_check_digit(code[:-1]) for code in codes]
+    assert valid.tolist() == [int(code[-1]) == reference_check_digit(code[:-1]) for code in codes]
+    assert all(is_valid_gtin(fixed) for fixed in corrected.tolist() if len(fixed) == 14)
+    # Zero-padding a GTIN-8/12/13 to GTIN-14 keeps its check digit valid
+    short = [code for code in codes if len(code) < 14]
+    assert validate_gtins([pad_gtin(code) for code in short], lengths=(14,))[0].tolist() == validate_gtins(short)[0].tolist()
+    assert [is_valid_gtin(code) for code in codes] == [
+        bool(is_valid) and len(code) == 14 for code, is_valid in zip(codes, valid.tolist())
+    ]
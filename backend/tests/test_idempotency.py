@@ -0,0 +1,133 @@
+from datetime import datetime, timedelta
+
+from idempotency import REPLAYED_HEADER
+
+PRODUCT = {'product_name': 'Paracetamol 500mg', 'batch_number': 'B1', 'expiry_date': '2027-12-31', 'quantity': 10}
+
+
+def generate(client, key, data=PRODUCT):
+    return client.post('/barcode/generate', json=data, headers={'Idempotency-Key': key})
+
+
+def product_count(app, user_id):
+    from models import Product
+
+    with app.app_context():
+        return Product.query.filter_by(user_id=user_id).count()
+
+
+def test_retry_replays_the_stored_response(app, make_user, login):
+    user_id = make_user('supplier@example.com')
+    client = login(user_id)
+
+    first = generate(client, 'key-1')
+    retry = generate(client, 'key-1')
+
+    assert first.status_code == 201
+    assert REPLAYED_HEADER not in first.headers
+    assert retry.status_code == 201
+    assert retry.headers[REPLAYED_HEADER] == 'true'
+    assert retry.headers['Content-Type'] == first.headers['Content-Type']
+    assert retry.get_json() == first.get_json()
+    assert product_count(app, user_id) == 1
+
+
+def test_same_key_with_a_different_body_is_rejected(app, make_user, login):
+    user_id = make_user('supplier@example.com')
+    client = login(user_id)
+
+    assert generate(client, 'key-1').status_code == 201
+    response = generate(client, 'key-1', dict(PRODUCT, batch_number='B2'))
+
+    assert response.status_code == 422
+    assert product_count(app, user_id) == 1
+
+
+def test_key_of_a_request_in_progress_is_rejected_until_it_goes_stale(app, database, make_user, login):
+    from idempotency import request_fingerprint
+    from models import IdempotencyKey
+
+    user_id = make_user('supplier@example.com')
+    client = login(user_id)
+    with app.test_request_context('/barcode/generate', method='POST', json=PRODUCT):
+        fingerprint = request_fingerprint()
+    with app.app_context():
+        now = datetime.utcnow()
+        database.session.add(IdempotencyKey(
+            user_id=user_id, key='key-1', fingerprint=fingerprint, created_at=now, expires_at=now + timedelta(hours=1)
+        ))
+        database.session.commit()
+
+    assert generate(client, 'key-1').status_code == 409
+
+    # A worker that died mid-request gives up the key after IDEMPOTENCY_LOCK_SECONDS
+    with app.app_context():
+        record = database.session.get(IdempotencyKey, (user_id, 'key-1'))
+        record.created_at -= timedelta(seconds=app.config['IDEMPOTENCY_LOCK_SECONDS'] + 1)
+        database.session.commit()
+    response = generate(client, 'key-1')
+
+    assert response.status_code == 201
+    assert REPLAYED_HEADER not in response.headers
+
+
+def test_key_can_be_reused_after_it_expires(app, database, make_user, login):
+    from models import IdempotencyKey
+
+    user_id = make_user('supplier@example.com')
+    client = login(user_id)
+    assert generate(client, 'key-1').status_code == 201
+
+    with app.app_context():
+        database.session.get(IdempotencyKey, (user_id, 'key-1')).expires_at = datetime.utcnow() - timedelta(seconds=1)
+        database.session.commit()
+    response = generate(client, 'key-1', dict(PRODUCT, batch_number='B2'))
+
+    assert response.status_code == 201
+    assert REPLAYED_HEADER not in response.headers
+    assert product_count(app, user_id) == 2
+
+
+def test_keys_are_scoped_per_user(app, make_user, login):
+    first_id = make_user('first@example.com')
+    second_id = make_user('second@example.com')
+
+    first = generate(login(first_id), 'shared-key')
+    second = generate(login(second_id), 'shared-key')
+
+    assert first.status_code == second.status_code == 201
+    assert REPLAYED_HEADER not in second.headers
+    assert second.get_json()['id'] != first.get_json()['id']
+    assert product_count(app, first_id) == product_count(app, second_id) == 1
+
+
+def test_file_export_is_replayed(make_user, login):
+    client = login(make_user('supplier@example.com'))
+    assert generate(client, 'generate-1').status_code == 201
+
+    headers = {'Idempotency-Key': 'export-1'}
+    first = client.post('/kemsa/export', json={'format': 'xlsx'}, headers=headers)
+    retry = client.post('/kemsa/export', json={'format': 'xlsx'}, headers=headers)
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.headers[REPLAYED_HEADER] == 'true'
+    assert retry.data == first.data
+    assert retry.data.startswith(b'PK')
+    for name in ('Content-Type', 'Content-Disposition'):
+        assert retry.headers[name] == first.headers[name]
+
+
+def test_streamed_export_is_not_stored(make_user, login):
+    client = login(make_user('supplier@example.com'))
+    assert generate(client, 'generate-1').status_code == 201
+
+    headers = {'Idempotency-Key': 'export-1'}
+    first = client.post('/kemsa/export', json={'format': 'csv'}, headers=headers)
+    first_body = first.get_data()
+    retry = client.post('/kemsa/export', json={'format': 'csv'}, headers=headers)
+
+    # A CSV stream of unknown length is not buffered for replay, so the retry runs the export again
+    assert retry.status_code == 200
+    assert REPLAYED_HEADER not in retry.headers
+    assert retry.get_data() == first_body
+    assert b'Paracetamol 500mg' in first_body
@@ -0,0 +1,46 @@
+from datetime import date
+
+from barcode_render import build_barcode_value
+from scan_lookup import LookupProduct, lookup_scans, parse_scan
+
+LEGACY_GTIN = '200072102941'
+
+
+class StubCache:
+    """Stands in for ProductLookupCache: products keyed by GTIN-14."""
+
+    def __init__(self, products):
+        self.products = products
+        self.requested = []
+
+    def resolve(self, user_id, gtins):
+        self.requested.extend(gtins)
+        return {gtin: self.products.get(gtin, ()) for gtin in gtins}
+
+
+def test_parse_scan_pads_legacy_gtin():
+    scan = parse_scan('(01)200072102941(17)271231(10)B1')
+    assert scan == {'gtin': '00200072102941', 'batch_number': 'B1', 'expiry_date': date(2027, 12, 31)}
+
+
+def test_parse_scan_reads_legacy_label_format():
+    scan = parse_scan('(01)200072102941(17)20271231(10)')
+    assert scan['gtin'] == '00200072102941'
+    assert scan['batch_number'] is None
+    assert scan['expiry_date'] == date(2027, 12, 31)
+
+
+def test_lookup_scans_finds_legacy_product():
+    product = LookupProduct(7, 'Paracetamol', 'B1', date(2027, 12, 31), 10, None)
+    cache = StubCache({'00200072102941': (product,)})
+
+    [result] = lookup_scans(cache, 1, ['(01)200072102941(17)271231(10)B1'])
+
+    assert result['status'] == 'ok'
+    assert result['gtin'] == '00200072102941'
+    assert result['product']['id'] == 7
+    assert cache.requested == ['00200072102941']
+
+
+def test_legacy_gtin_builds_element_string():
+    assert build_barcode_value(LEGACY_GTIN, 'B1', date(2027, 12, 31)) == '(01)00200072102941(17)271231(10)B1'
@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import routes_barcode
+from usage import FREE_TIER_MONTHLY_LIMIT, get_usage, record_barcodes
+
+PRODUCT = {'product_name': 'Paracetamol 500mg', 'batch_number': 'B1', 'expiry_date': '2027-12-31'}
+
+
+def test_record_barcodes_enforces_the_limit(app, database):
+    with app.app_context():
+        assert record_barcodes(1, 8, limit=10)
+        assert not record_barcodes(1, 3, limit=10)
+        assert record_barcodes(1, 2, limit=10)
+        assert not record_barcodes(1, 1, limit=10)
+        assert not record_barcodes(2, 11, limit=10)
+        database.session.commit()
+
+        assert get_usage(1) == (10, 10)
+        assert get_usage(2) == (0, 0)
+
+
+def test_concurrent_claims_never_exceed_the_limit(app, database):
+    def claim(_):
+        with app.app_context():
+            claimed = record_barcodes(1, 2, limit=FREE_TIER_MONTHLY_LIMIT)
+            database.session.commit()
+            return claimed
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(claim, range(16)))
+
+    assert results.count(True) == FREE_TIER_MONTHLY_LIMIT // 2
+    with app.app_context():
+        assert get_usage(1) == (FREE_TIER_MONTHLY_LIMIT, FREE_TIER_MONTHLY_LIMIT)
+
+
+def test_generate_rejects_requests_past_a_stale_limit_check(app, make_user, login, monkeypatch):
+    from models import Product
+
+    user_id = make_user('trial@example.com', paid=False)
+    client = login(user_id)
+    for _ in range(FREE_TIER_MONTHLY_LIMIT):
+        assert client.post('/barcode/generate', json=PRODUCT).status_code == 201
+
+    # As if a concurrent request read the usage just before the last barcode was counted
+    monkeypatch.setattr(routes_barcode, 'free_tier_remaining', lambda user: 1)
+    response = client.post('/barcode/generate', json=PRODUCT)
+
+    assert response.status_code == 403
+    with app.app_context():
+        assert Product.query.filter_by(user_id=user_id).count() == FREE_TIER_MONTHLY_LIMIT
+        assert get_usage(user_id) == (FREE_TIER_MONTHLY_LIMIT, FREE_TIER_MONTHLY_LIMIT)
@@ -0,0 +1,135 @@
+"""
+Thermal Printer Labels for SupplierComply
+Emits ZPL II (Zebra) and EPL2 label programs for GS1-128 labels, so the
+printer draws the barcode itself and no image is rendered or uploaded
+"""
+
+import logging
+from functools import lru_cache
+from reportlab.graphics.barcode.code128 import Code128
+
+import gs1
+from barcode_render import FNC1, product_elements
+
+logger = logging.getLogger(__name__)
+
+PRINTER_LANGUAGES = {
+    'zpl': {'mimetype': 'application/vnd.zebra-zpl', 'extension': 'zpl'},
+    'epl': {'mimetype': 'application/vnd.zebra-epl', 'extension': 'epl'},
+}
+
+# Print head resolutions in dots per inch
+PRINTER_DPI = (203, 300, 600)
+
+DEFAULT_LANGUAGE = 'zpl'
+DEFAULT_DPI = 203
+DEFAULT_LABEL_SIZE_MM = (60, 40)
+
+
+@lru_cache(maxsize=32)
+def label_template(language, dpi, width_mm, height_mm):
+    """
+    Build a label program with the layout worked out for a label size.
+
+    Cached per (language, dpi, size); only the per-product fields are left
+    as placeholders: name, barcode (encoded data), human (human-readable
+    line), details, module (bar module width in dots) and copies.
+    """
+    dots_per_mm = dpi / 25.4
+    width = round(width_mm * dots_per_mm)
+    height = round(height_mm * dots_per_mm)
+    margin = round(2 * dots_per_mm)
+    bar_height = round(height * 0.45)
+    font = max(round(height * 0.08), 12)
+
+    if language == 'zpl':
+        # ^BC mode D: GS1-128, FNC1 added and parentheses stripped by the printer
+        return (
+            f"^XA^CI28^PW{width}^LL{height}^LH0,0"
+            f"^FO{margin},{margin}^A0N,{font},{font}^FB{width - 2 * margin},1,0,L^FD{{name}}^FS"
+            f"^BY{{module}}^FO{margin},{margin + font + margin}^BCN,{bar_height},N,N,N,D^FD{{barcode}}^FS"
+            f"^FO{margin},{2 * margin + font + bar_height + margin}^A0N,{font},{font}"
+            f"^FB{width - 2 * margin},1,0,C^FD{{human}}^FS"
+            f"^FO{margin},{3 * margin + 2 * font + bar_height + margin}^A0N,{font},{font}"
+            f"^FB{width - 2 * margin},1,0,C^FD{{details}}^FS"
+            "^PQ{copies}^XZ\n"
+        )
+
+    # EPL2: font 2 is 12x20 dots at 203 dpi; barcode type 1E is UCC/EAN-128
+    return (
+        f"\nN\nq{width}\nQ{height},24\n"
+        f'A{margin},{margin},0,2,1,1,N,"{{name}}"\n'
+        f'B{margin},{margin + 24 + margin},0,1E,{{module}},{{module}},{bar_height},N,"{{barcode}}"\n'
+        f'A{margin},{2 * margin + 24 + bar_height + margin},0,2,1,1,N,"{{human}}"\n'
+        f'A{margin},{3 * margin + 48 + bar_height + margin},0,2,1,1,N,"{{details}}"\n'
+        "P{copies}\n"
+    )
+
+
+def _module_width(data, dpi, width_mm):
+    """Widest whole-dot bar module that fits the symbol between the label margins (its quiet zones)."""
+    barcode = Code128(FNC1 + data.replace(gs1.GS, FNC1), humanReadable=False, quiet=0)
+    barcode.validate()
+    barcode.encode()
+    modules = sum(ord(c) - ord('A') + 1 if c.isupper() else ord(c) - ord('a') + 1
+                  for c in barcode.decompose() if c.isalpha())
+    available = (width_mm - 4) * dpi / 25.4
+    return max(1, min(int(available // modules), 4))
+
+
+def _clean(text, language):
+    """Strip characters that end a field in the printer language."""
+    text = str(text)
+    if language == 'zpl':
+        return text.replace('^', ' ').replace('~', ' ')
+    return text.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def render_printer_label(product, language=DEFAULT_LANGUAGE, dpi=DEFAULT_DPI,
+                         size_mm=DEFAULT_LABEL_SIZE_MM, copies=1):
+    """
+    Build the printer program for one product label.
+
+    Args:
+        product: Product-like object (name, gtin, batch_number, expiry_date)
+        language: 'zpl' or 'epl'
+        dpi: Print head resolution (one of PRINTER_DPI)
+        size_mm: Label (width, height) in millimetres
+        copies: Labels to print
+
+    Returns:
+        Label program as a string (a few hundred bytes)
+    """
+    elements = product_elements(product.gtin, product.batch_number, product.expiry_date)
+    data = gs1.encode(elements, bracketed=False)
+    human = gs1.encode(elements)
+
+    details = f"Batch: {product.batch_number or 'N/A'}"
+    if product.expiry_date:
+        details += f"  Exp: {product.expiry_date.strftime('%Y-%m-%d')}"
+
+    return label_template(language, dpi, *size_mm).format(
+        name=_clean(product.name, language),
+        # ZPL mode D strips the parentheses itself; EPL takes the raw AI data
+        barcode=_clean(human if language == 'zpl' else data, language),
+        human=_clean(human, language),
+        details=_clean(details, language),
+        module=_module_width(data, dpi, size_mm[0]),
+        copies=copies
+    )
+
+
+def stream_printer_labels(products, language=DEFAULT_LANGUAGE, dpi=DEFAULT_DPI,
+                          size_mm=DEFAULT_LABEL_SIZE_MM, copies=1):
+    """
+    Yield one encoded label program per product, for a batch print job.
+
+    Products whose stored fields are not valid GS1 data are skipped and logged.
+    """
+    for product in products:
+        try:
+            label = render_printer_label(product, language, dpi, size_mm, copies)
+        except gs1.GS1Error as e:
+            logger.warning(f"Printer job skipped product {product.id}: {str(e)}")
+            continue
+        yield label.encode('utf-8')
@@ -0,0 +1,132 @@
+"""
+Background Barcode Upload Queue for SupplierComply
+Uploads rendered barcode images off the request path with retries and
+bounded concurrency, then fills in Product.barcode_url
+"""
+
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class UploadQueue:
+    """Per-process pool of upload threads for products in the 'pending' image state."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.concurrency = 4
+        self.max_retries = 3
+        self.retry_backoff = 1.0
+        self.asynchronous = True
+        self.batch_size = 20
+        self._executor = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configure concurrency, retries, batch size and sync/async mode from the Flask app config."""
+        self.app = app
+        self.concurrency = app.config.get('BARCODE_UPLOAD_CONCURRENCY', self.concurrency)
+        self.max_retries = app.config.get('BARCODE_UPLOAD_RETRIES', self.max_retries)
+        self.retry_backoff = app.config.get('BARCODE_UPLOAD_BACKOFF', self.retry_backoff)
+        self.asynchronous = app.config.get('BARCODE_UPLOAD_ASYNC', self.asynchronous)
+        self.batch_size = app.config.get('BARCODE_UPLOAD_BATCH', self.batch_size)
+        app.extensions['upload_queue'] = self
+
+    def submit(self, product_ids):
+        """Queue image uploads for the given product IDs, batch_size products per job."""
+        product_ids = list(product_ids)
+        for start in range(0, len(product_ids), self.batch_size):
+            batch = product_ids[start:start + self.batch_size]
+            if self.asynchronous:
+                self._get_executor().submit(self._run, batch)
+            else:
+                self._run(batch)
+
+    def _get_executor(self):
+        # Gunicorn forks workers after import, so create the pool in the process that uses it
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.concurrency, thread_name_prefix='barcode-upload'
+            )
+            self._pid = os.getpid()
+        return self._executor
+
+    def _run(self, product_ids):
+        """Render (or reuse the cached renders), upload with retries and record the results."""
+        # Import here to avoid circular imports (extensions imports this module)
+        from sqlalchemy import update
+        from extensions import db, render_cache, image_storage
+        from models import Product
+        from barcode_cache import RenderCache
+        from barcode_render import DEFAULT_PRESET, build_product_barcode_value, render_barcode, writer_options
+        from barcode_storage import barcode_storage_key
+        from gs1 import GS1Error
+
+        with self.app.app_context():
+            try:
+                preset = self.app.config.get('BARCODE_PNG_PRESET', DEFAULT_PRESET)
+                jobs = {}
+                invalid = []
+                for product in Product.query.filter(Product.id.in_(product_ids), Product.image_status != 'ready'):
+                    image_format = product.barcode_format or 'png'
+                    try:
+                        barcode_value = build_product_barcode_value(product)
+                    except GS1Error as e:
+                        # Stored fields that are not valid GS1 data fail this product, not the batch
+                        logger.error(f"Cannot render barcode for product {product.id}: {str(e)}")
+                        invalid.append(product.id)
+                        continue
+                    watermark = bool(product.watermarked)
+                    key = RenderCache.make_key(barcode_value, image_format, writer_options(image_format, preset, watermark))
+                    cached = render_cache.get(key)
+                    jobs[product.id] = (
+                        key,
+                        cached.data if cached else render_barcode(barcode_value, image_format, preset, watermark),
+                        barcode_storage_key(product.user_id, product.gtin, image_format),
+                        image_format
+                    )
+                # Release the connection while uploading
+                db.session.rollback()
+
+                uploaded = {}
+                remaining = list(jobs)
+                for attempt in range(self.max_retries + 1):
+                    urls = image_storage.put_many([
+                        (jobs[product_id][2], jobs[product_id][1], jobs[product_id][3]) for product_id in remaining
+                    ])
+                    uploaded.update((product_id, url) for product_id, url in zip(remaining, urls) if url)
+                    remaining = [product_id for product_id, url in zip(remaining, urls) if not url]
+                    if not remaining:
+                        break
+                    logger.warning(f"Upload attempt {attempt + 1} failed for products {remaining}")
+                    if attempt < self.max_retries:
+                        time.sleep(self.retry_backoff * (2 ** attempt))
+
+                for product_id, barcode_url in uploaded.items():
+                    key, image_data = jobs[product_id][:2]
+                    render_cache.put(key, image_data, barcode_url)
+                if remaining:
+                    logger.error(f"Giving up on barcode uploads for products {remaining}")
+
+                # Bulk UPDATE by primary key, one statement per outcome
+                if uploaded:
+                    db.session.execute(update(Product), [
+                        {'id': product_id, 'barcode_url': url, 'image_status': 'ready'}
+                        for product_id, url in uploaded.items()
+                    ])
+                if remaining or invalid:
+                    db.session.execute(update(Product), [
+                        {'id': product_id, 'image_status': 'failed'} for product_id in remaining + invalid
+                    ])
+                db.session.commit()
+
+            except Exception as e:
+                logger.error(f"Upload job error for products {product_ids}: {str(e)}")
+                db.session.rollback()
+            finally:
+                db.session.remove()
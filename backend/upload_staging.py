@@ -0,0 +1,274 @@
+"""
+Upload Staging for SupplierComply
+Keeps uploaded KEMSA CSV files on disk under their file_id, with their
+headers, preview rows and column statistics, so preview, download and import
+work on the upload without the client sending the file again
+"""
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+
+from csv_ingest import profile_csv, read_mapped_rows
+
+logger = logging.getLogger(__name__)
+
+# Metadata kept next to the raw file; rows are streamed from the raw file
+StagedUpload = namedtuple('StagedUpload', [
+    'file_id', 'user_id', 'filename', 'encoding', 'headers', 'header_mapping',
+    'total_rows', 'column_stats', 'preview_rows', 'created_at', 'expires_at'
+])
+
+RAW_FILE = 'upload.csv'
+META_FILE = 'meta.json'
+
+# Data rows kept in the metadata for previews
+PREVIEW_ROWS = 10
+
+
+class UploadStaging:
+    """
+    Staging store for uploaded CSV files keyed by file_id.
+
+    Each upload is a directory holding the raw file and its metadata
+    (headers, the first PREVIEW_ROWS rows and column statistics), written
+    once when the file is uploaded. Metadata is also kept in an in-process
+    LRU; the values themselves are streamed from the raw file whenever they
+    are needed, so memory does not grow with upload size. Uploads expire UPLOAD_STAGING_TTL seconds after they were staged,
+    and the least recently used are evicted once the directory grows past
+    UPLOAD_STAGING_DISK_BYTES. Workers on one host share the directory.
+    """
+
+    def __init__(self, app=None):
+        self.ttl = 3600
+        self.max_items = 256
+        self.max_disk_bytes = 1024 * 1024 * 1024
+        self.directory = None
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configure the TTL, limits and directory from the Flask app config."""
+        self.ttl = app.config.get('UPLOAD_STAGING_TTL', self.ttl)
+        self.max_items = app.config.get('UPLOAD_STAGING_MEMORY_ITEMS', self.max_items)
+        self.max_disk_bytes = app.config.get('UPLOAD_STAGING_DISK_BYTES', self.max_disk_bytes)
+        self.directory = app.config.get('UPLOAD_STAGING_DIR') or os.path.join(
+            tempfile.gettempdir(), 'suppliercomply-uploads'
+        )
+        os.makedirs(self.directory, exist_ok=True)
+        app.extensions['upload_staging'] = self
+
+    def stage(self, user_id, file):
+        """
+        Save an uploaded CSV and profile it once.
+
+        Args:
+            user_id: Owner of the upload
+            file: Uploaded file storage
+
+        Returns:
+            Tuple (StagedUpload, CSVProfile)
+
+        Raises:
+            CSVIngestError: If the file cannot be read as CSV (nothing is kept)
+        """
+        file_id = str(uuid.uuid4())
+        path = self._path(file_id)
+        os.makedirs(path)
+        try:
+            file.save(os.path.join(path, RAW_FILE))
+            with open(os.path.join(path, RAW_FILE), 'rb') as raw:
+                profile = profile_csv(raw, preview_limit=PREVIEW_ROWS)
+
+            now = time.time()
+            staged = StagedUpload(
+                file_id, user_id, file.filename, profile.encoding, profile.headers, profile.header_mapping,
+                profile.total_rows, profile.columns, profile.preview_rows, now, now + self.ttl
+            )
+            self._write_json(path, META_FILE, staged._asdict())
+        except Exception:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+
+        with self._lock:
+            self._remember(staged)
+        self._enforce_limits(keep=file_id)
+        return staged, profile
+
+    def get(self, file_id, user_id):
+        """
+        Load a staged upload's metadata.
+
+        Returns:
+            StagedUpload, or None if it is unknown, expired or another user's
+        """
+        if not self._valid_id(file_id):
+            return None
+
+        with self._lock:
+            staged = self._memory.get(file_id)
+            if staged is not None:
+                self._memory.move_to_end(file_id)
+                self.stats['memory_hits'] += 1
+
+        if staged is None:
+            staged = self._read_disk(file_id)
+            with self._lock:
+                if staged is None:
+                    self.stats['misses'] += 1
+                    return None
+                self.stats['disk_hits'] += 1
+                self._remember(staged)
+
+        if staged.expires_at <= time.time():
+            self.delete(file_id)
+            with self._lock:
+                self.stats['expired'] += 1
+            return None
+        if staged.user_id != user_id:
+            return None
+
+        # Touch so eviction treats the upload as recently used
+        try:
+            os.utime(self._path(file_id))
+        except OSError:
+            pass
+        return staged
+
+    def read_rows(self, staged, mappings, fields):
+        """
+        Stream a staged upload's rows from its raw file.
+
+        Args:
+            staged: StagedUpload
+            mappings: Dict of field -> normalized header
+            fields: Fields to read; unmapped ones read as ''
+
+        Yields:
+            Dict per data row with every field, values stripped
+
+        Raises:
+            CSVIngestError: If the raw file cannot be decoded/parsed
+        """
+        columns = {field: staged.header_mapping[mappings[field]] for field in fields if mappings.get(field)}
+        with open(os.path.join(self._path(staged.file_id), RAW_FILE), 'rb') as raw:
+            for row in read_mapped_rows(raw, columns, list(columns)):
+                yield {field: row.get(field, '').strip() for field in fields}
+
+    def delete(self, file_id):
+        """Remove a staged upload."""
+        with self._lock:
+            self._memory.pop(file_id, None)
+        if self._valid_id(file_id):
+            shutil.rmtree(self._path(file_id), ignore_errors=True)
+
+    def purge_expired(self):
+        """
+        Delete staged uploads past their TTL.
+
+        Returns:
+            Number of uploads deleted
+        """
+        now = time.time()
+        deleted = 0
+        for file_id, last_used, _ in self._scan():
+            meta = self._read_json(self._path(file_id), META_FILE)
+            # No metadata yet: still being staged, unless it was abandoned a TTL ago
+            expires_at = meta['expires_at'] if meta else last_used + self.ttl
+            if expires_at <= now:
+                self.delete(file_id)
+                deleted += 1
+        with self._lock:
+            self.stats['expired'] += deleted
+        return deleted
+
+    def get_stats(self):
+        """Hit/miss counters and current size."""
+        with self._lock:
+            return dict(self.stats, memory_items=len(self._memory), memory_max_items=self.max_items)
+
+    def _remember(self, staged):
+        """Insert into the LRU tier, evicting the least recently used uploads."""
+        self._memory[staged.file_id] = staged
+        self._memory.move_to_end(staged.file_id)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    @staticmethod
+    def _valid_id(file_id):
+        # file_id comes from the client and names a directory: accept only canonical UUIDs
+        try:
+            return str(uuid.UUID(str(file_id))) == file_id
+        except ValueError:
+            return False
+
+    def _path(self, file_id):
+        return os.path.join(self.directory, file_id[:2], file_id)
+
+    @staticmethod
+    def _write_json(path, name, payload):
+        tmp_path = os.path.join(path, f"{name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, separators=(',', ':'))
+        os.replace(tmp_path, os.path.join(path, name))
+
+    @staticmethod
+    def _read_json(path, name):
+        try:
+            with open(os.path.join(path, name), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _read_disk(self, file_id):
+        path = self._path(file_id)
+        meta = self._read_json(path, META_FILE)
+        if meta is None:
+            return None
+        return StagedUpload(**meta)
+
+    def _scan(self):
+        """Yield (file_id, last_used, size) for every staged upload."""
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        for prefix in os.listdir(self.directory):
+            prefix_path = os.path.join(self.directory, prefix)
+            if not os.path.isdir(prefix_path):
+                continue
+            for file_id in os.listdir(prefix_path):
+                path = os.path.join(prefix_path, file_id)
+                try:
+                    size = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+                    yield file_id, os.stat(path).st_mtime, size
+                except OSError:
+                    continue
+
+    def _enforce_limits(self, keep=None):
+        """Drop expired uploads, then the least recently used (never keep) until under 90% of the disk limit."""
+        self.purge_expired()
+        uploads = sorted(self._scan(), key=lambda upload: upload[1])
+        total = sum(size for _, _, size in uploads)
+        if total <= self.max_disk_bytes:
+            return
+
+        target = int(self.max_disk_bytes * 0.9)
+        evicted = 0
+        for file_id, _, size in uploads:
+            if total <= target:
+                break
+            if file_id == keep:
+                continue
+            self.delete(file_id)
+            total -= size
+            evicted += 1
+        with self._lock:
+            self.stats['evictions'] += evicted
@@ -0,0 +1,175 @@
+"""
+Usage Counters for SupplierComply
+Per-user barcode totals kept in user_usage_counters so usage reads are a
+single primary-key lookup instead of a COUNT over products
+"""
+
+import logging
+from datetime import datetime
+from sqlalchemy import event, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from extensions import db
+from models import Product, UsageCounter
+
+logger = logging.getLogger(__name__)
+
+# Period key of the all-time row; monthly rows use 'YYYY-MM'
+TOTAL_PERIOD = 'total'
+
+# Barcodes a month for accounts without a paid subscription
+FREE_TIER_MONTHLY_LIMIT = 10
+
+
+def usage_period(when=None):
+    """Monthly period key for a timestamp (defaults to now, UTC)."""
+    return (when or datetime.utcnow()).strftime('%Y-%m')
+
+
+def _upsert(dialect_name):
+    """INSERT ... ON CONFLICT for the running database."""
+    return {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}[dialect_name](UsageCounter)
+
+
+def _apply_counts(connection, user_id, counts):
+    """Add per-period deltas to a user's counter rows on the given connection."""
+    counters = UsageCounter.__table__
+    for period, delta in counts.items():
+        if not delta:
+            continue
+        if delta > 0:
+            stmt = _upsert(connection.dialect.name).values(user_id=user_id, period=period, barcode_count=delta)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[counters.c.user_id, counters.c.period],
+                set_={'barcode_count': counters.c.barcode_count + delta}
+            )
+        else:
+            stmt = update(counters).where(
+                counters.c.user_id == user_id,
+                counters.c.period == period
+            ).values(barcode_count=counters.c.barcode_count + delta)
+        connection.execute(stmt)
+
+
+def _claim_month(connection, user_id, period, count, limit):
+    """
+    Add count to a user's monthly row only if the result stays within limit.
+
+    A single conditional upsert, so concurrent requests cannot both pass the
+    check: the row stays locked until the transaction ends and a waiting
+    request re-checks the condition against the committed count.
+    """
+    if count > limit:
+        return False
+    counters = UsageCounter.__table__
+    stmt = _upsert(connection.dialect.name).values(user_id=user_id, period=period, barcode_count=count)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[counters.c.user_id, counters.c.period],
+        set_={'barcode_count': counters.c.barcode_count + count},
+        where=counters.c.barcode_count + count <= limit
+    ).returning(counters.c.barcode_count)
+    return connection.execute(stmt).first() is not None
+
+
+def record_barcodes(user_id, count=1, when=None, limit=None):
+    """
+    Count newly created products in the current session's transaction.
+
+    Call before committing the insert so the counters and products commit
+    (or roll back) together.
+
+    Args:
+        count: Products created (negative to give back a count for rows
+            that were not written after all)
+        limit: Monthly limit to enforce (free tier); checked and counted atomically
+
+    Returns:
+        True, or False when the month's count would go over limit (nothing
+        is counted; roll back the products)
+    """
+    connection = db.session.connection()
+    period = usage_period(when)
+    if limit is not None:
+        if not _claim_month(connection, user_id, period, count, limit):
+            return False
+        _apply_counts(connection, user_id, {TOTAL_PERIOD: count})
+        return True
+    _apply_counts(connection, user_id, {TOTAL_PERIOD: count, period: count})
+    return True
+
+
+@event.listens_for(Product, 'after_delete')
+def _product_deleted(mapper, connection, target):
+    """Decrement counters for deleted products, inside the deleting flush."""
+    _apply_counts(connection, target.user_id, {TOTAL_PERIOD: -1, usage_period(target.created_at): -1})
+
+
+def get_usage(user_id, when=None):
+    """
+    Read a user's barcode usage.
+
+    Returns:
+        Tuple (this_month, total)
+    """
+    period = usage_period(when)
+    counts = dict(db.session.execute(
+        select(UsageCounter.period, UsageCounter.barcode_count).where(
+            UsageCounter.user_id == user_id,
+            UsageCounter.period.in_([TOTAL_PERIOD, period])
+        )
+    ).all())
+    return counts.get(period, 0), counts.get(TOTAL_PERIOD, 0)
+
+
+def free_tier_remaining(user):
+    """
+    Barcodes a user may still generate this month.
+
+    A read for rejecting requests early; the limit itself is enforced when
+    the barcodes are counted (record_barcodes with limit=).
+
+    Returns:
+        Remaining count for free-tier accounts, or None for paid (unlimited)
+    """
+    if user.is_paid():
+        return None
+    return max(FREE_TIER_MONTHLY_LIMIT - get_usage(user.id)[0], 0)
+
+
+def reconcile_usage(user_id=None):
+    """
+    Recompute usage counters from products, repairing any drift.
+
+    Matches the backfill in database/migrations/005_user_usage_counters.sql:
+    products without created_at count towards the total but no month.
+
+    Args:
+        user_id: Only reconcile this user (default: everyone)
+
+    Returns:
+        Number of counter rows written
+    """
+    month = {
+        'postgresql': lambda column: func.to_char(column, 'YYYY-MM'),
+    }.get(db.engine.dialect.name, lambda column: func.strftime('%Y-%m', column))(Product.created_at)
+
+    monthly = select(Product.user_id, month.label('period'), func.count()).where(
+        Product.user_id.isnot(None),
+        Product.created_at.isnot(None)
+    ).group_by(Product.user_id, month)
+    totals = select(Product.user_id, func.count()).where(Product.user_id.isnot(None)).group_by(Product.user_id)
+    delete = UsageCounter.__table__.delete()
+    if user_id is not None:
+        monthly = monthly.where(Product.user_id == user_id)
+        totals = totals.where(Product.user_id == user_id)
+        delete = delete.where(UsageCounter.user_id == user_id)
+
+    rows = [{'user_id': owner, 'period': period, 'barcode_count': count} for owner, period, count in db.session.execute(monthly)]
+    rows.extend({'user_id': owner, 'period': TOTAL_PERIOD, 'barcode_count': count} for owner, count in db.session.execute(totals))
+
+    db.session.execute(delete)
+    if rows:
+        db.session.execute(UsageCounter.__table__.insert(), rows)
+    db.session.commit()
+    logger.info(f"Reconciled {len(rows)} usage counter rows")
+    return len(rows)
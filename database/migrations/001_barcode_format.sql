@@ -0,0 +1,8 @@
+-- SupplierComply upgrade 001: barcode image format (PNG or SVG)
+-- Existing databases only (schema.sql already has these columns); safe to run twice
+-- psql suppliercomply -f database/migrations/001_barcode_format.sql
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS barcode_format VARCHAR(10) DEFAULT 'png'; -- preferred image format: png, svg
+ALTER TABLE products ADD COLUMN IF NOT EXISTS barcode_format VARCHAR(10) DEFAULT 'png'; -- png, svg
+
+COMMENT ON COLUMN products.barcode_format IS 'Image format of barcode_url: png or svg';
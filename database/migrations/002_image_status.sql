@@ -0,0 +1,7 @@
+-- SupplierComply upgrade 002: background image uploads
+-- Existing databases only (schema.sql already has this column); safe to run twice
+-- Existing products already have their uploaded image, so they start 'ready'
+
+ALTER TABLE products ADD COLUMN IF NOT EXISTS image_status VARCHAR(20) DEFAULT 'ready'; -- pending, ready, failed
+
+CREATE INDEX IF NOT EXISTS idx_products_image_status ON products(image_status) WHERE image_status <> 'ready';
@@ -0,0 +1,11 @@
+-- SupplierComply upgrade 003: GTIN serial counters
+-- Existing databases only (schema.sql already has this table); safe to run twice
+-- Counters start at serial 1: GTINs issued before this upgrade are 12 digits
+-- long, so they never collide with the GTIN-14s allocated from the counters
+
+CREATE TABLE IF NOT EXISTS gtin_counters (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    next_serial BIGINT NOT NULL DEFAULT 1
+);
+
+COMMENT ON TABLE gtin_counters IS 'Next unreserved GTIN serial per user';
@@ -0,0 +1,4 @@
+-- SupplierComply upgrade 004: keyset pagination index for barcode history
+-- Existing databases only (schema.sql already has this index); safe to run twice
+
+CREATE INDEX IF NOT EXISTS idx_products_user_created_at ON products(user_id, created_at, id);
@@ -0,0 +1,26 @@
+-- SupplierComply upgrade 005: per-user barcode usage counters
+-- Existing databases only (schema.sql already has this table); safe to run twice
+-- Counts are backfilled from existing products (as flask reconcile-usage does)
+
+CREATE TABLE IF NOT EXISTS user_usage_counters (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    period VARCHAR(7) NOT NULL,
+    barcode_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, period)
+);
+
+INSERT INTO user_usage_counters (user_id, period, barcode_count)
+SELECT user_id, to_char(created_at, 'YYYY-MM'), COUNT(*)
+FROM products
+WHERE user_id IS NOT NULL AND created_at IS NOT NULL
+GROUP BY user_id, to_char(created_at, 'YYYY-MM')
+ON CONFLICT (user_id, period) DO NOTHING;
+
+INSERT INTO user_usage_counters (user_id, period, barcode_count)
+SELECT user_id, 'total', COUNT(*)
+FROM products
+WHERE user_id IS NOT NULL
+GROUP BY user_id
+ON CONFLICT (user_id, period) DO NOTHING;
+
+COMMENT ON TABLE user_usage_counters IS 'Barcodes created per user and month, maintained with product inserts/deletes (flask reconcile-usage rebuilds it)';
@@ -0,0 +1,4 @@
+-- SupplierComply upgrade 006: GTIN index for on-demand images and scan lookups
+-- Existing databases only (schema.sql already has this index); safe to run twice
+
+CREATE INDEX IF NOT EXISTS idx_products_gtin ON products(gtin);
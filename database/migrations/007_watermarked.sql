@@ -0,0 +1,5 @@
+-- SupplierComply upgrade 007: free-tier watermark flag
+-- Existing databases only (schema.sql already has this column); safe to run twice
+-- Images made before the watermark existed were not watermarked
+
+ALTER TABLE products ADD COLUMN IF NOT EXISTS watermarked BOOLEAN DEFAULT FALSE; -- free-tier render
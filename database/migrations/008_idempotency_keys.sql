@@ -0,0 +1,18 @@
+-- SupplierComply upgrade 008: stored responses for Idempotency-Key replays
+-- Existing databases only (schema.sql already has this table); safe to run twice
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    key VARCHAR(255) NOT NULL,
+    fingerprint VARCHAR(64) NOT NULL, -- SHA-256 of method, path and body
+    status_code INTEGER, -- NULL while the first request is running
+    headers TEXT,
+    body BYTEA,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (user_id, key)
+);
+
+CREATE INDEX IF NOT EXISTS ix_idempotency_keys_expires_at ON idempotency_keys(expires_at);
+
+COMMENT ON TABLE idempotency_keys IS 'Responses replayed for retried requests; expired rows are removed by flask purge-idempotency-keys';
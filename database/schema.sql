@@ -16,6 +16,7 @@ CREATE TABLE users (
     payment_status VARCHAR(20) DEFAULT 'free_trial', -- free_trial, pending, paid
     trial_ends_at TIMESTAMP,
     paid_until TIMESTAMP,
+    barcode_format VARCHAR(10) DEFAULT 'png', -- preferred image format: png, svg
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -35,6 +36,9 @@ CREATE TABLE products (
     quantity INTEGER,
     gtin VARCHAR(14),
     barcode_url VARCHAR(500),
+    barcode_format VARCHAR(10) DEFAULT 'png', -- png, svg
+    image_status VARCHAR(20) DEFAULT 'ready', -- pending, ready, failed
+    watermarked BOOLEAN DEFAULT FALSE, -- free-tier render
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -42,6 +46,38 @@ CREATE TABLE products (
 CREATE INDEX idx_products_user_id ON products(user_id);
 CREATE INDEX idx_products_expiry_date ON products(expiry_date);
 CREATE INDEX idx_products_created_at ON products(created_at);
+CREATE INDEX idx_products_gtin ON products(gtin);
+CREATE INDEX idx_products_user_created_at ON products(user_id, created_at, id);
+CREATE INDEX idx_products_image_status ON products(image_status) WHERE image_status <> 'ready';
+
+-- GTIN serial counters (one row per user, advanced a block at a time)
+CREATE TABLE gtin_counters (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    next_serial BIGINT NOT NULL DEFAULT 1
+);
+
+-- Barcode usage per user: one row per month ('YYYY-MM') plus a 'total' row
+CREATE TABLE user_usage_counters (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    period VARCHAR(7) NOT NULL,
+    barcode_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, period)
+);
+
+-- Stored responses for requests sent with an Idempotency-Key header
+CREATE TABLE idempotency_keys (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    key VARCHAR(255) NOT NULL,
+    fingerprint VARCHAR(64) NOT NULL, -- SHA-256 of method, path and body
+    status_code INTEGER, -- NULL while the first request is running
+    headers TEXT,
+    body BYTEA,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (user_id, key)
+);
+
+CREATE INDEX ix_idempotency_keys_expires_at ON idempotency_keys(expires_at);
 
 -- Payments log table
 CREATE TABLE payments (
@@ -117,10 +153,14 @@ COMMENT ON TABLE users IS 'Medical suppliers registered on the platform';
 COMMENT ON TABLE products IS 'Products with generated GS1 barcodes';
 COMMENT ON TABLE payments IS 'Payment transactions via Equity Paybill 247247';
 COMMENT ON TABLE activities IS 'Audit log of user activities';
+COMMENT ON TABLE gtin_counters IS 'Next unreserved GTIN serial per user';
+COMMENT ON TABLE user_usage_counters IS 'Barcodes created per user and month, maintained with product inserts/deletes (flask reconcile-usage rebuilds it)';
+COMMENT ON TABLE idempotency_keys IS 'Responses replayed for retried requests; expired rows are removed by flask purge-idempotency-keys';
 
 COMMENT ON COLUMN users.payment_code IS 'Unique code for M-Pesa payments (SC001, SC002, etc.)';
 COMMENT ON COLUMN users.payment_status IS 'Current subscription status: free_trial, pending, paid';
 COMMENT ON COLUMN products.gtin IS 'GS1 GTIN-14 barcode number';
 COMMENT ON COLUMN products.barcode_url IS 'Cloudinary URL of generated barcode image';
+COMMENT ON COLUMN products.barcode_format IS 'Image format of barcode_url: png or svg';
 COMMENT ON COLUMN payments.payment_code IS 'Payment code used for this transaction';
 COMMENT ON COLUMN payments.reference_used IS 'Reference entered by user in M-Pesa';